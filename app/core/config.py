@@ -26,6 +26,95 @@ class Configuracion:
     _allowed_users_str = os.getenv("ALLOWED_USER_IDS", "")
     ALLOWED_USER_IDS = [int(id.strip()) for id in _allowed_users_str.split(",") if id.strip().isdigit()]
 
+    # --- LLM GATEWAY ---
+    LLM_MODELO = os.getenv("LLM_MODELO", "gemini-2.0-flash-exp")
+    LLM_MAX_CONCURRENCIA = int(os.getenv("LLM_MAX_CONCURRENCIA", "4"))
+    LLM_TASA_POR_SEGUNDO = float(os.getenv("LLM_TASA_POR_SEGUNDO", "2"))
+    LLM_RAFAGA = int(os.getenv("LLM_RAFAGA", "4"))
+    LLM_MAX_REINTENTOS = int(os.getenv("LLM_MAX_REINTENTOS", "3"))
+    LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+    LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "8"))
+    # Percentil de latencia a partir del cual se lanza una petición duplicada (0 = desactivado)
+    LLM_HEDGE_PERCENTIL = float(os.getenv("LLM_HEDGE_PERCENTIL", "0"))
+
+    # --- PRESUPUESTO ---
+    LIMITE_PRESUPUESTO_USD = float(os.getenv("LIMITE_PRESUPUESTO_USD", "50"))
+
+    # --- TELEMETRÍA ---
+    TELEMETRIA_MAX_MB = float(os.getenv("TELEMETRIA_MAX_MB", "10"))
+    TELEMETRIA_MAX_ARCHIVOS = int(os.getenv("TELEMETRIA_MAX_ARCHIVOS", "5"))
+
+    # --- RESPUESTA EXTRACTIVA (Atajo sin LLM) ---
+    RESPUESTA_EXTRACTIVA = os.getenv("RESPUESTA_EXTRACTIVA", "false").lower() in ("1", "true", "si")
+    # Si no se define, se usa SCORE_THRESHOLD["EXTRACTIVE_ANSWER"] (contracts.py)
+    UMBRAL_EXTRACTIVO = float(os.getenv("UMBRAL_EXTRACTIVO")) if os.getenv("UMBRAL_EXTRACTIVO") else None
+    MARGEN_EXTRACTIVO = float(os.getenv("MARGEN_EXTRACTIVO", "2.0"))
+
+    # --- CACHÉ DE EVIDENCIAS (Lectura Profunda) ---
+    CACHE_EVIDENCIAS_MAX_CHUNKS = int(os.getenv("CACHE_EVIDENCIAS_MAX_CHUNKS", "60"))
+    CACHE_EVIDENCIAS_UMBRAL = float(os.getenv("CACHE_EVIDENCIAS_UMBRAL", "0.85"))
+    CACHE_EVIDENCIAS_MIN_CUBIERTOS = int(os.getenv("CACHE_EVIDENCIAS_MIN_CUBIERTOS", "3"))
+
+    # --- BOT TELEGRAM ---
+    # Updates atendidos en paralelo (los de un mismo chat siempre en orden)
+    TELEGRAM_MAX_CONCURRENCIA = int(os.getenv("TELEGRAM_MAX_CONCURRENCIA", "16"))
+    # "polling" (default), "webhook" (servidor FastAPI/uvicorn) o "api" (solo API HTTP, sin Telegram)
+    MODO_BOT = os.getenv("MODO_BOT", "polling").lower()
+    # URL pública base del webhook (ej: https://asii.empresa.com). Vacía = no se registra
+    WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+    WEBHOOK_RUTA = os.getenv("WEBHOOK_RUTA", "/telegram/webhook")
+    # Obligatorio con MODO_BOT=webhook (Telegram lo envía en X-Telegram-Bot-Api-Secret-Token)
+    WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+    WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+    WEBHOOK_PUERTO = int(os.getenv("WEBHOOK_PUERTO", "8080"))
+    # Con varias instancias detrás de un balanceador, solo una registra el webhook
+    WEBHOOK_REGISTRAR = os.getenv("WEBHOOK_REGISTRAR", "true").lower() in ("1", "true", "si")
+    # API de Bot alternativa (vacío = api.telegram.org)
+    TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "")
+    # Bearer token de la API HTTP de consultas (vacío = /api/* deshabilitada)
+    API_TOKEN = os.getenv("API_TOKEN", "")
+
+    # --- CONTROL DE ADMISIÓN ---
+    # Consultas procesándose a la vez; el resto espera en una cola justa (por turnos entre usuarios)
+    MAX_USUARIOS_CONCURRENTES = int(os.getenv("MAX_USUARIOS_CONCURRENTES", "10"))
+    ADMISION_COLA_MAX = int(os.getenv("ADMISION_COLA_MAX", "50"))
+    ADMISION_ESPERA_MAX_SEG = float(os.getenv("ADMISION_ESPERA_MAX_SEG", "15"))
+    # Consultas de un mismo usuario en proceso + en cola
+    ADMISION_MAX_POR_USUARIO = int(os.getenv("ADMISION_MAX_POR_USUARIO", "2"))
+
+    # --- CACHÉ DE DOCUMENTOS ---
+    # Documentos abiertos en memoria (índice + páginas descomprimidas)
+    CACHE_MEMORIA_MB = float(os.getenv("CACHE_MEMORIA_MB", "64"))
+    # Cuota compartida por data/cache_docs y data/images_cache
+    CACHE_DISCO_MAX_MB = float(os.getenv("CACHE_DISCO_MAX_MB", "2048"))
+
+    # --- PLAZOS ---
+    # Presupuesto de punta a punta por consulta (incluye la espera en cola)
+    TIMEOUT_CONSULTA = float(os.getenv("TIMEOUT_CONSULTA", "30"))
+    # Tiempo que la búsqueda debe dejarle a la generación con Gemini
+    PLAZO_RESERVA_GENERACION_SEG = float(os.getenv("PLAZO_RESERVA_GENERACION_SEG", "8"))
+
+    # --- SESIONES ---
+    SESIONES_MAX = int(os.getenv("SESIONES_MAX", "10000"))
+    SESIONES_TTL_MINUTOS = float(os.getenv("SESIONES_TTL_MINUTOS", "120"))
+    SESIONES_SNAPSHOT_SEG = float(os.getenv("SESIONES_SNAPSHOT_SEG", "30"))
+
+    # --- WORKERS DE INFERENCIA (E5 + Cross-Encoder fuera del proceso del bot) ---
+    INFERENCIA_REMOTA = os.getenv("INFERENCIA_REMOTA", "false").lower() in ("1", "true", "si")
+    INFERENCIA_HOST = os.getenv("INFERENCIA_HOST", "127.0.0.1")
+    # Puerto del worker 0; el worker i escucha en INFERENCIA_PUERTO + i
+    INFERENCIA_PUERTO = int(os.getenv("INFERENCIA_PUERTO", "8790"))
+    INFERENCIA_WORKERS = int(os.getenv("INFERENCIA_WORKERS", "1"))
+    # Obligatoria (sin default): el canal intercambia pickles, quien tenga la clave ejecuta código en el worker
+    INFERENCIA_CLAVE = os.getenv("INFERENCIA_CLAVE", "")
+    INFERENCIA_LOTE_MAX = int(os.getenv("INFERENCIA_LOTE_MAX", "64"))
+    INFERENCIA_VENTANA_MS = float(os.getenv("INFERENCIA_VENTANA_MS", "5"))
+
+    # --- PRE-ANÁLISIS DE CANDIDATOS (brain.py) ---
+    # true = un solo prompt evalúa todos los candidatos (1 llamada en vez de N en paralelo)
+    PREANALISIS_EN_LOTE = os.getenv("PREANALISIS_EN_LOTE", "false").lower() in ("1", "true", "si")
+    PREANALISIS_CACHE_MAX = int(os.getenv("PREANALISIS_CACHE_MAX", "256"))
+
     @staticmethod
     def es_usuario_permitido(user_id: int) -> bool:
         if not Configuracion.ALLOWED_USER_IDS: return False
@@ -33,6 +122,10 @@ class Configuracion:
 
     @staticmethod
     def validar_configuracion():
-        if not Configuracion.TELEGRAM_TOKEN:
+        if not Configuracion.TELEGRAM_TOKEN and Configuracion.MODO_BOT != "api":
             raise ValueError("ERROR FATAL: Falta 'TELEGRAM_TOKEN'")
+        if Configuracion.MODO_BOT == "api" and not Configuracion.API_TOKEN:
+            raise ValueError("ERROR FATAL: MODO_BOT=api requiere 'API_TOKEN'")
+        if Configuracion.MODO_BOT == "webhook" and not Configuracion.WEBHOOK_SECRET:
+            raise ValueError("ERROR FATAL: MODO_BOT=webhook requiere 'WEBHOOK_SECRET'")
         print(">> [Config] Configuración cargada.")
\ No newline at end of file
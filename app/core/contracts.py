@@ -16,7 +16,8 @@ from typing import TypedDict, Literal, Optional
 SCORE_THRESHOLD = {
     "HIGH_CONFIDENCE": 2.5,  # Auto-selección
     "MEDIUM_CONFIDENCE": -1.0, # Confirmar con usuario
-    "MIN_RELEVANCE": -4.0    # Descarte absoluto
+    "MIN_RELEVANCE": -4.0,   # Descarte absoluto
+    "EXTRACTIVE_ANSWER": 7.0 # Respuesta directa del fragmento, sin LLM
 }
 
 # --- ESQUEMAS DE METADATOS ---
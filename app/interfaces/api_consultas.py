@@ -0,0 +1,179 @@
+"""
+API de Consultas (api_consultas.py) - El Cerebro V8 por HTTP
+------------------------------------------------------------
+Mismo pipeline que Telegram (sesiones, Bibliotecario, Lector, caché, FAQ) para clientes
+no-Telegram (helpdesk de la intranet) y para medir el motor directamente.
+1. POST /api/consulta          JSON {pregunta, session_id, perfil?}
+2. POST /api/consulta/imagen   multipart (pregunta, session_id, imagen)
+3. POST /api/consulta/stream   NDJSON: aceptada -> procesando (latido) -> fragmentos -> fin
+4. POST /api/lote              Varias consultas en paralelo (acotado), resultados en orden
+Las sesiones HTTP llevan prefijo 'api:' para no chocar con los chat_id de Telegram;
+las consultas de una misma sesión se atienden en orden.
+"""
+import os
+import hmac
+import json
+import time
+import uuid
+import asyncio
+import importlib
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, File, Form, Header, HTTPException, UploadFile
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+
+from app.core.config import Configuracion
+from app.logic.session_manager import gestor_sesiones
+
+TEMP_DIR = os.path.join(Configuracion.DIRECTORIO_BASE, "data", "temp_images")
+LATIDO_SEG = 2.0
+
+router = APIRouter(prefix="/api")
+
+# --- MODELOS ---
+
+class Consulta(BaseModel):
+    pregunta: str = Field(..., min_length=1, max_length=4000)
+    session_id: Optional[str] = None
+    perfil: Optional[str] = Field(default=None, pattern="^(ADMIN|SISTEMAS)$")
+
+class ConsultaLote(BaseModel):
+    consultas: List[Consulta] = Field(..., min_length=1, max_length=200)
+    concurrencia: int = Field(default=4, ge=1, le=32)
+
+# --- DEPENDENCIAS ---
+
+def verificar_token(authorization: Optional[str] = Header(default=None)):
+    # Sin token configurado la API no se sirve (nunca queda abierta)
+    if not Configuracion.API_TOKEN:
+        raise HTTPException(status_code=503, detail="API deshabilitada (falta API_TOKEN)")
+    if not hmac.compare_digest(authorization or "", f"Bearer {Configuracion.API_TOKEN}"):
+        raise HTTPException(status_code=401, detail="Token inválido")
+
+def exigir_listo():
+    # Import diferido: el servidor escucha antes de que el cerebro termine de cargar
+    from app.interfaces.http_server import estado_arranque
+    if not estado_arranque["modelos"]:
+        raise HTTPException(status_code=503, detail=f"Calentando ({estado_arranque['fase']})")
+
+# --- ORDEN POR SESIÓN ---
+
+_locks_sesion = {}  # session_id -> [lock, solicitantes]
+
+async def _con_lock_sesion(session_id, corrutina):
+    entrada = _locks_sesion.setdefault(session_id, [asyncio.Lock(), 0])
+    entrada[1] += 1
+    try:
+        async with entrada[0]:
+            return await corrutina
+    finally:
+        entrada[1] -= 1
+        if entrada[1] == 0:
+            del _locks_sesion[session_id]
+
+# --- PIPELINE ---
+
+def _session_id(valor: Optional[str]) -> str:
+    return f"api:{valor or uuid.uuid4().hex}"
+
+async def ejecutar_consulta(pregunta: str, session_id: str, perfil: Optional[str] = None, ruta_imagen: Optional[str] = None) -> dict:
+    """Corre el cerebro V8 para una sesión HTTP y agrega métricas de la llamada."""
+    brain = importlib.import_module("app.logic.brain_v8")
+
+    async def _correr():
+        if perfil:
+            gestor_sesiones.obtener_sesion(session_id)
+            gestor_sesiones.actualizar_sesion(session_id, perfil=perfil)
+        inicio = time.perf_counter()
+        paquete = await brain.generar_respuesta_inteligente(pregunta, ruta_imagen=ruta_imagen, session_id=session_id)
+        if paquete.get("sobrecarga"):
+            raise HTTPException(status_code=503, detail=paquete["texto"],
+                                headers={"Retry-After": str(int(round(paquete["reintentar_en"])))})
+        return {
+            "session_id": session_id,
+            "texto": paquete["texto"],
+            "archivos": [os.path.basename(a) for a in paquete.get("archivos", [])],
+            "estado": gestor_sesiones.obtener_sesion(session_id)["estado"],
+            "duracion_ms": round((time.perf_counter() - inicio) * 1000, 1),
+        }
+
+    return await _con_lock_sesion(session_id, _correr())
+
+def _fragmentos(texto: str):
+    """Respuesta por párrafos (el cerebro entrega el texto completo)."""
+    for parrafo in texto.split("\n\n"):
+        if parrafo.strip():
+            yield parrafo + "\n\n"
+
+# --- ENDPOINTS ---
+
+@router.post("/consulta", dependencies=[Depends(verificar_token), Depends(exigir_listo)])
+async def consultar(consulta: Consulta):
+    return await ejecutar_consulta(consulta.pregunta, _session_id(consulta.session_id), consulta.perfil)
+
+@router.post("/consulta/imagen", dependencies=[Depends(verificar_token), Depends(exigir_listo)])
+async def consultar_con_imagen(imagen: UploadFile = File(...), pregunta: str = Form("Analiza esta imagen y dime qué hacer."),
+                               session_id: Optional[str] = Form(None), perfil: Optional[str] = Form(None)):
+    if not (imagen.content_type or "").startswith("image/"):
+        raise HTTPException(status_code=415, detail="Se esperaba una imagen")
+    os.makedirs(TEMP_DIR, exist_ok=True)
+    ruta = os.path.join(TEMP_DIR, f"api_{uuid.uuid4().hex}.jpg")
+    try:
+        with open(ruta, "wb") as f:
+            f.write(await imagen.read())
+        return await ejecutar_consulta(pregunta, _session_id(session_id), perfil, ruta_imagen=ruta)
+    finally:
+        # Limpieza Segura (Siempre se ejecuta)
+        if os.path.exists(ruta):
+            try:
+                os.remove(ruta)
+            except OSError: pass
+
+@router.post("/consulta/stream", dependencies=[Depends(verificar_token), Depends(exigir_listo)])
+async def consultar_stream(consulta: Consulta):
+    session_id = _session_id(consulta.session_id)
+
+    async def eventos():
+        yield json.dumps({"evento": "aceptada", "session_id": session_id}) + "\n"
+        tarea = asyncio.create_task(ejecutar_consulta(consulta.pregunta, session_id, consulta.perfil))
+        try:
+            # Latido mientras el cerebro trabaja (mantiene viva la conexión y muestra progreso)
+            while not tarea.done():
+                await asyncio.wait({tarea}, timeout=LATIDO_SEG)
+                if not tarea.done():
+                    yield json.dumps({"evento": "procesando"}) + "\n"
+            resultado = tarea.result()
+        except Exception as e:
+            yield json.dumps({"evento": "error", "detalle": str(e)}, ensure_ascii=False) + "\n"
+            return
+        finally:
+            if not tarea.done(): tarea.cancel()  # El cliente cortó la conexión
+        for fragmento in _fragmentos(resultado["texto"]):
+            yield json.dumps({"evento": "fragmento", "texto": fragmento}, ensure_ascii=False) + "\n"
+        resultado.pop("texto")
+        yield json.dumps({"evento": "fin", **resultado}, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(eventos(), media_type="application/x-ndjson")
+
+@router.post("/lote", dependencies=[Depends(verificar_token), Depends(exigir_listo)])
+async def consultar_lote(lote: ConsultaLote):
+    semaforo = asyncio.Semaphore(lote.concurrencia)
+
+    async def una(consulta: Consulta):
+        async with semaforo:
+            try:
+                return {"ok": True, **await ejecutar_consulta(consulta.pregunta, _session_id(consulta.session_id), consulta.perfil)}
+            except Exception as e:
+                return {"ok": False, "error": str(e)}
+
+    inicio = time.perf_counter()
+    resultados = await asyncio.gather(*[una(c) for c in lote.consultas])
+    duracion = time.perf_counter() - inicio
+    return {
+        "resultados": resultados,
+        "total": len(resultados),
+        "errores": sum(1 for r in resultados if not r["ok"]),
+        "duracion_ms": round(duracion * 1000, 1),
+        "consultas_por_seg": round(len(resultados) / duracion, 2) if duracion > 0 else None,
+    }
@@ -0,0 +1,147 @@
+"""
+Servidor HTTP (http_server.py) - Modo Webhook / API sobre FastAPI/uvicorn
+-------------------------------------------------------------------------
+Alternativa a 'run_polling': Telegram empuja cada update a un endpoint HTTP.
+Con MODO_BOT=api solo se sirve la API de consultas (api_consultas.py), sin Telegram;
+con MODO_BOT=webhook se sirven ambas. La API solo se monta si hay API_TOKEN: el host del
+webhook es público y sin token cualquiera podría consultar (y gastar cuota de Gemini).
+1. POST {WEBHOOK_RUTA}: valida el secreto, encola el update y responde al instante;
+   el despacho lo hace la misma Application (ProcesadorPorChat, handlers de telegram_bot).
+2. GET /health (vivo) y GET /ready (listo): el servidor escucha ANTES de cargar los modelos,
+   así el balanceador ve el progreso del calentamiento y no envía tráfico hasta que termina.
+3. Varias instancias: el endpoint no guarda estado propio; solo una (WEBHOOK_REGISTRAR) registra
+   la URL en Telegram. Las sesiones siguen siendo por proceso: conviene afinidad por chat.
+"""
+import time
+import hmac
+import asyncio
+import importlib
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from fastapi import FastAPI, Header, HTTPException, Request
+from fastapi.responses import JSONResponse
+from telegram import Update
+
+from app.core.config import Configuracion
+from app.interfaces.api_consultas import router as router_consultas
+from app.logic.session_manager import gestor_sesiones
+from app.logic.admission import control_admision
+
+# Estado del arranque (lo reporta /ready)
+estado_arranque = {
+    "fase": "iniciando",    # iniciando -> cargando_modelos -> conectando_telegram -> listo | error
+    "modelos": False,
+    "telegram": False,
+    "error": None,
+    "segundos_calentamiento": None,
+}
+_inicio = time.time()
+_aplicacion_tg = None
+_modulo_bot = None
+
+
+def _calentar_modelos():
+    """Primera inferencia de E5 y del Re-Ranker: la primera consulta real no paga ese costo.
+    Con INFERENCIA_REMOTA además confirma que los workers de inferencia responden."""
+    from app.logic.rag_engine_v8 import embeber_consulta, _reranker
+    embeber_consulta("calentamiento")
+    _reranker.predict([("calentamiento", "calentamiento")])
+
+def _con_telegram():
+    return Configuracion.MODO_BOT != "api"
+
+async def _preparar():
+    global _aplicacion_tg, _modulo_bot
+    try:
+        # Importar el bot/cerebro carga Chroma, E5 y el Cross-Encoder: fuera del event loop
+        estado_arranque["fase"] = "cargando_modelos"
+        modulo = "app.interfaces.telegram_bot" if _con_telegram() else "app.logic.brain_v8"
+        _modulo_bot = await asyncio.to_thread(importlib.import_module, modulo)
+        await asyncio.to_thread(_calentar_modelos)
+        estado_arranque["modelos"] = True
+
+        if not _con_telegram():
+            estado_arranque["segundos_calentamiento"] = round(time.time() - _inicio, 1)
+            estado_arranque["fase"] = "listo"
+            print(f">> [API] Lista en {estado_arranque['segundos_calentamiento']}s.")
+            return
+
+        estado_arranque["fase"] = "conectando_telegram"
+        app_tg = _modulo_bot.crear_aplicacion()
+        await app_tg.initialize()
+        if Configuracion.WEBHOOK_URL and Configuracion.WEBHOOK_REGISTRAR:
+            url = Configuracion.WEBHOOK_URL.rstrip("/") + Configuracion.WEBHOOK_RUTA
+            await app_tg.bot.set_webhook(url=url, secret_token=Configuracion.WEBHOOK_SECRET,
+                                         allowed_updates=Update.ALL_TYPES)
+            print(f">> [Webhook] Registrado en Telegram: {url}")
+        await app_tg.start()  # Consume 'update_queue' y despacha a los handlers
+        _aplicacion_tg = app_tg
+
+        estado_arranque["telegram"] = True
+        estado_arranque["segundos_calentamiento"] = round(time.time() - _inicio, 1)
+        estado_arranque["fase"] = "listo"
+        print(f">> [Webhook] Listo en {estado_arranque['segundos_calentamiento']}s.")
+    except Exception as e:
+        estado_arranque["fase"] = "error"
+        estado_arranque["error"] = str(e)
+        print(f"[Webhook Error] Falló el arranque: {e}")
+
+@asynccontextmanager
+async def ciclo_de_vida(_app: FastAPI):
+    tarea = asyncio.create_task(_preparar())
+    yield
+    if not tarea.done():
+        tarea.cancel()
+    if _aplicacion_tg is not None:
+        await _aplicacion_tg.stop()
+        await _aplicacion_tg.shutdown()
+        print(f">> [Envíos] {_modulo_bot.estadisticas_envio.reporte()}")
+    if estado_arranque["modelos"]:
+        # Equivale a 'al_apagar' del bot ('post_shutdown' solo lo invoca run_polling/run_webhook)
+        from app.logic.usage_accountant import contador_consumo
+        await contador_consumo.cerrar()
+        gestor_sesiones.guardar_snapshot()
+
+api = FastAPI(title="ASII", lifespan=ciclo_de_vida)
+if Configuracion.API_TOKEN:
+    api.include_router(router_consultas)
+else:
+    print(">> [API] Sin API_TOKEN: /api/* deshabilitada.")
+
+# --- SALUD ---
+
+@api.get("/health")
+async def health():
+    """Liveness: el proceso responde (aunque siga calentando)."""
+    return {"status": "ok", "fase": estado_arranque["fase"], "uptime_seg": round(time.time() - _inicio, 1),
+            "admision": control_admision.reporte()}
+
+@api.get("/ready")
+async def ready():
+    """Readiness: 200 solo con modelos calientes (y Telegram conectado, si aplica); si no, 503 con el detalle."""
+    listo = estado_arranque["fase"] == "listo"
+    return JSONResponse(status_code=200 if listo else 503, content={"listo": listo, **estado_arranque})
+
+# --- WEBHOOK TELEGRAM ---
+
+@api.post(Configuracion.WEBHOOK_RUTA)
+async def recibir_update(request: Request, x_telegram_bot_api_secret_token: Optional[str] = Header(default=None)):
+    if not _con_telegram():
+        raise HTTPException(status_code=404, detail="Webhook deshabilitado (MODO_BOT=api)")
+    # Sin secreto no se acepta nada: 'from_user.id' no autentica a nadie
+    if not Configuracion.WEBHOOK_SECRET or not hmac.compare_digest(
+            x_telegram_bot_api_secret_token or "", Configuracion.WEBHOOK_SECRET):
+        raise HTTPException(status_code=403, detail="Secreto inválido")
+    if _aplicacion_tg is None:
+        # Telegram reintenta los updates no aceptados
+        raise HTTPException(status_code=503, detail=f"Calentando ({estado_arranque['fase']})")
+
+    update = Update.de_json(await request.json(), _aplicacion_tg.bot)
+    await _aplicacion_tg.update_queue.put(update)
+    return {"ok": True}
+
+def iniciar_servidor_http():
+    import uvicorn
+    print(f">> [ASII V8.1 Enterprise] Servidor HTTP ({Configuracion.MODO_BOT}) en {Configuracion.WEBHOOK_HOST}:{Configuracion.WEBHOOK_PUERTO}")
+    uvicorn.run(api, host=Configuracion.WEBHOOK_HOST, port=Configuracion.WEBHOOK_PUERTO, log_level="warning")
@@ -12,10 +12,12 @@ from telegram.ext import (
     ApplicationBuilder, ContextTypes, CommandHandler, 
     MessageHandler, CallbackQueryHandler, filters
 )
-from telegram.error import BadRequest
 
 from app.core.config import Configuracion
 from app.logic.session_manager import gestor_sesiones
+from app.logic.usage_accountant import contador_consumo
+from app.interfaces.update_processor import ProcesadorPorChat
+from app.interfaces.telegram_render import enviar_markdown, estadisticas_envio
 # IMPORTACIÓN ÚNICA: El Bot solo habla con el Cerebro
 from app.logic.brain_v8 import generar_respuesta_inteligente, buscar_manual_experto
 
@@ -25,12 +27,8 @@ if not os.path.exists(TEMP_DIR): os.makedirs(TEMP_DIR)
 
 # --- UTILIDADES ---
 async def enviar_mensaje_seguro(update: Update, context: ContextTypes.DEFAULT_TYPE, texto: str, reply_markup=None):
-    chat_id = update.effective_chat.id
-    try:
-        await context.bot.send_message(chat_id=chat_id, text=texto, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup)
-    except BadRequest:
-        # Fallback si el Markdown está roto
-        await context.bot.send_message(chat_id=chat_id, text=texto, reply_markup=reply_markup)
+    # Markdown del LLM -> entidades válidas, en partes de <= 4096 (una llamada por parte)
+    await enviar_markdown(context.bot, update.effective_chat.id, texto, reply_markup=reply_markup)
 
 async def verificar_acceso(update: Update) -> bool:
     user = update.effective_user
@@ -67,7 +65,7 @@ async def comando_manual(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
         msg = f"📂 **Manual Encontrado**\n`{meta['nombre_archivo']}`\n\n¿Activar?"
         kb = [[InlineKeyboardButton("✅ Sí", callback_data="confirmar_experto"), InlineKeyboardButton("❌ No", callback_data="cancelar_experto")]]
-        await update.message.reply_text(msg, parse_mode=ParseMode.MARKDOWN, reply_markup=InlineKeyboardMarkup(kb))
+        await enviar_mensaje_seguro(update, context, msg, reply_markup=InlineKeyboardMarkup(kb))
     else:
         await update.message.reply_text("❌ No encontrado.")
 
@@ -126,15 +124,35 @@ async def manejar_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         gestor_sesiones.limpiar_sesion(chat_id)
         await query.edit_message_text("❌ Cancelado.")
 
-def iniciar_bot():
-    if not Configuracion.TELEGRAM_TOKEN: return
-    print(">> [ASII V8.1 Enterprise] Online.")
-    app = ApplicationBuilder().token(Configuracion.TELEGRAM_TOKEN).build()
+async def al_apagar(app):
+    """Vuelca el consumo pendiente y las sesiones activas antes de cerrar el proceso."""
+    await contador_consumo.cerrar()
+    gestor_sesiones.guardar_snapshot()
+    print(f">> [Envíos] {estadisticas_envio.reporte()}")
+
+def crear_aplicacion():
+    """Application con sus handlers; la usan tanto el modo polling como el servidor webhook."""
+    builder = (
+        ApplicationBuilder()
+        .token(Configuracion.TELEGRAM_TOKEN)
+        # Chats distintos en paralelo; mensajes de un mismo chat, en orden
+        .concurrent_updates(ProcesadorPorChat(Configuracion.TELEGRAM_MAX_CONCURRENCIA))
+        .post_shutdown(al_apagar)
+    )
+    if Configuracion.TELEGRAM_API_URL:
+        # API de Bot alternativa (ej: el simulador local de dataa/simular_webhook.py)
+        base = Configuracion.TELEGRAM_API_URL.rstrip("/")
+        builder = builder.base_url(f"{base}/bot").base_file_url(f"{base}/file/bot")
+    app = builder.build()
     
     app.add_handler(CommandHandler("start", comando_start))
     app.add_handler(CommandHandler("limpiar", comando_limpiar))
     app.add_handler(CommandHandler("manual", comando_manual))
     app.add_handler(CallbackQueryHandler(manejar_callback))
     app.add_handler(MessageHandler((filters.TEXT | filters.PHOTO) & ~filters.COMMAND, manejar_mensaje))
-    
-    app.run_polling()
+    return app
+
+def iniciar_bot():
+    if not Configuracion.TELEGRAM_TOKEN: return
+    print(">> [ASII V8.1 Enterprise] Online.")
+    crear_aplicacion().run_polling()
@@ -0,0 +1,263 @@
+"""
+Renderizador Telegram (telegram_render.py) - Markdown del LLM a Entidades en Una Pasada
+---------------------------------------------------------------------------------------
+Gemini produce Markdown "de chat" (**negrita**, # títulos, listas con *, snake_case suelto)
+que ParseMode.MARKDOWN rechaza a menudo: cada rechazo costaba un segundo envío en texto plano,
+y las respuestas de más de 4096 caracteres fallaban siempre.
+1. Render: convierte el Markdown a texto plano + MessageEntity (negrita, cursiva, código,
+   bloque, enlace). Lo que no cierra se deja literal: nunca hay Markdown "roto".
+2. Corte: divide en partes de <= 4096 unidades UTF-16 (como cuenta Telegram), prefiriendo
+   límites de sección (línea en blanco), luego de línea y luego de palabra; las entidades
+   que cruzan el corte se reparten entre ambas partes.
+3. Envío: una llamada por parte, sin parse_mode. 'estadisticas_envio' lleva la tasa de fallos.
+"""
+import re
+from typing import Dict, List, Optional, Tuple
+
+from telegram import MessageEntity
+from telegram.error import BadRequest
+
+LIMITE_TELEGRAM = 4096
+
+_RE_ENLACE = re.compile(r"\[([^\]\n]+)\]\((https?://[^)\s]+)\)")
+_RE_TITULO = re.compile(r"^\s{0,3}#{1,6}\s+(.*?)\s*#*\s*$")
+_RE_VINETA = re.compile(r"^(\s*)[*\-+]\s+")
+_RE_REGLA = re.compile(r"^\s*([-*_])(\s*\1){2,}\s*$")
+
+# Entidad interna: [tipo, inicio, fin, extra] con índices de caracteres Python
+Entidad = list
+
+# --- RENDER ---
+
+class _Render:
+    """Acumula el texto plano y las entidades mientras se recorre el Markdown."""
+
+    def __init__(self):
+        self.partes: List[str] = []
+        self.largo = 0
+        self.entidades: List[Entidad] = []
+
+    def texto(self, s: str):
+        if s:
+            self.partes.append(s)
+            self.largo += len(s)
+
+    def entidad(self, tipo: str, inicio: int, extra: Optional[str] = None):
+        if self.largo > inicio:
+            self.entidades.append([tipo, inicio, self.largo, extra])
+
+    def en_linea(self, linea: str):
+        """
+        Elementos de línea: `código`, **negrita**, __negrita__, *negrita*, _cursiva_, [texto](url).
+        '*x*' sigue siendo negrita como en ParseMode.MARKDOWN (lo usan los textos fijos del bot).
+        """
+        i, n = 0, len(linea)
+        literal_desde = 0
+        while i < n:
+            c = linea[i]
+            if c == "`":
+                fin = linea.find("`", i + 1)
+                if fin > i + 1:
+                    self.texto(linea[literal_desde:i])
+                    inicio = self.largo
+                    self.texto(linea[i + 1:fin])
+                    self.entidad(MessageEntity.CODE, inicio)
+                    i = literal_desde = fin + 1
+                    continue
+            elif c in "*_" and linea.startswith(c * 2, i):
+                fin = linea.find(c * 2, i + 2)
+                if fin > i + 2 and not linea[i + 2].isspace():
+                    self.texto(linea[literal_desde:i])
+                    inicio = self.largo
+                    self.en_linea(linea[i + 2:fin])
+                    self.entidad(MessageEntity.BOLD, inicio)
+                    i = literal_desde = fin + 2
+                    continue
+            elif c in "*_" and self._abre_cursiva(linea, i):
+                fin = self._cierre_cursiva(linea, i)
+                if fin > 0:
+                    self.texto(linea[literal_desde:i])
+                    inicio = self.largo
+                    self.en_linea(linea[i + 1:fin])
+                    self.entidad(MessageEntity.BOLD if c == "*" else MessageEntity.ITALIC, inicio)
+                    i = literal_desde = fin + 1
+                    continue
+            elif c == "[":
+                m = _RE_ENLACE.match(linea, i)
+                if m:
+                    self.texto(linea[literal_desde:i])
+                    inicio = self.largo
+                    self.texto(m.group(1))
+                    self.entidad(MessageEntity.TEXT_LINK, inicio, m.group(2))
+                    i = literal_desde = m.end()
+                    continue
+            i += 1
+        self.texto(linea[literal_desde:])
+
+    @staticmethod
+    def _abre_cursiva(linea: str, i: int) -> bool:
+        siguiente = linea[i + 1] if i + 1 < len(linea) else " "
+        if siguiente.isspace() or siguiente == linea[i]:
+            return False
+        # '_' dentro de una palabra (nombre_archivo) no es marcador
+        return linea[i] == "*" or i == 0 or not linea[i - 1].isalnum()
+
+    @staticmethod
+    def _cierre_cursiva(linea: str, i: int) -> int:
+        marca = linea[i]
+        fin = linea.find(marca, i + 1)
+        while fin > 0:
+            previo_ok = not linea[fin - 1].isspace()
+            siguiente = linea[fin + 1] if fin + 1 < len(linea) else " "
+            if previo_ok and (marca == "*" or not siguiente.isalnum()):
+                return fin
+            fin = linea.find(marca, fin + 1)
+        return -1
+
+
+def renderizar_markdown(markdown: str) -> Tuple[str, List[Entidad]]:
+    """Una pasada por líneas: bloques ``` , títulos (negrita), viñetas (•) y reglas; el resto, en línea."""
+    r = _Render()
+    lineas = markdown.replace("\r\n", "\n").strip("\n").split("\n")
+    bloque = None  # [inicio, lenguaje] de un ``` abierto (inicio None hasta la primera línea de código)
+    primera = True
+
+    for linea in lineas:
+        if linea.lstrip().startswith("```"):
+            # La línea del cerco no produce texto
+            if bloque is None:
+                bloque = [None, linea.strip()[3:].strip() or None]
+            else:
+                if bloque[0] is not None: r.entidad(MessageEntity.PRE, bloque[0], bloque[1])
+                bloque = None
+            continue
+        if not primera: r.texto("\n")
+        primera = False
+        if bloque is not None:
+            if bloque[0] is None: bloque[0] = r.largo
+            r.texto(linea)
+            continue
+        titulo = _RE_TITULO.match(linea)
+        if titulo:
+            inicio = r.largo
+            r.en_linea(titulo.group(1))
+            r.entidad(MessageEntity.BOLD, inicio)
+            continue
+        if _RE_REGLA.match(linea):
+            r.texto("──────────")
+            continue
+        vineta = _RE_VINETA.match(linea)
+        if vineta:
+            r.texto(vineta.group(1) + "• ")
+            linea = linea[vineta.end():]
+        r.en_linea(linea)
+
+    if bloque is not None and bloque[0] is not None:  # ``` sin cerrar: todo lo que siguió es código
+        r.entidad(MessageEntity.PRE, bloque[0], bloque[1])
+    return "".join(r.partes), r.entidades
+
+# --- CORTE EN PARTES ---
+
+def _offsets_utf16(texto: str) -> List[int]:
+    """acumulado[i] = unidades UTF-16 de texto[:i] (lo que Telegram usa para límites y offsets)."""
+    acumulado = [0] * (len(texto) + 1)
+    total = 0
+    for i, c in enumerate(texto):
+        total += 2 if ord(c) > 0xFFFF else 1
+        acumulado[i + 1] = total
+    return acumulado
+
+def _punto_de_corte(texto: str, desde: int, hasta: int) -> int:
+    """Mejor corte en texto[desde:hasta]: sección > línea > palabra > duro."""
+    minimo = desde + (hasta - desde) // 3  # No dejar partes ridículamente cortas
+    for separador in ("\n\n", "\n", " "):
+        pos = texto.rfind(separador, minimo, hasta)
+        if pos > desde:
+            return pos
+    return hasta
+
+def dividir_en_partes(texto: str, entidades: List[Entidad], limite: int = LIMITE_TELEGRAM) -> List[Tuple[str, List[MessageEntity]]]:
+    """Partes de <= 'limite' unidades UTF-16 con sus MessageEntity ya desplazadas."""
+    acumulado = _offsets_utf16(texto)
+    partes = []
+    desde = 0
+    while desde < len(texto):
+        # Mayor índice 'hasta' cuya parte entra en el límite
+        hasta = min(len(texto), desde + limite)
+        while acumulado[hasta] - acumulado[desde] > limite:
+            hasta -= 1
+        if hasta < len(texto):
+            hasta = _punto_de_corte(texto, desde, hasta)
+
+        # Recorte de blancos en los bordes (Telegram los descarta y movería los offsets)
+        ini, fin = desde, hasta
+        while ini < fin and texto[ini] in "\n ": ini += 1
+        while fin > ini and texto[fin - 1] in "\n ": fin -= 1
+        if fin > ini:
+            base = acumulado[ini]
+            ents = []
+            for tipo, e_ini, e_fin, extra in sorted(entidades, key=lambda e: (e[1], -e[2])):
+                a, b = max(e_ini, ini), min(e_fin, fin)
+                if b <= a: continue
+                kwargs = {"url": extra} if tipo == MessageEntity.TEXT_LINK else {"language": extra} if extra else {}
+                ents.append(MessageEntity(type=tipo, offset=acumulado[a] - base, length=acumulado[b] - acumulado[a], **kwargs))
+            partes.append((texto[ini:fin], ents))
+        desde = hasta
+    return partes
+
+def preparar_mensaje(markdown: str, limite: int = LIMITE_TELEGRAM):
+    texto, entidades = renderizar_markdown(markdown)
+    return dividir_en_partes(texto, entidades, limite)
+
+# --- ENVÍO ---
+
+class EstadisticasEnvio:
+    """Contadores de envío: cuántas partes salieron con entidades, cuántas necesitaron texto plano."""
+
+    def __init__(self):
+        self.datos: Dict[str, int] = {
+            "mensajes": 0,          # Respuestas a enviar
+            "partes": 0,            # Llamadas sendMessage intentadas
+            "divididos": 0,         # Respuestas que necesitaron más de una parte
+            "rechazos_entidades": 0,  # BadRequest con entidades (reintento en plano)
+            "fallidos": 0,          # Partes que no llegaron ni en plano
+        }
+
+    def sumar(self, clave: str, n: int = 1):
+        self.datos[clave] += n
+
+    def reporte(self) -> dict:
+        partes = self.datos["partes"] or 1
+        return {
+            **self.datos,
+            "tasa_rechazo_entidades": round(self.datos["rechazos_entidades"] / partes, 4),
+            "tasa_fallos": round(self.datos["fallidos"] / partes, 4),
+        }
+
+async def enviar_markdown(bot, chat_id, markdown: str, reply_markup=None) -> int:
+    """Envía una respuesta del LLM: una llamada por parte; el teclado va en la última. Retorna partes enviadas."""
+    partes = preparar_mensaje(markdown) or [("…", [])]
+    estadisticas_envio.sumar("mensajes")
+    if len(partes) > 1: estadisticas_envio.sumar("divididos")
+    enviadas = 0
+    for i, (texto, entidades) in enumerate(partes):
+        teclado = reply_markup if i == len(partes) - 1 else None
+        estadisticas_envio.sumar("partes")
+        try:
+            await bot.send_message(chat_id=chat_id, text=texto, entities=entidades or None, reply_markup=teclado)
+            enviadas += 1
+            continue
+        except BadRequest as e:
+            # No debería ocurrir (las entidades se construyen válidas); se registra para detectarlo
+            estadisticas_envio.sumar("rechazos_entidades")
+            print(f"[Render Error] Entidades rechazadas ({e}); se reenvía en texto plano.")
+        try:
+            await bot.send_message(chat_id=chat_id, text=texto, reply_markup=teclado)
+            enviadas += 1
+        except BadRequest as e:
+            estadisticas_envio.sumar("fallidos")
+            print(f"[Render Error] Parte {i + 1}/{len(partes)} no enviada: {e}")
+    return enviadas
+
+# Instancia global
+estadisticas_envio = EstadisticasEnvio()
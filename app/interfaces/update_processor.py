@@ -0,0 +1,58 @@
+"""
+Procesador de Updates por Chat (update_processor.py) - Concurrencia con Orden por Conversación
+----------------------------------------------------------------------------------------------
+Por defecto python-telegram-bot atiende un update a la vez: una llamada lenta a Gemini
+de un chat demora a todos los demás.
+1. Pool acotado: hasta N updates en paralelo (semáforo del BaseUpdateProcessor).
+2. Orden por chat: los updates de un mismo chat se serializan con un lock propio,
+   así las transiciones de 'gestor_sesiones' nunca se pisan.
+3. El lock del chat se toma ANTES que el cupo del pool: un chat con mensajes encolados
+   no ocupa lugares que podrían usar otras conversaciones.
+"""
+import asyncio
+from typing import Any, Awaitable, Dict, Hashable
+
+from telegram.ext import BaseUpdateProcessor
+
+
+class ProcesadorPorChat(BaseUpdateProcessor):
+
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        # chat_id -> [lock, solicitantes]; la entrada se borra cuando nadie la usa
+        self._locks: Dict[Hashable, list] = {}
+        self.metricas = {"procesados": 0, "en_espera_por_chat": 0}
+
+    @staticmethod
+    def _clave_chat(update: object) -> Hashable:
+        chat = getattr(update, "effective_chat", None)
+        # Updates sin chat (ej: inline queries) no necesitan orden entre sí
+        return chat.id if chat is not None else None
+
+    async def process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        clave = self._clave_chat(update)
+        if clave is None:
+            await super().process_update(update, coroutine)
+            return
+
+        entrada = self._locks.setdefault(clave, [asyncio.Lock(), 0])
+        entrada[1] += 1
+        if entrada[0].locked():
+            self.metricas["en_espera_por_chat"] += 1
+        try:
+            async with entrada[0]:
+                await super().process_update(update, coroutine)
+        finally:
+            entrada[1] -= 1
+            if entrada[1] == 0:
+                del self._locks[clave]
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        await coroutine
+        self.metricas["procesados"] += 1
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
@@ -0,0 +1,168 @@
+"""
+Control de Admisión (admission.py) - Cupo de Consultas, Cola Justa y Descarte de Carga
+-------------------------------------------------------------------------------------
+Sin límite, un pico de usuarios lanza decenas de pipelines (E5, rerank, Gemini) a la vez:
+todos terminan lentos y el rate limit de Gemini los castiga a todos.
+1. Cupo: como máximo MAX_USUARIOS_CONCURRENTES consultas en proceso.
+2. Cola justa: las que esperan se despachan por turnos entre usuarios (round-robin),
+   no en orden de llegada; un usuario que manda ráfagas no tapa a los demás.
+3. Descarte rápido: cola llena, usuario sobre su cuota o espera agotada -> 'SobrecargaError'
+   al instante (el llamador responde "alta demanda, reintenta").
+4. Métricas: tiempo en cola y tiempo de proceso se miden por separado.
+"""
+import time
+import asyncio
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Dict
+
+from app.core.config import Configuracion
+from app.logic.telemetry import telemetria
+
+MUESTRAS_MAX = 1000  # Ventana para percentiles
+
+
+class SobrecargaError(Exception):
+    """La consulta no fue admitida. 'motivo': cola_llena | cuota_usuario | espera_agotada."""
+
+    def __init__(self, motivo: str, reintentar_en: float):
+        super().__init__(motivo)
+        self.motivo = motivo
+        self.reintentar_en = reintentar_en
+
+
+def _percentil(valores, p):
+    if not valores: return 0.0
+    orden = sorted(valores)
+    return orden[min(len(orden) - 1, int(len(orden) * p / 100))]
+
+
+class ControlAdmision:
+
+    def __init__(self, max_en_vuelo: int, cola_max: int, espera_max_seg: float, max_por_usuario: int):
+        self.max_en_vuelo = max_en_vuelo
+        self.cola_max = cola_max
+        self.espera_max_seg = espera_max_seg
+        self.max_por_usuario = max_por_usuario
+
+        self.en_vuelo = 0
+        self.en_cola = 0
+        self._en_vuelo_usuario: Dict[str, int] = {}
+        # usuario -> deque de futures; el orden del OrderedDict es el turno round-robin
+        self._colas: "OrderedDict[str, deque]" = OrderedDict()
+
+        self.metricas = {"admitidas": 0, "inmediatas": 0, "cola_llena": 0, "cuota_usuario": 0, "espera_agotada": 0}
+        self._esperas = deque(maxlen=MUESTRAS_MAX)
+        self._procesos = deque(maxlen=MUESTRAS_MAX)
+
+    # --- CUPOS ---
+
+    def _pendientes(self, usuario: str) -> int:
+        return self._en_vuelo_usuario.get(usuario, 0) + len(self._colas.get(usuario, ()))
+
+    def _ocupar(self, usuario: str):
+        self.en_vuelo += 1
+        self._en_vuelo_usuario[usuario] = self._en_vuelo_usuario.get(usuario, 0) + 1
+
+    def _descartar(self, motivo: str, usuario: str):
+        self.metricas[motivo] += 1
+        telemetria.emitir("consulta_descartada", motivo=motivo, usuario=usuario,
+                          en_vuelo=self.en_vuelo, en_cola=self.en_cola)
+        # Sugerencia de reintento: lo que tarda en liberarse un cupo, aprox.
+        reintentar = max(1.0, round(_percentil(self._procesos, 50), 1))
+        raise SobrecargaError(motivo, reintentar)
+
+    def _quitar_de_cola(self, usuario: str, futuro: asyncio.Future):
+        cola = self._colas.get(usuario)
+        if cola is not None and futuro in cola:
+            cola.remove(futuro)
+            self.en_cola -= 1
+            if not cola: del self._colas[usuario]
+
+    def _despachar(self):
+        """Asigna cupos libres por turnos: un futuro del primer usuario y ese usuario pasa al final."""
+        while self.en_vuelo < self.max_en_vuelo and self._colas:
+            usuario, cola = next(iter(self._colas.items()))
+            futuro = cola.popleft()
+            self.en_cola -= 1
+            if cola:
+                self._colas.move_to_end(usuario)
+            else:
+                del self._colas[usuario]
+            if futuro.done(): continue
+            self._ocupar(usuario)
+            futuro.set_result(True)
+
+    async def adquirir(self, usuario: str) -> float:
+        """Espera un cupo (o lanza SobrecargaError). Retorna los segundos pasados en cola."""
+        if self._pendientes(usuario) >= self.max_por_usuario:
+            self._descartar("cuota_usuario", usuario)
+        if self.en_vuelo < self.max_en_vuelo and not self._colas:
+            self._ocupar(usuario)
+            self.metricas["inmediatas"] += 1
+            return 0.0
+        if self.en_cola >= self.cola_max:
+            self._descartar("cola_llena", usuario)
+
+        futuro = asyncio.get_running_loop().create_future()
+        self._colas.setdefault(usuario, deque()).append(futuro)
+        self.en_cola += 1
+        inicio = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.shield(futuro), timeout=self.espera_max_seg)
+        except asyncio.TimeoutError:
+            if not futuro.done():
+                self._quitar_de_cola(usuario, futuro)
+                futuro.cancel()
+                self._descartar("espera_agotada", usuario)
+            # Se le asignó el cupo justo al vencer: se usa
+        except asyncio.CancelledError:
+            if futuro.done() and not futuro.cancelled():
+                self.liberar(usuario)  # Ya tenía cupo: devolverlo
+            else:
+                self._quitar_de_cola(usuario, futuro)
+                futuro.cancel()
+            raise
+        return time.perf_counter() - inicio
+
+    def liberar(self, usuario: str):
+        self.en_vuelo -= 1
+        restantes = self._en_vuelo_usuario.get(usuario, 1) - 1
+        if restantes: self._en_vuelo_usuario[usuario] = restantes
+        else: self._en_vuelo_usuario.pop(usuario, None)
+        self._despachar()
+
+    @asynccontextmanager
+    async def turno(self, usuario: str):
+        """Uso: 'async with control_admision.turno(session_id) as espera_seg:'"""
+        espera = await self.adquirir(usuario)
+        self.metricas["admitidas"] += 1
+        self._esperas.append(espera)
+        inicio = time.perf_counter()
+        try:
+            yield espera
+        finally:
+            proceso = time.perf_counter() - inicio
+            self._procesos.append(proceso)
+            self.liberar(usuario)
+            telemetria.emitir("consulta_admitida", usuario=usuario,
+                              espera_ms=round(espera * 1000, 1), proceso_ms=round(proceso * 1000, 1))
+
+    def reporte(self) -> dict:
+        return {
+            **self.metricas,
+            "en_vuelo": self.en_vuelo,
+            "en_cola": self.en_cola,
+            "espera_p50_ms": round(_percentil(self._esperas, 50) * 1000, 1),
+            "espera_p95_ms": round(_percentil(self._esperas, 95) * 1000, 1),
+            "proceso_p50_ms": round(_percentil(self._procesos, 50) * 1000, 1),
+            "proceso_p95_ms": round(_percentil(self._procesos, 95) * 1000, 1),
+        }
+
+# Instancia global
+control_admision = ControlAdmision(
+    max_en_vuelo=Configuracion.MAX_USUARIOS_CONCURRENTES,
+    cola_max=Configuracion.ADMISION_COLA_MAX,
+    espera_max_seg=Configuracion.ADMISION_ESPERA_MAX_SEG,
+    max_por_usuario=Configuracion.ADMISION_MAX_POR_USUARIO,
+)
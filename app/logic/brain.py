@@ -6,13 +6,10 @@ Arquitectura corregida basada en el feedback del usuario.
 2. Realiza un PRE-ANÁLISIS ESTRUCTURAL (Índice + Primeras Páginas) de los candidatos.
 3. Clasifica internamente en SI / TAL_VEZ / NO antes de molestar al usuario.
 """
-import os
-import csv
 import re
 import json
-from datetime import datetime
-from collections import Counter
-from langchain_google_genai import ChatGoogleGenerativeAI
+import asyncio
+from collections import Counter, OrderedDict
 from langchain_core.messages import HumanMessage
 from langchain_community.tools import DuckDuckGoSearchRun
 from langchain_community.chat_message_histories import SQLChatMessageHistory
@@ -23,34 +20,18 @@ from app.logic.rag_engine import buscar_contexto_relevante, obtener_metadata_arc
 from app.logic.session_manager import gestor_sesiones
 from app.logic.document_processor import procesador
 from app.logic.cache_manager import gestor_cache
+from app.logic.llm_gateway import gateway_llm
+from app.logic.usage_accountant import contador_consumo
+from app.logic.fulltext_index import indice_texto
+from app.logic.single_flight import normalizar_pregunta
 
 # Configuración
-# Temperatura 0 para evaluación estricta
-llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash-exp", temperature=0.0, google_api_key=Configuracion.GOOGLE_API_KEY)
+# Temperatura 0 para evaluación estricta (definida en el Gateway compartido)
+llm = gateway_llm
 search_tool = DuckDuckGoSearchRun() 
 
-PRECIO_INPUT_1M = 0.10
-PRECIO_OUTPUT_1M = 0.40
-FILE_USAGE_LOG = os.path.join(Configuracion.DIRECTORIO_BASE, "data", "usage_log.csv")
-FILE_LOCK = os.path.join(Configuracion.DIRECTORIO_BASE, "data", "API_LOCKED")
-
-def verificar_kill_switch(): return os.path.exists(FILE_LOCK)
-
-def registrar_consumo(in_tokens, out_tokens, costo):
-    try:
-        with open(FILE_USAGE_LOG, mode='a', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            writer.writerow([datetime.now().strftime("%Y-%m-%d %H:%M:%S"), datetime.now().strftime("%Y-%m-%d"), in_tokens, out_tokens, f"{costo:.6f}"])
-    except: pass
-
-def auditar_costos(respuesta_llm):
-    try:
-        usage = respuesta_llm.usage_metadata
-        if not usage: return
-        costo = ((usage.get('input_tokens',0)/1e6)*PRECIO_INPUT_1M) + ((usage.get('output_tokens',0)/1e6)*PRECIO_OUTPUT_1M)
-        print(f"💰 Costo: ${costo:.6f}")
-        registrar_consumo(usage.get('input_tokens',0), usage.get('output_tokens',0), costo)
-    except: pass
+# Costos y Kill Switch: el Gateway registra cada respuesta en el Contador de Consumo (en memoria)
+def verificar_kill_switch(): return contador_consumo.api_pausada()
 
 def obtener_historial(session_id: str):
     try:
@@ -60,26 +41,24 @@ def obtener_historial(session_id: str):
 
 # --- LÓGICA DE PRE-ANÁLISIS (EL CEREBRO ESTRUCTURAL) ---
 
-async def evaluar_relevancia_ligera(pregunta, doc_nombre, info_ligera):
-    """
-    Evalúa relevancia usando SOLO info estructural (Índice, Títulos, Resumen).
-    Incluye validación robusta de respuesta JSON.
-    """
-    
-    # Validar inputs
-    if not info_ligera or not info_ligera.get("indice"):
-        return {
-            "nivel": "NO",
-            "razon": "No se pudo extraer información del documento",
-            "secciones": [],
-            "confianza": 0
-        }
-    
-    prompt = f"""
-Eres un Bibliotecario Experto analizando relevancia de documentos.
+# Cachés del pre-análisis (LRU en memoria):
+# - Info estructural por doc_id: el índice y los títulos de un manual no cambian entre consultas.
+# - Evaluación por (pregunta normalizada, documento): la misma consulta repetida no vuelve a Gemini.
+_cache_info_ligera: "OrderedDict[str, dict]" = OrderedDict()
+_cache_evaluaciones: "OrderedDict[tuple, dict]" = OrderedDict()
 
-CONSULTA USUARIO: "{pregunta}"
-DOCUMENTO: "{doc_nombre}"
+def _recordar(cache, clave, valor):
+    cache[clave] = valor
+    cache.move_to_end(clave)
+    while len(cache) > Configuracion.PREANALISIS_CACHE_MAX:
+        cache.popitem(last=False)
+
+def _evaluacion_fallida(razon):
+    # 'error' evita que un fallo transitorio quede cacheado como veredicto
+    return {"nivel": "NO", "razon": razon, "secciones": [], "confianza": 0, "error": True}
+
+def _bloque_documento(doc_nombre, info_ligera):
+    return f"""DOCUMENTO: "{doc_nombre}"
 
 ESTRUCTURA DEL DOCUMENTO:
 Índice (TOC):
@@ -90,8 +69,9 @@ Títulos Clave:
 
 Resumen (Primeras páginas):
 {info_ligera['resumen_inicio'][:700]}...
+"""
 
-CRITERIOS ESTRICTOS:
+CRITERIOS_RELEVANCIA = """CRITERIOS ESTRICTOS:
 
 **SI** (Alta relevancia - 80-100% confianza):
 - El documento tiene sección/capítulo DEDICADO al tema exacto
@@ -108,7 +88,68 @@ Ejemplo: Usuario pide "Validaciones" → Doc de "Configuración General" tiene s
 - Tema completamente diferente
 - Solo menciones pasajeras sin contenido técnico útil
 Ejemplo: Usuario pide "Diccionario de Datos" → Doc es "Manual de Instalación de Servidor"
+"""
 
+def _limpiar_json(texto):
+    """Remueve el markdown que a veces envuelve la respuesta JSON del LLM."""
+    return texto.strip().replace("```json", "").replace("```", "").strip()
+
+def _validar_evaluacion(resultado):
+    """Validación estricta de un veredicto {nivel, razon, secciones, confianza}. Lanza ValueError."""
+    nivel = str(resultado.get("nivel") or "").upper()
+    if nivel not in ["SI", "TAL_VEZ", "NO"]:
+        raise ValueError(f"Nivel inválido: {nivel}")
+
+    razon = resultado.get("razon", "")
+    if not razon or len(razon) < 10:
+        raise ValueError("Razón demasiado corta o vacía")
+
+    secciones = resultado.get("secciones", [])
+    if not isinstance(secciones, list):
+        secciones = []
+
+    confianza = int(resultado.get("confianza", 0))
+    if not (0 <= confianza <= 100):
+        confianza = 50  # Default si está fuera de rango
+
+    # AJUSTE: Si dice "SI" pero confianza < 70, bajar a "TAL_VEZ"
+    if nivel == "SI" and confianza < 70:
+        nivel = "TAL_VEZ"
+        razon += " (Confianza ajustada por umbral)"
+
+    # AJUSTE: Si dice "TAL_VEZ" pero confianza < 30, bajar a "NO"
+    if nivel == "TAL_VEZ" and confianza < 30:
+        nivel = "NO"
+        razon += " (Confianza demasiado baja)"
+
+    return {
+        "nivel": nivel,
+        "razon": razon[:200],  # Limitar longitud
+        "secciones": secciones[:5],  # Máximo 5 secciones
+        "confianza": confianza
+    }
+
+async def evaluar_relevancia_ligera(pregunta, doc_nombre, info_ligera):
+    """
+    Evalúa relevancia usando SOLO info estructural (Índice, Títulos, Resumen).
+    Incluye validación robusta de respuesta JSON.
+    """
+    
+    # Validar inputs
+    if not info_ligera or not info_ligera.get("indice"):
+        return {
+            "nivel": "NO",
+            "razon": "No se pudo extraer información del documento",
+            "secciones": [],
+            "confianza": 0
+        }
+    
+    prompt = f"""
+Eres un Bibliotecario Experto analizando relevancia de documentos.
+
+CONSULTA USUARIO: "{pregunta}"
+{_bloque_documento(doc_nombre, info_ligera)}
+{CRITERIOS_RELEVANCIA}
 RESPONDE EXACTAMENTE EN ESTE FORMATO JSON (sin markdown, sin explicaciones adicionales):
 {{"nivel": "SI", "razon": "explicación de 1-2 frases", "secciones": ["sección1", "sección2"], "confianza": 85}}
 
@@ -118,96 +159,124 @@ IMPORTANTE:
 - "secciones" debe ser array de strings
 """
     
+    resp = None
     try:
         resp = await llm.ainvoke([HumanMessage(content=prompt)])
-        auditar_costos(resp)
-        
-        # Limpiar respuesta (remover markdown si lo incluye)
-        texto_limpio = resp.content.strip()
-        texto_limpio = texto_limpio.replace("```json", "").replace("```", "").strip()
-        
-        # Parsear JSON
-        resultado = json.loads(texto_limpio)
-        
-        # VALIDACIÓN ESTRICTA de campos requeridos
-        nivel = resultado.get("nivel", "").upper()
-        if nivel not in ["SI", "TAL_VEZ", "NO"]:
-            raise ValueError(f"Nivel inválido: {nivel}")
-        
-        razon = resultado.get("razon", "")
-        if not razon or len(razon) < 10:
-            raise ValueError("Razón demasiado corta o vacía")
-        
-        secciones = resultado.get("secciones", [])
-        if not isinstance(secciones, list):
-            secciones = []
-        
-        confianza = int(resultado.get("confianza", 0))
-        if not (0 <= confianza <= 100):
-            confianza = 50  # Default si está fuera de rango
-        
-        # AJUSTE: Si dice "SI" pero confianza < 70, bajar a "TAL_VEZ"
-        if nivel == "SI" and confianza < 70:
-            nivel = "TAL_VEZ"
-            razon += " (Confianza ajustada por umbral)"
-        
-        # AJUSTE: Si dice "TAL_VEZ" pero confianza < 30, bajar a "NO"
-        if nivel == "TAL_VEZ" and confianza < 30:
-            nivel = "NO"
-            razon += " (Confianza demasiado baja)"
-        
-        return {
-            "nivel": nivel,
-            "razon": razon[:200],  # Limitar longitud
-            "secciones": secciones[:5],  # Máximo 5 secciones
-            "confianza": confianza
-        }
+        return _validar_evaluacion(json.loads(_limpiar_json(resp.content)))
     
     except json.JSONDecodeError as e:
         print(f"[Error JSON] No se pudo parsear respuesta del LLM: {e}")
         print(f"[Respuesta original] {resp.content[:200]}")
-        return {
-            "nivel": "NO",
-            "razon": "Error al procesar respuesta del análisis",
-            "secciones": [],
-            "confianza": 0
-        }
+        return _evaluacion_fallida("Error al procesar respuesta del análisis")
     
     except ValueError as e:
         print(f"[Error Validación] {e}")
-        return {
-            "nivel": "NO",
-            "razon": f"Error en validación: {str(e)}",
-            "secciones": [],
-            "confianza": 0
-        }
+        return _evaluacion_fallida(f"Error en validación: {str(e)}")
     
     except Exception as e:
         print(f"[Error General evaluar_relevancia_ligera] {e}")
-        return {
-            "nivel": "NO",
-            "razon": "Error inesperado en el análisis",
-            "secciones": [],
-            "confianza": 0
-        }
+        return _evaluacion_fallida("Error inesperado en el análisis")
 
+async def evaluar_relevancia_lote(pregunta, documentos):
+    """
+    Variante en lote: evalúa todos los candidatos en UN solo prompt.
+    'documentos': [(doc_nombre, info_ligera)]. Retorna {doc_nombre: evaluacion}.
+    """
+    validos = [(nombre, info) for nombre, info in documentos if info and info.get("indice")]
+    resultados = {nombre: {"nivel": "NO", "razon": "No se pudo extraer información del documento", "secciones": [], "confianza": 0}
+                  for nombre, _ in documentos}
+    if not validos: return resultados
+
+    bloques = "\n".join(f"[{i}] {_bloque_documento(nombre, info)}" for i, (nombre, info) in enumerate(validos, 1))
+    prompt = f"""
+Eres un Bibliotecario Experto analizando relevancia de documentos.
+
+CONSULTA USUARIO: "{pregunta}"
+
+Evalúa CADA UNO de estos {len(validos)} documentos de forma independiente:
+
+{bloques}
+{CRITERIOS_RELEVANCIA}
+RESPONDE EXACTAMENTE CON UN ARRAY JSON, un objeto por documento y en el mismo orden (sin markdown, sin explicaciones adicionales):
+[{{"documento": 1, "nivel": "SI", "razon": "explicación de 1-2 frases", "secciones": ["sección1"], "confianza": 85}}]
+
+IMPORTANTE:
+- "documento" es el número entre corchetes del documento evaluado
+- "nivel" debe ser exactamente "SI", "TAL_VEZ" o "NO"
+- "confianza" debe ser número entre 0 y 100
+- "secciones" debe ser array de strings
+"""
+
+    resp = None
+    try:
+        resp = await llm.ainvoke([HumanMessage(content=prompt)])
+        veredictos = json.loads(_limpiar_json(resp.content))
+        if not isinstance(veredictos, list):
+            raise ValueError("La respuesta no es un array")
+    except Exception as e:
+        print(f"[Error Lote evaluar_relevancia_lote] {e}")
+        if resp is not None: print(f"[Respuesta original] {resp.content[:200]}")
+        for nombre, _ in validos: resultados[nombre] = _evaluacion_fallida("Error al procesar respuesta del análisis")
+        return resultados
+
+    for posicion, (nombre, _) in enumerate(validos, 1):
+        # Se empareja por número; si el LLM lo omitió, por posición
+        veredicto = next((v for v in veredictos if isinstance(v, dict) and v.get("documento") == posicion), None)
+        if veredicto is None and len(veredictos) >= posicion and isinstance(veredictos[posicion - 1], dict):
+            veredicto = veredictos[posicion - 1]
+        try:
+            resultados[nombre] = _validar_evaluacion(veredicto or {})
+        except Exception as e:  # Un veredicto malformado solo descarta ese documento
+            print(f"[Error Validación] {nombre}: {e}")
+            resultados[nombre] = _evaluacion_fallida(f"Error en validación: {str(e)}")
+    return resultados
+
+async def obtener_info_ligera(meta):
+    """Info estructural cacheada por doc_id; la lectura del almacén (SQLite) corre fuera del event loop."""
+    clave = meta.get("doc_id") or meta["ruta"]
+    info = _cache_info_ligera.get(clave)
+    if info is None:
+        info = await asyncio.to_thread(procesador.extraer_info_ligera, meta["ruta"], meta.get("doc_id"))
+        if info: _recordar(_cache_info_ligera, clave, info)
+    else:
+        _cache_info_ligera.move_to_end(clave)
+    return info
 
 async def analizar_candidatos_inteligente(pregunta, lista_docs):
-    """Procesa una lista de candidatos y devuelve los clasificados."""
+    """
+    Procesa una lista de candidatos y devuelve los clasificados.
+    Extracción y evaluación corren en paralelo (o en un único prompt si PREANALISIS_EN_LOTE);
+    los veredictos ya emitidos para la misma (pregunta, documento) se reutilizan.
+    """
     analisis = {"claros": [], "posibles": [], "descartados": []}
     
     # Analizamos máximo 3 candidatos para no disparar costos/latencia
-    for doc in lista_docs[:3]:
-        meta = obtener_metadata_archivo(doc)
-        if not meta: continue
-        
-        # 1. Extracción Ligera
-        info = procesador.extraer_info_ligera(meta["ruta"])
-        if not info: continue
-        
-        # 2. Evaluación IA
-        evaluacion = await evaluar_relevancia_ligera(pregunta, doc, info)
-        
+    metas = [(doc, obtener_metadata_archivo(doc)) for doc in lista_docs[:3]]
+    metas = [(doc, meta) for doc, meta in metas if meta]
+
+    # 1. Extracción Ligera (concurrente, cacheada por doc_id)
+    infos = await asyncio.gather(*[obtener_info_ligera(meta) for _, meta in metas])
+    candidatos = [(doc, meta, info) for (doc, meta), info in zip(metas, infos) if info]
+
+    # 2. Evaluación IA (solo lo que no está en caché)
+    norm = normalizar_pregunta(pregunta)
+    evaluaciones = {doc: _cache_evaluaciones[(norm, doc)] for doc, _, _ in candidatos if (norm, doc) in _cache_evaluaciones}
+    pendientes = [(doc, info) for doc, _, info in candidatos if doc not in evaluaciones]
+
+    if pendientes:
+        if Configuracion.PREANALISIS_EN_LOTE and len(pendientes) > 1:
+            nuevas = await evaluar_relevancia_lote(pregunta, pendientes)
+        else:
+            resultados = await asyncio.gather(*[evaluar_relevancia_ligera(pregunta, doc, info) for doc, info in pendientes])
+            nuevas = {doc: ev for (doc, _), ev in zip(pendientes, resultados)}
+        for doc, evaluacion in nuevas.items():
+            if not evaluacion.get("error"): _recordar(_cache_evaluaciones, (norm, doc), evaluacion)
+        evaluaciones.update(nuevas)
+    else:
+        print(f">> [Pre-Análisis] {len(candidatos)} evaluaciones servidas desde caché.")
+
+    for doc, meta, _ in candidatos:
+        evaluacion = evaluaciones[doc]
         item = {
             "nombre": doc, 
             "ruta": meta["ruta"], 
@@ -225,115 +294,98 @@ async def analizar_candidatos_inteligente(pregunta, lista_docs):
 
 # --- RESTO DE FUNCIONES DE APOYO ---
 
-def analizar_intencion(pregunta: str) -> dict:
-    """
-    Clasifica la intención de la consulta del usuario.
-    Retorna: dict con tipo e información adicional.
-    """
-    p = pregunta.lower()
-    
+# --- PATRONES DE INTENCIÓN (compilados una sola vez al importar) ---
+_PATRONES_INTENCION = [
     # TIPO 1: BÚSQUEDA LITERAL (ctrl+f, buscar palabra específica)
-    patrones_literal = [
+    ("LITERAL", [
         r'\b(busca|encuentra|localiza|ubica)\b',
         r'\b(donde|dónde|en que parte)\b.*\b(dice|menciona|aparece|está)\b',
         r'\bctrl\s*\+\s*f\b',
         r'\b(palabra|término|texto)\b.*["\']',
         r'\bver\s+(donde|dónde)\b'
-    ]
-    
-    for patron in patrones_literal:
-        if re.search(patron, p):
-            # Intentar extraer el término buscado
-            termino = None
-            
-            # Estrategia 1: Entre comillas
-            match_comillas = re.search(r'["\']([^"\']+)["\']', pregunta)
-            if match_comillas:
-                termino = match_comillas.group(1)
-            
-            # Estrategia 2: Después de palabra clave
-            else:
-                for keyword in ['busca', 'encuentra', 'localiza', 'palabra', 'término']:
-                    if keyword in p:
-                        palabras = p.split()
-                        try:
-                            idx = palabras.index(keyword)
-                            if idx + 1 < len(palabras):
-                                termino = palabras[idx + 1].strip('.,;:?!')
-                                break
-                        except (ValueError, IndexError):
-                            pass
-            
-            return {
-                "tipo": "LITERAL",
-                "termino": termino,
-                "patron_detectado": patron
-            }
-    
+    ]),
     # TIPO 2: TROUBLESHOOTING (errores, problemas, fallas)
-    patrones_troubleshooting = [
+    ("TROUBLESHOOTING", [
         r'\b(error|falla|problema|no funciona|no anda)\b',
         r'\bpor\s+qué\s+(no|falla)\b',
         r'\b(arreglar|solucionar|resolver|corregir)\b',
         r'\b(reparar|fix)\b'
-    ]
-    
-    for patron in patrones_troubleshooting:
-        if re.search(patron, p):
-            return {
-                "tipo": "TROUBLESHOOTING",
-                "patron_detectado": patron
-            }
-    
+    ]),
     # TIPO 3: PROCEDIMIENTO (cómo hacer, pasos, guía)
-    patrones_procedimiento = [
+    ("PROCEDIMIENTO", [
         r'\b(cómo|como)\s+(hago|hacer|se hace|puedo|configuro|instalo|creo)\b',
         r'\b(pasos|procedimiento|guía|tutorial)\s+(para|de)\b',
         r'\b(enséñame|muéstrame|explícame|ayúdame a)\b',
         r'\bnecesito\s+(hacer|crear|configurar|instalar)\b'
-    ]
-    
-    for patron in patrones_procedimiento:
-        if re.search(patron, p):
-            return {
-                "tipo": "PROCEDIMIENTO",
-                "patron_detectado": patron
-            }
-    
+    ]),
     # TIPO 4: CONFIGURACIÓN (setup, ajustes, parámetros)
-    patrones_configuracion = [
+    ("CONFIGURACION", [
         r'\b(configurar|configuración|setup|ajustar|parametrizar)\b',
         r'\b(establecer|definir|setear)\b.*\b(parámetro|valor|opción)\b'
-    ]
-    
-    for patron in patrones_configuracion:
-        if re.search(patron, p):
-            return {
-                "tipo": "CONFIGURACION",
-                "patron_detectado": patron
-            }
-    
+    ]),
     # TIPO 5: CONSULTA DE INFORMACIÓN (qué es, para qué sirve)
-    patrones_informacion = [
+    ("INFORMACION", [
         r'\b(qué es|que es|para qué|para que)\b',
         r'\b(explica|define|definición de)\b',
         r'\b(cuál es|cual es)\b.*\b(diferencia|propósito|función)\b'
-    ]
-    
-    for patron in patrones_informacion:
-        if re.search(patron, p):
-            return {
-                "tipo": "INFORMACION",
-                "patron_detectado": patron
-            }
-    
+    ]),
+]
+_PATRONES_INTENCION = [(tipo, [re.compile(pat) for pat in patrones]) for tipo, patrones in _PATRONES_INTENCION]
+_RE_COMILLAS = re.compile(r'["\']([^"\']+)["\']')
+
+def _extraer_termino_literal(pregunta: str, p: str):
+    """Término buscado: entre comillas, o la palabra que sigue a la palabra clave."""
+    # Estrategia 1: Entre comillas
+    match_comillas = _RE_COMILLAS.search(pregunta)
+    if match_comillas:
+        return match_comillas.group(1)
+
+    # Estrategia 2: Después de palabra clave
+    palabras = p.split()
+    for keyword in ['busca', 'encuentra', 'localiza', 'palabra', 'término']:
+        if keyword in palabras:
+            idx = palabras.index(keyword)
+            if idx + 1 < len(palabras):
+                return palabras[idx + 1].strip('.,;:?!')
+    return None
+
+def analizar_intencion(pregunta: str) -> dict:
+    """
+    Clasifica la intención de la consulta del usuario.
+    Retorna: dict con tipo e información adicional.
+    """
+    p = pregunta.lower()
+
+    for tipo, patrones in _PATRONES_INTENCION:
+        for patron in patrones:
+            if patron.search(p):
+                resultado = {"tipo": tipo, "patron_detectado": patron.pattern}
+                if tipo == "LITERAL":
+                    resultado["termino"] = _extraer_termino_literal(pregunta, p)
+                return resultado
+
     # DEFAULT: Consulta genérica
     return {
         "tipo": "GENERICA",
         "patron_detectado": None
     }
 
+def buscar_literal(termino, nombre_archivo=None, prefijo=False, limite=20):
+    """
+    Ctrl+F sobre la Biblioteca vía índice de texto completo (FTS5, construido en la ingesta).
+    Retorna [{doc_id, nombre_archivo, pagina, snippet}] ordenado por relevancia.
+    """
+    if not termino: return []
+    return indice_texto.buscar(termino, nombre_archivo=nombre_archivo, prefijo=prefijo, limite=limite)
+
+def formatear_resultados_literales(termino, hits):
+    lineas = [f"🔎 **\"{termino}\"** aparece en:"]
+    for h in hits[:10]:
+        lineas.append(f"• _{h['nombre_archivo']}_, pág. {h['pagina']}: {h['snippet']}")
+    return "\n".join(lineas)
+
 def buscar_regex_en_mapa(termino, mapa):
+    """Escaneo lineal de respaldo para manuales que aún no están en el índice de texto completo."""
     if not termino: return []
     res = []
     try:
@@ -366,23 +418,40 @@ async def generar_respuesta_inteligente(pregunta: str, ruta_imagen: str = None,
             return {"texto": "🔄 Salido del manual.", "archivos": []}
 
         meta = obtener_metadata_archivo(sesion["doc_activo"])
-        doc_data = gestor_cache.obtener_analisis_cacheado(meta["ruta"])
-        
-        # ... (Carga de contexto igual que V30, usando construir_contexto_paginas) ...
-        # Por brevedad, asumo que aquí va la lógica de carga selectiva ya implementada en V30.
-        # Si no tienes doc_data, procesamos.
-        if not doc_data: 
+
+        # Búsqueda literal (Ctrl+F): se responde desde el índice, sin cargar el documento ni llamar al LLM
+        intencion = analizar_intencion(pregunta)
+        if intencion["tipo"] == "LITERAL" and intencion.get("termino"):
+            termino = intencion["termino"]
+            if indice_texto.tiene_documento(sesion["doc_activo"]):
+                hits = buscar_literal(termino, nombre_archivo=sesion["doc_activo"])
+            else:
+                mapa = gestor_cache.obtener_mapa_paginas(meta["ruta"])
+                paginas = buscar_regex_en_mapa(termino, mapa) if mapa else []
+                hits = [{"nombre_archivo": sesion["doc_activo"], "pagina": pag, "snippet": ""} for pag in paginas]
+            if hits:
+                texto = formatear_resultados_literales(termino, hits)
+                if obj_historial: obj_historial.add_ai_message(texto)
+                return {"texto": texto, "archivos": []}
+
+        # Carga selectiva: solo el índice de páginas; el texto se lee página a página
+        mapa = gestor_cache.obtener_mapa_paginas(meta["ruta"])
+        if mapa is None:
             doc_data = procesador.procesar_pdf(meta["ruta"])
             gestor_cache.guardar_en_cache(meta["ruta"], doc_data)
-        
-        contexto = doc_data["contenido_markdown"] # Simplificado para el ejemplo, usar carga selectiva
+            mapa = gestor_cache.obtener_mapa_paginas(meta["ruta"]) or doc_data["mapa_paginas"]
+
+        paginas = procesador.seleccionar_paginas_relevantes(pregunta, mapa, sesion["doc_activo"])
+        if not paginas:
+            paginas = list(mapa)[:3]  # Sin términos útiles: arranque del manual
+        print(f">> [Lectura] Páginas seleccionadas: {paginas}")
+        contexto = procesador.construir_contexto_paginas(mapa, paginas, ventana=1)
         
         prompt = f"""Eres Consultor Técnico. Doc: {sesion['doc_activo']}. 
         Consulta: {pregunta}
         Contenido: {contexto[:20000]}...
         """
-        resp = await llm.ainvoke([HumanMessage(content=prompt)])
-        auditar_costos(resp)
+        resp = await llm.ainvoke([HumanMessage(content=prompt)], usuario=session_id, perfil=sesion.get("perfil"))
         
         if obj_historial: obj_historial.add_ai_message(resp.content)
         return {"texto": resp.content, "archivos": [meta["ruta"]]}
@@ -446,8 +515,7 @@ async def generar_respuesta_inteligente(pregunta: str, ruta_imagen: str = None,
     
     Responde usando esto, pero aclara que no encontraste un manual dedicado.
     """
-    resp = await llm.ainvoke([HumanMessage(content=prompt_fallback)])
-    auditar_costos(resp)
+    resp = await llm.ainvoke([HumanMessage(content=prompt_fallback)], usuario=session_id, perfil=sesion.get("perfil"))
     
     if obj_historial: obj_historial.add_ai_message(resp.content)
     return {"texto": resp.content, "archivos": []}  
\ No newline at end of file
@@ -8,8 +8,10 @@ Mejoras:
 4. Calibración: Usa umbrales de logits correctos.
 """
 import os
+import time
 import base64
-from langchain_google_genai import ChatGoogleGenerativeAI
+import hashlib
+import asyncio
 from langchain_core.messages import HumanMessage, SystemMessage
 from langchain_community.chat_message_histories import SQLChatMessageHistory
 
@@ -18,13 +20,19 @@ from app.core.config import Configuracion
 from app.core.contracts import SCORE_THRESHOLD
 from app.logic.rag_engine_v8 import buscar_manual_candidato, buscar_contenido_profundo
 from app.logic.session_manager import gestor_sesiones
+from app.logic.llm_gateway import gateway_llm
+from app.logic.usage_accountant import contador_consumo
+from app.logic.telemetry import telemetria
+from app.logic import extractive_answer
+from app.logic.speculative import gestor_especulativo
+from app.logic.evidence_cache import cache_evidencias
+from app.logic.single_flight import coalescedor, normalizar_pregunta
+from app.logic.faq_store import almacen_faq
+from app.logic.admission import control_admision, SobrecargaError
+from app.logic.deadline import con_plazo, sin_plazo, ejecutar_con_plazo, PlazoAgotado
 
-# Configuración del LLM
-llm = ChatGoogleGenerativeAI(
-    model="gemini-2.0-flash-exp", 
-    temperature=0.0, 
-    google_api_key=Configuracion.GOOGLE_API_KEY
-)
+# Configuración del LLM (concurrencia, rate limit y reintentos los gestiona el Gateway)
+llm = gateway_llm
 
 # --- PROMPTS ---
 SYSTEM_PROMPTS = {
@@ -57,7 +65,7 @@ def codificar_imagen(ruta_imagen):
 
 # --- MÓDULO DE VISIÓN (Few-Shot) ---
 
-async def analizar_imagen_tecnica(ruta_imagen):
+async def analizar_imagen_tecnica(ruta_imagen, session_id=None, perfil=None):
     """
     Usa Gemini Vision con Few-Shot Prompting para extraer datos técnicos estructurados.
     """
@@ -90,7 +98,7 @@ async def analizar_imagen_tecnica(ruta_imagen):
     )
     
     try:
-        resp = await llm.ainvoke([mensaje])
+        resp = await llm.ainvoke([mensaje], usuario=session_id, perfil=perfil)
         print(f">> [Brain V8] Visión extrajo: {resp.content[:100]}...")
         return resp.content
     except Exception as e:
@@ -110,7 +118,17 @@ def buscar_manual_experto(termino: str, k: int = 1):
 async def fase_bibliotecario(pregunta, session_id, perfil):
     print(f">> [Brain V8] Buscando manual para: '{pregunta}'")
     
-    candidatos = buscar_manual_candidato(pregunta)
+    inicio = time.perf_counter()
+    # Preguntas idénticas en vuelo comparten una sola búsqueda + rerank
+    clave = ("bibliotecario", normalizar_pregunta(pregunta), perfil, None)
+    try:
+        candidatos = await ejecutar_con_plazo(
+            coalescedor.ejecutar(clave, lambda: asyncio.to_thread(buscar_manual_candidato, pregunta)),
+            "bibliotecario", reserva=Configuracion.PLAZO_RESERVA_GENERACION_SEG)
+    except PlazoAgotado:
+        return ("⏱️ La búsqueda de manuales tardó demasiado. Intenta de nuevo en unos momentos.", "ESPERANDO_INPUT", None)
+    telemetria.emitir("etapa", etapa="bibliotecario", session_id=session_id,
+                      duracion_ms=round((time.perf_counter() - inicio) * 1000, 1), candidatos=len(candidatos))
     
     if not candidatos:
         return ("❌ No encontré manuales vigentes. Intenta ser más específico.", "ESPERANDO_INPUT", None)
@@ -119,39 +137,90 @@ async def fase_bibliotecario(pregunta, session_id, perfil):
     score = mejor.get("rerank_score", -99.0) # Default bajo si falla
     
     print(f"   📊 Top Candidate: {mejor['nombre_archivo']} (Score: {score:.2f})")
-    # Logging para calibración futura
-    try:
-        from datetime import datetime
-        log_dir = os.path.join(Configuracion.DIRECTORIO_BASE, "logs")
-        if not os.path.exists(log_dir):
-            os.makedirs(log_dir)
-        
-        log_file = os.path.join(log_dir, "rag_scores.log")
-        with open(log_file, "a", encoding="utf-8") as f:
-            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            f.write(f"{timestamp}|{pregunta[:50]}|{mejor['nombre_archivo']}|{score:.4f}\n")
-    except Exception as e:
-        # Si falla el logging, no bloqueamos el flujo
-        pass
+    # Logging para calibración futura (no bloqueante)
+    telemetria.emitir("rag_score", pregunta=pregunta[:50], manual=mejor['nombre_archivo'], score=round(float(score), 4))
     # Lógica de Umbrales Correcta (Logits MS-MARCO)
     if score > SCORE_THRESHOLD["HIGH_CONFIDENCE"]: 
         return (None, "LECTURA_PROFUNDA", mejor)
         
     elif score > SCORE_THRESHOLD["MEDIUM_CONFIDENCE"]:
         msg = f"🔎 ¿Te refieres al manual **{mejor['nombre_archivo']}**?"
-        gestor_sesiones.actualizar_metadata(session_id, {"candidato_pendiente": mejor})
+        gestor_sesiones.actualizar_metadata(session_id, {"candidato_pendiente": mejor, "pregunta_pendiente": pregunta})
+        # Mientras el usuario decide, adelantamos la lectura del candidato
+        _, hist_txt = obtener_historial(session_id)
+        with sin_plazo():  # El borrador espera la confirmación del usuario: no hereda el plazo de esta consulta
+            gestor_especulativo.lanzar(session_id, mejor.get("doc_id"),
+                                       fase_lector(pregunta, mejor, perfil, hist_txt, session_id=session_id))
         return (msg, "ESPERANDO_CONFIRMACION", None)
         
     else:
         return ("🤔 Encontré documentos, pero la relevancia es baja. Por favor reformula tu consulta.", "ESPERANDO_INPUT", None)
 
-async def fase_lector(pregunta, manual_meta, perfil, historial_txt, imagen_b64=None):
+async def fase_lector(pregunta, manual_meta, perfil, historial_txt, imagen_b64=None, session_id=None, forzar_llm=False):
+    """
+    Lectura del manual activo. La búsqueda de evidencias es siempre de la sesión; solo la redacción
+    con Gemini se comparte entre consultas idénticas en vuelo (ver '_redactar').
+    """
+    texto, archivos, extractiva = await _ejecutar_lector(pregunta, manual_meta, perfil, historial_txt, imagen_b64, session_id, forzar_llm)
+
+    # El estado de sesión es propio de cada solicitante, aunque la ejecución se haya compartido
+    if extractiva and session_id:
+        gestor_sesiones.actualizar_metadata(session_id, {"pregunta_extractiva": pregunta})
+    return (texto, archivos)
+
+async def _ejecutar_lector(pregunta, manual_meta, perfil, historial_txt, imagen_b64, session_id, forzar_llm):
+    """Pipeline del lector: evidencias -> (atajo extractivo | Gemini). Retorna (texto, archivos, extractiva)."""
     doc_id = manual_meta.get("doc_id")
-    evidencias = buscar_contenido_profundo(pregunta, doc_id)
+    inicio = time.perf_counter()
+    try:
+        if session_id:
+            # Seguimientos sobre el mismo manual: primero la caché de evidencias de la sesión
+            busqueda = asyncio.to_thread(cache_evidencias.buscar, session_id, pregunta, doc_id)
+        else:
+            busqueda = asyncio.to_thread(buscar_contenido_profundo, pregunta, doc_id)
+        # Búsqueda + rerank: deben dejarle tiempo a la generación
+        evidencias = await ejecutar_con_plazo(busqueda, "lector_busqueda", reserva=Configuracion.PLAZO_RESERVA_GENERACION_SEG)
+    except PlazoAgotado:
+        return ("⏱️ La búsqueda en el manual tardó demasiado. Intenta de nuevo en unos momentos.", [], False)
+    telemetria.emitir("etapa", etapa="lector_busqueda", session_id=session_id, doc_id=doc_id,
+                      duracion_ms=round((time.perf_counter() - inicio) * 1000, 1), evidencias=len(evidencias))
     
     if not evidencias:
-        return (f"📂 Leí el manual, pero no encontré referencias específicas.", [])
+        return (f"📂 Leí el manual, pero no encontré referencias específicas.", [], False)
+
+    # Atajo extractivo: el fragmento top es tan claro que no hace falta parafrasearlo
+    if not forzar_llm and not imagen_b64 and extractive_answer.es_candidata_extractiva(evidencias):
+        extractive_answer.registrar_consulta(True)
+        telemetria.emitir("respuesta_extractiva", session_id=session_id, doc_id=doc_id,
+                          score=round(float(evidencias[0]["rerank_score"]), 4), **extractive_answer.obtener_metricas())
+        return (extractive_answer.construir_respuesta_extractiva(evidencias[0], manual_meta['nombre_archivo']), [manual_meta], True)
+    extractive_answer.registrar_consulta(False)
+
+    try:
+        texto = await ejecutar_con_plazo(
+            _redactar(pregunta, evidencias, manual_meta, perfil, historial_txt, imagen_b64, session_id, forzar_llm),
+            "lector_generacion")
+    except PlazoAgotado:
+        # Degradación: las evidencias ya están; se entregan con sus páginas (y se puede pedir la explicación luego)
+        return (extractive_answer.construir_respuesta_parcial(evidencias, manual_meta['nombre_archivo']), [manual_meta], True)
+    return (texto, [manual_meta], False)
 
+async def _redactar(pregunta, evidencias, manual_meta, perfil, historial_txt, imagen_b64, session_id, forzar_llm):
+    """
+    Redacción del lector. Consultas en vuelo con el MISMO prompt (pregunta normalizada, perfil, doc_id,
+    historial y evidencias) comparten una llamada a Gemini, que se cobra a la sesión que la lanzó.
+    Con imagen o explicación forzada siempre se ejecuta aparte.
+    """
+    if imagen_b64 or forzar_llm:
+        return await generar_con_evidencias(pregunta, evidencias, manual_meta, perfil, historial_txt, imagen_b64, session_id)
+    huella = hashlib.sha256("\x1e".join([historial_txt or ""] + [ev["texto"] for ev in evidencias]).encode("utf-8")).hexdigest()
+    clave = ("lector", normalizar_pregunta(pregunta), perfil, manual_meta.get("doc_id"), huella)
+    return await coalescedor.ejecutar(
+        clave, lambda: generar_con_evidencias(pregunta, evidencias, manual_meta, perfil, historial_txt, None, session_id))
+
+async def generar_con_evidencias(pregunta, evidencias, manual_meta, perfil, historial_txt="", imagen_b64=None, session_id=None):
+    """Redacción con Gemini a partir de evidencias ya recuperadas (también la usa el precómputo de FAQ)."""
+    doc_id = manual_meta.get("doc_id")
     contexto_str = ""
     for i, ev in enumerate(evidencias):
         contexto_str += f"--- FRAGMENTO {i+1} ---\n{ev['texto']}\n\n"
@@ -169,14 +238,32 @@ async def fase_lector(pregunta, manual_meta, perfil, historial_txt, imagen_b64=N
     bloque_contenido.append({"type": "text", "text": "Responde usando SOLO el contexto. Formato visual rico."})
 
     mensajes = [SystemMessage(content=system_prompt), HumanMessage(content=bloque_contenido)]
-    respuesta = await llm.ainvoke(mensajes)
+    inicio = time.perf_counter()
+    respuesta = await llm.ainvoke(mensajes, usuario=session_id, perfil=perfil)
+    telemetria.emitir("etapa", etapa="lector_generacion", session_id=session_id, doc_id=doc_id,
+                      duracion_ms=round((time.perf_counter() - inicio) * 1000, 1))
     
-    return (respuesta.content + f"\n\n_Fuente: {manual_meta['nombre_archivo']}_", [manual_meta])
+    return respuesta.content + f"\n\n_Fuente: {manual_meta['nombre_archivo']}_"
 
 # --- ORQUESTADOR ---
 
 async def generar_respuesta_inteligente(pregunta: str, ruta_imagen: str = None, session_id: str = "default") -> dict:
+    """Punto de entrada: pasa por el control de admisión (cupo, cola justa, descarte)."""
+    try:
+        async with control_admision.turno(session_id) as espera:
+            if espera > 1: print(f">> [Admisión] {session_id} esperó {espera:.1f}s en cola.")
+            # El plazo cuenta desde la llegada: la espera en cola ya consumió parte
+            with con_plazo(Configuracion.TIMEOUT_CONSULTA - espera):
+                return await _generar_respuesta(pregunta, ruta_imagen, session_id)
+    except SobrecargaError as e:
+        print(f">> [Admisión] Consulta descartada ({e.motivo}) para {session_id}.")
+        return {"texto": f"⏳ Alta demanda en este momento. Reintenta en {e.reintentar_en:.0f} s.",
+                "archivos": [], "sobrecarga": True, "reintentar_en": e.reintentar_en}
+
+async def _generar_respuesta(pregunta: str, ruta_imagen: str = None, session_id: str = "default") -> dict:
     
+    if contador_consumo.api_pausada(): return {"texto": "⛔ SISTEMA PAUSADO", "archivos": []}
+
     sesion = gestor_sesiones.obtener_sesion(session_id)
     estado = sesion.get("estado", "INICIO")
     perfil = sesion.get("perfil", "ADMIN")
@@ -187,8 +274,13 @@ async def generar_respuesta_inteligente(pregunta: str, ruta_imagen: str = None,
     
     if ruta_imagen:
         print(">> [Brain V8] Procesando entrada visual...")
-        descripcion_visual = await analizar_imagen_tecnica(ruta_imagen)
-        busqueda_aumentada = f"{pregunta}\n[Contexto Visual: {descripcion_visual}]"
+        try:
+            # La visión es un extra: si no llega a tiempo, se busca solo con el texto
+            descripcion_visual = await ejecutar_con_plazo(analizar_imagen_tecnica(ruta_imagen, session_id, perfil), "vision",
+                                                          reserva=2 * Configuracion.PLAZO_RESERVA_GENERACION_SEG)
+            busqueda_aumentada = f"{pregunta}\n[Contexto Visual: {descripcion_visual}]"
+        except PlazoAgotado:
+            pass
         try:
             img_b64 = codificar_imagen(ruta_imagen)
         except: 
@@ -208,27 +300,75 @@ async def generar_respuesta_inteligente(pregunta: str, ruta_imagen: str = None,
     if estado == "ESPERANDO_CONFIRMACION":
         if any(x in pregunta.lower() for x in ["si", "sí", "claro"]):
             cand = sesion["metadata"]["candidato_pendiente"]
-            gestor_sesiones.cambiar_estado(session_id, "LECTURA_PROFUNDA", doc=cand["nombre_archivo"], meta=cand)
-            return {"texto": f"👍 Abriendo **{cand['nombre_archivo']}**.", "archivos": []}
+            pregunta_original = sesion["metadata"].get("pregunta_pendiente")
+            borrador = gestor_especulativo.tomar(session_id, cand.get("doc_id"))
+
+            meta = dict(cand)
+            if sesion["metadata"].get("pregunta_extractiva"):
+                meta["pregunta_extractiva"] = sesion["metadata"]["pregunta_extractiva"]
+            gestor_sesiones.cambiar_estado(session_id, "LECTURA_PROFUNDA", doc=cand["nombre_archivo"], meta=meta)
+
+            if not pregunta_original:
+                return {"texto": f"👍 Abriendo **{cand['nombre_archivo']}**.", "archivos": []}
+
+            resp_txt = None
+            if borrador:
+                try:
+                    resp_txt, _ = await ejecutar_con_plazo(borrador, "borrador_especulativo")
+                except asyncio.CancelledError:
+                    # Solo se absorbe la cancelación del borrador, no la de esta consulta (p.ej. cliente desconectado)
+                    if asyncio.current_task().cancelling() or not borrador.cancelled(): raise
+                    print("[Brain V8] Borrador especulativo cancelado.")
+                except Exception as e:
+                    print(f"[Brain V8] Borrador especulativo descartado: {e!r}")
+            hist_obj, hist_txt = obtener_historial(session_id)
+            if not resp_txt:
+                # Sin borrador (falló, venció o se perdió en un reinicio): se lee ahora
+                resp_txt, _ = await fase_lector(pregunta_original, cand, perfil, hist_txt, session_id=session_id)
+            if hist_obj:
+                hist_obj.add_user_message(pregunta_original)
+                hist_obj.add_ai_message(resp_txt)
+            return {"texto": f"👍 Abriendo **{cand['nombre_archivo']}**.\n\n{resp_txt}", "archivos": []}
         else:
+            # El hook de limpieza cancela el borrador especulativo
             gestor_sesiones.limpiar_sesion(session_id)
-            return await generar_respuesta_inteligente(pregunta, ruta_imagen, session_id) # Reintentar como búsqueda nueva
+            return await _generar_respuesta(pregunta, ruta_imagen, session_id) # Reintentar como búsqueda nueva (mismo cupo)
 
     if estado == "LECTURA_PROFUNDA":
+        # ¿Pide desarrollar la última respuesta extractiva? Reusamos su pregunta original con LLM
+        pregunta_lector, forzar_llm = busqueda_aumentada, False
+        pendiente = sesion["metadata"].get("pregunta_extractiva")
+        if pendiente and extractive_answer.pide_explicacion_completa(pregunta):
+            pregunta_lector, forzar_llm = pendiente, True
+            gestor_sesiones.actualizar_metadata(session_id, {"pregunta_extractiva": None})
+
         hist_obj, hist_txt = obtener_historial(session_id)
-        resp_txt, archs = await fase_lector(busqueda_aumentada, sesion["metadata"], perfil, hist_txt, img_b64)
+        resp_txt, archs = await fase_lector(pregunta_lector, sesion["metadata"], perfil, hist_txt, img_b64, session_id, forzar_llm)
         if hist_obj: 
             hist_obj.add_user_message(pregunta)
             hist_obj.add_ai_message(resp_txt)
         return {"texto": resp_txt, "archivos": []}
 
-    # Inicio
+    # Inicio: ¿La pregunta está entre las FAQ precalculadas? (solo texto, sin imagen)
+    if not ruta_imagen:
+        faq = await asyncio.to_thread(almacen_faq.obtener, pregunta, perfil)
+        if faq:
+            telemetria.emitir("faq_hit", session_id=session_id, perfil=perfil)
+            if faq["manual_meta"]:
+                meta = faq["manual_meta"]
+                gestor_sesiones.cambiar_estado(session_id, "LECTURA_PROFUNDA", doc=meta["nombre_archivo"], meta=meta)
+            hist_obj, _ = obtener_historial(session_id)
+            if hist_obj:
+                hist_obj.add_user_message(pregunta)
+                hist_obj.add_ai_message(faq["respuesta"])
+            return {"texto": faq["respuesta"], "archivos": []}
+
     msg, nuevo_estado, meta = await fase_bibliotecario(busqueda_aumentada, session_id, perfil)
     
     if nuevo_estado == "LECTURA_PROFUNDA":
         gestor_sesiones.cambiar_estado(session_id, "LECTURA_PROFUNDA", doc=meta["nombre_archivo"], meta=meta)
         hist_obj, hist_txt = obtener_historial(session_id)
-        resp_txt, archs = await fase_lector(busqueda_aumentada, meta, perfil, hist_txt, img_b64)
+        resp_txt, archs = await fase_lector(busqueda_aumentada, meta, perfil, hist_txt, img_b64, session_id)
         if hist_obj: 
             hist_obj.add_user_message(pregunta)
             hist_obj.add_ai_message(resp_txt)
@@ -1,62 +1,472 @@
 """
 Gestor de Caché Inteligente (cache_manager.py)
 ----------------------------------------------
-Evita reprocesar documentos. Guarda el análisis estructural en JSON.
-Usa SHA256 del contenido del archivo para invalidar caché si el PDF cambia.
+Evita reprocesar documentos. Usa SHA256 del contenido del archivo para invalidar caché si el PDF cambia
+(la huella sale de 'indice_huellas': solo se recalcula si el archivo cambió en disco).
+Formato binario '{hash}.asii' (uno por documento):
+1. Cabecera fija: mágico + offset/largo del índice.
+2. Bloques comprimidos (zlib): una página por bloque y el Markdown en bloques por sección.
+3. Índice comprimido al final: offsets de páginas y secciones + campos livianos (metadata, catálogo...).
+La Lectura Profunda abre el archivo con mmap y descomprime solo las páginas/secciones que pide.
+Las cachés anteriores (JSON con indent y '.paginas') se migran al primer acceso.
+Dos niveles:
+- Memoria: LRU de documentos abiertos (índice + páginas ya descomprimidas) con tope en bytes.
+- Disco: cuota compartida por cache_docs e images_cache; al excederla se borran las entradas
+  usadas hace más tiempo. Un '.asii' y su carpeta de imágenes se desalojan juntos. 'estadisticas()' reporta aciertos por nivel y bytes desalojados.
 """
 import os
+import re
+import sys
 import json
-import hashlib
+import mmap
+import time
+import zlib
+import shutil
+import struct
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
 from app.core.config import Configuracion
+from app.logic.fingerprint_index import indice_huellas
+
+MAGICO = b"ASIIDOC1"
+_CABECERA = struct.Struct("<8sQI")  # mágico, offset del índice, largo del índice
+TAM_BLOQUE_MD = 32 * 1024           # Secciones de Markdown se agrupan hasta este tamaño
+NIVEL_ZLIB = 6
+CAMPOS_VOLUMINOSOS = ("contenido_markdown", "texto_plano", "mapa_paginas")
+
+_RE_INICIO_SECCION = re.compile(r'(?m)^(?=#{1,6}\s)')
+
+
+def _bloques_markdown(markdown):
+    """Parte el Markdown en títulos '#' y agrupa secciones consecutivas hasta TAM_BLOQUE_MD: [(texto, [títulos])]."""
+    bloques, actual, titulos = [], [], []
+    largo = 0
+    for seccion in _RE_INICIO_SECCION.split(markdown):
+        if not seccion: continue
+        if actual and largo + len(seccion) > TAM_BLOQUE_MD:
+            bloques.append(("".join(actual), titulos))
+            actual, titulos, largo = [], [], 0
+        actual.append(seccion)
+        largo += len(seccion)
+        if seccion.startswith("#"):
+            titulos.append(seccion.split("\n", 1)[0].lstrip("#").strip())
+    if actual:
+        bloques.append(("".join(actual), titulos))
+    return bloques
+
+def escribir_documento_binario(ruta, datos):
+    """Serializa el análisis de 'procesar_pdf' al formato '.asii' (escritura atómica)."""
+    temporal = ruta + ".tmp"
+    with open(temporal, "wb") as f:
+        f.write(_CABECERA.pack(MAGICO, 0, 0))
+
+        def bloque(texto):
+            crudo = texto.encode("utf-8")
+            comprimido = zlib.compress(crudo, NIVEL_ZLIB)
+            offset = f.tell()
+            f.write(comprimido)
+            return [offset, len(comprimido)]
+
+        mapa = datos.get("mapa_paginas") or {}
+        indice = {
+            "version": 1,
+            "paginas": [[int(p), *bloque(mapa[p])] for p in sorted(mapa, key=int)],
+            "markdown": [[*bloque(texto), titulos] for texto, titulos in _bloques_markdown(datos.get("contenido_markdown") or "")],
+            "meta": {k: v for k, v in datos.items() if k not in CAMPOS_VOLUMINOSOS},
+        }
+        comprimido = zlib.compress(json.dumps(indice, ensure_ascii=False).encode("utf-8"), NIVEL_ZLIB)
+        offset = f.tell()
+        f.write(comprimido)
+        f.seek(0)
+        f.write(_CABECERA.pack(MAGICO, offset, len(comprimido)))
+    os.replace(temporal, ruta)
+
+
+class DocumentoCacheado:
+    """Lector de un '.asii' sobre mmap: el índice se carga al abrir, el texto se descomprime a pedido."""
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._archivo = open(ruta, "rb")
+        try:
+            self._mm = mmap.mmap(self._archivo.fileno(), 0, access=mmap.ACCESS_READ)
+            magico, offset, largo = _CABECERA.unpack_from(self._mm, 0)
+            if magico != MAGICO:
+                raise ValueError(f"Formato desconocido: {os.path.basename(ruta)}")
+            indice = json.loads(zlib.decompress(self._mm[offset:offset + largo]))
+        except Exception:
+            self.cerrar()
+            raise
+        self.meta = indice["meta"]
+        self._paginas = {p: (o, l) for p, o, l in indice["paginas"]}
+        self._markdown = indice["markdown"]
+        self._decodificadas = {}
+        # Memoria que ocupa (para el nivel de memoria del CacheManager); crece al descomprimir páginas
+        self.peso = sys.getsizeof(self._paginas) + sys.getsizeof(self._markdown) + largo
+        self.al_crecer = None
+
+    def _leer(self, offset, largo):
+        return zlib.decompress(self._mm[offset:offset + largo]).decode("utf-8")
+
+    def numeros_pagina(self):
+        return sorted(self._paginas)
+
+    def tiene_pagina(self, pagina):
+        return pagina in self._paginas
+
+    def pagina(self, pagina):
+        texto = self._decodificadas.get(pagina)
+        if texto is None:
+            texto = self._leer(*self._paginas[pagina])  # KeyError si no existe, como un dict
+            self._decodificadas[pagina] = texto
+            delta = sys.getsizeof(texto)
+            self.peso += delta
+            if self.al_crecer: self.al_crecer(delta)
+        return texto
+
+    def secciones(self):
+        return [titulo for _, _, titulos in self._markdown for titulo in titulos]
+
+    def seccion(self, titulo):
+        """Markdown desde el título pedido hasta el siguiente título (None si no existe)."""
+        for offset, largo, titulos in self._markdown:
+            if titulo in titulos:
+                for parte in _RE_INICIO_SECCION.split(self._leer(offset, largo)):
+                    if parte.startswith("#") and parte.split("\n", 1)[0].lstrip("#").strip() == titulo:
+                        return parte
+        return None
+
+    def markdown(self):
+        return "".join(self._leer(o, l) for o, l, _ in self._markdown)
+
+    def texto_plano(self):
+        # Mismo armado que 'procesar_pdf': páginas unidas por salto de línea
+        return "\n".join(self.pagina(p) for p in self.numeros_pagina())
+
+    def como_dict(self):
+        """Análisis completo (misma forma que 'procesar_pdf'); descomprime todo (cada página una vez)."""
+        mapa = {p: self.pagina(p) for p in self.numeros_pagina()}
+        return {
+            **self.meta,
+            "contenido_markdown": self.markdown(),
+            "texto_plano": "\n".join(mapa.values()),
+            "mapa_paginas": mapa,
+        }
+
+    def cerrar(self):
+        mm = getattr(self, "_mm", None)
+        if mm is not None and not mm.closed: mm.close()
+        if not self._archivo.closed: self._archivo.close()
+
+    def __del__(self):
+        try:
+            self.cerrar()
+        except Exception:
+            pass
+
+
+class MapaPaginasPerezoso(Mapping):
+    """
+    'mapa_paginas' de solo lectura respaldado en un DocumentoCacheado: {num_pagina (int): texto}.
+    Cada página se descomprime la primera vez que se pide (y queda en el documento).
+    """
+
+    def __init__(self, documento):
+        self.documento = documento
+
+    def __getitem__(self, pagina):
+        return self.documento.pagina(pagina)
+
+    def __iter__(self):
+        return iter(self.documento.numeros_pagina())
+
+    def __len__(self):
+        return len(self.documento.numeros_pagina())
+
+    def __contains__(self, pagina):
+        return self.documento.tiene_pagina(pagina)
 
 class CacheManager:
-    def __init__(self):
+    def __init__(self, memoria_max_bytes=None, disco_max_bytes=None):
         # Carpeta donde guardaremos los cerebros procesados
         self.cache_dir = os.path.join(Configuracion.DIRECTORIO_BASE, "data", "cache_docs")
         if not os.path.exists(self.cache_dir):
             os.makedirs(self.cache_dir)
+        # Imágenes extraídas por 'procesar_pdf' (comparten la cuota de disco)
+        self.img_dir = os.path.join(Configuracion.DIRECTORIO_BASE, "data", "images_cache")
+        os.makedirs(self.img_dir, exist_ok=True)
+
+        self.memoria_max = memoria_max_bytes if memoria_max_bytes is not None else int(Configuracion.CACHE_MEMORIA_MB * 1024 * 1024)
+        self.disco_max = disco_max_bytes if disco_max_bytes is not None else int(Configuracion.CACHE_DISCO_MAX_MB * 1024 * 1024)
+        self._memoria = OrderedDict()  # file_hash -> DocumentoCacheado (orden LRU)
+        self._bytes_memoria = 0
+        self._accesos = {}             # ruta de entrada en disco -> último acceso (los aciertos en memoria no tocan el disco)
+        self._imagenes = {}            # ruta '.asii' -> su carpeta de imágenes ("" si no tiene)
+        self._lock = threading.RLock()
+        self.metricas = {
+            "memoria_aciertos": 0, "memoria_fallos": 0, "disco_aciertos": 0, "disco_fallos": 0,
+            "bytes_desalojados_memoria": 0, "bytes_desalojados_disco": 0, "entradas_desalojadas_disco": 0,
+        }
+
+    # --- NIVEL MEMORIA ---
+
+    def _al_crecer(self, file_hash, delta):
+        with self._lock:
+            if file_hash in self._memoria:
+                self._bytes_memoria += delta
+                self._ajustar_memoria(proteger=file_hash)
+
+    def _ajustar_memoria(self, proteger=None):
+        """Desaloja documentos LRU hasta quedar bajo el tope (el que se está usando nunca)."""
+        while self._bytes_memoria > self.memoria_max:
+            victima = next((h for h in self._memoria if h != proteger), None)
+            if victima is None: break
+            documento = self._memoria.pop(victima)
+            documento.al_crecer = None
+            # No se cierra: una consulta en curso puede seguir leyéndolo (el GC lo cierra al soltarlo)
+            self._bytes_memoria -= documento.peso
+            self.metricas["bytes_desalojados_memoria"] += documento.peso
+            self._registrar_acceso(documento.ruta, documento.meta.get("ruta_imagenes"))
+
+    def _olvidar(self, file_hash):
+        with self._lock:
+            documento = self._memoria.pop(file_hash, None)
+            if documento is not None:
+                documento.al_crecer = None
+                self._bytes_memoria -= documento.peso
+
+    # --- NIVEL DISCO ---
+
+    def _registrar_acceso(self, *rutas):
+        ahora = time.time()
+        for ruta in rutas:
+            if ruta: self._accesos[os.path.abspath(ruta)] = ahora
+
+    def _carpeta_imagenes(self, ruta_bin):
+        """Carpeta de imágenes del '.asii' (leída de su índice una sola vez); "" si no tiene."""
+        carpeta = self._imagenes.get(ruta_bin)
+        if carpeta is None:
+            carpeta = ""
+            if ruta_bin.endswith(".asii"):
+                try:
+                    documento = DocumentoCacheado(ruta_bin)
+                    carpeta = documento.meta.get("ruta_imagenes") or ""
+                    documento.cerrar()
+                except Exception as e:
+                    print(f"[Caché Error Cuota] {e}")
+            self._imagenes[ruta_bin] = carpeta
+        return os.path.abspath(carpeta) if carpeta else ""
+
+    def _entradas_disco(self):
+        """
+        Unidades de desalojo y tamaños: ([(último acceso, [rutas])], {ruta: bytes}).
+        Cada '.asii' forma unidad con su carpeta de images_cache (acceso = el más reciente de ambos);
+        archivos y carpetas sin pareja son unidades sueltas.
+        """
+        tamanos, accesos, archivos = {}, {}, []
+        for nombre in os.listdir(self.cache_dir):
+            ruta = os.path.abspath(os.path.join(self.cache_dir, nombre))
+            if nombre.endswith(".tmp") or not os.path.isfile(ruta): continue
+            st = os.stat(ruta)
+            tamanos[ruta] = st.st_size
+            accesos[ruta] = max(st.st_mtime, self._accesos.get(ruta, 0))
+            archivos.append(ruta)
+        carpetas = set()
+        for nombre in os.listdir(self.img_dir):
+            carpeta = os.path.abspath(os.path.join(self.img_dir, nombre))
+            if not os.path.isdir(carpeta): continue
+            tamano = 0
+            for raiz, _, nombres in os.walk(carpeta):
+                tamano += sum(os.path.getsize(os.path.join(raiz, a)) for a in nombres)
+            tamanos[carpeta] = tamano
+            accesos[carpeta] = max(os.path.getmtime(carpeta), self._accesos.get(carpeta, 0))
+            carpetas.add(carpeta)
+
+        unidades, emparejadas = [], set()
+        for ruta in archivos:
+            carpeta = self._carpeta_imagenes(ruta)
+            rutas = [ruta, carpeta] if carpeta in carpetas else [ruta]
+            emparejadas.update(rutas[1:])
+            unidades.append((max(accesos[r] for r in rutas), rutas))
+        unidades.extend((accesos[c], [c]) for c in carpetas - emparejadas)
+        return unidades, tamanos
+
+    def aplicar_cuota(self, proteger=()):
+        """Borra las unidades usadas hace más tiempo hasta quedar bajo la cuota. Retorna bytes liberados."""
+        try:
+            unidades, tamanos = self._entradas_disco()
+        except OSError as e:
+            print(f"[Caché Error Cuota] {e}")
+            return 0
+        total = sum(tamanos.values())
+        if total <= self.disco_max: return 0
+
+        protegidas = {os.path.abspath(p) for p in proteger if p}
+        with self._lock:
+            for d in self._memoria.values():
+                protegidas.add(os.path.abspath(d.ruta))
+                if d.meta.get("ruta_imagenes"): protegidas.add(os.path.abspath(d.meta["ruta_imagenes"]))
+        # Una carpeta compartida por varios '.asii' (mismo PDF, versiones distintas) se borra con el último
+        referencias = {}
+        for _, rutas in unidades:
+            for ruta in rutas: referencias[ruta] = referencias.get(ruta, 0) + 1
+
+        liberados = 0
+        for _, rutas in sorted(unidades, key=lambda u: u[0]):
+            if total <= self.disco_max: break
+            if any(r in protegidas for r in rutas): continue
+            principal = rutas[0]
+            try:
+                # El archivo primero: si no se puede borrar (Ej: Windows no borra un archivo mapeado), sus imágenes quedan
+                if os.path.isdir(principal): shutil.rmtree(principal)
+                else: os.remove(principal)
+            except OSError as e:
+                print(f"[Caché Error Cuota] {e}")
+                continue
+            for ruta in rutas:
+                referencias[ruta] -= 1
+                if referencias[ruta]: continue
+                if ruta != principal:
+                    try:
+                        shutil.rmtree(ruta)
+                    except OSError as e:
+                        print(f"[Caché Error Cuota] {e}")
+                        continue
+                self._accesos.pop(ruta, None)
+                self._imagenes.pop(ruta, None)
+                total -= tamanos[ruta]
+                liberados += tamanos[ruta]
+            self.metricas["entradas_desalojadas_disco"] += 1
+        self.metricas["bytes_desalojados_disco"] += liberados
+        if liberados:
+            print(f">> [Caché] Cuota de disco: {liberados / 1024 / 1024:.1f} MB liberados.")
+        return liberados
+
+    def estadisticas(self):
+        m = self.metricas
+        consultas_memoria = m["memoria_aciertos"] + m["memoria_fallos"]
+        consultas_disco = m["disco_aciertos"] + m["disco_fallos"]
+        return {
+            **m,
+            "ratio_memoria": round(m["memoria_aciertos"] / consultas_memoria, 4) if consultas_memoria else 0.0,
+            "ratio_disco": round(m["disco_aciertos"] / consultas_disco, 4) if consultas_disco else 0.0,
+            "documentos_en_memoria": len(self._memoria),
+            "bytes_memoria": self._bytes_memoria,
+        }
 
     def _generar_hash_archivo(self, ruta_pdf):
-        """Crea un ID único basado en el CONTENIDO binario del archivo."""
-        sha256_hash = hashlib.sha256()
-        with open(ruta_pdf, "rb") as f:
-            # Leemos en bloques por si el archivo es gigante
-            for byte_block in iter(lambda: f.read(4096), b""):
-                sha256_hash.update(byte_block)
-        return sha256_hash.hexdigest()
+        """Crea un ID único basado en el CONTENIDO binario del archivo (vía índice de huellas)."""
+        return indice_huellas.huella(ruta_pdf)
 
-    def obtener_analisis_cacheado(self, ruta_pdf):
-        """Intenta recuperar el JSON procesado. Retorna None si no existe."""
+    def _ruta_binaria(self, file_hash):
+        return os.path.join(self.cache_dir, f"{file_hash}.asii")
+
+    def _rutas_legado(self, file_hash):
+        base = os.path.join(self.cache_dir, file_hash)
+        return f"{base}.json", f"{base}.paginas", f"{base}.paginas.idx"
+
+    def _migrar(self, file_hash):
+        """Convierte una caché anterior (JSON, o solo '.paginas') a '.asii'. True si migró."""
+        ruta_json, ruta_datos, ruta_idx = self._rutas_legado(file_hash)
+        try:
+            if os.path.exists(ruta_json):
+                with open(ruta_json, 'r', encoding='utf-8') as f:
+                    datos = json.load(f)
+            elif os.path.exists(ruta_idx):
+                with open(ruta_idx, 'r', encoding='utf-8') as f:
+                    indice = json.load(f)
+                with open(ruta_datos, "rb") as f:
+                    crudo = f.read()
+                datos = {"mapa_paginas": {p: crudo[o:o + l].decode("utf-8") for p, o, l in indice}}
+            else:
+                return False
+            escribir_documento_binario(self._ruta_binaria(file_hash), datos)
+        except Exception as e:
+            print(f"[Caché Error Migración] {e}")
+            return False
+        for ruta in (ruta_json, ruta_datos, ruta_idx):
+            if os.path.exists(ruta): os.remove(ruta)
+        print(f">> [Caché] Migrado a formato binario ({file_hash[:12]}...)")
+        return True
+
+    def migrar_todo(self):
+        """Migra de una vez todas las cachés anteriores de la carpeta. Retorna cuántas migró."""
+        hashes = {n.split(".", 1)[0] for n in os.listdir(self.cache_dir) if n.endswith((".json", ".paginas.idx"))}
+        return sum(1 for h in sorted(hashes) if not os.path.exists(self._ruta_binaria(h)) and self._migrar(h))
+
+    def obtener_documento(self, ruta_pdf):
+        """DocumentoCacheado del PDF (None si no está procesado): nivel memoria, luego disco."""
         if not os.path.exists(ruta_pdf):
             return None
-            
+
         file_hash = self._generar_hash_archivo(ruta_pdf)
-        ruta_json = os.path.join(self.cache_dir, f"{file_hash}.json")
-        
-        if os.path.exists(ruta_json):
-            try:
-                with open(ruta_json, 'r', encoding='utf-8') as f:
-                    datos = json.load(f)
-                    print(f">> [Caché] HIT: Documento recuperado de memoria ({os.path.basename(ruta_pdf)})")
-                    return datos
-            except Exception as e:
-                print(f"[Caché Error] {e}")
-                return None
-        
-        print(f">> [Caché] MISS: El documento no está procesado ({os.path.basename(ruta_pdf)})")
-        return None
+        with self._lock:
+            documento = self._memoria.get(file_hash)
+            if documento is not None:
+                self._memoria.move_to_end(file_hash)
+                self.metricas["memoria_aciertos"] += 1
+                return documento
+            self.metricas["memoria_fallos"] += 1
+
+        ruta_bin = self._ruta_binaria(file_hash)
+        if not os.path.exists(ruta_bin) and not self._migrar(file_hash):
+            self.metricas["disco_fallos"] += 1
+            return None
+        try:
+            documento = DocumentoCacheado(ruta_bin)
+        except Exception as e:
+            print(f"[Caché Error] {e}")
+            self.metricas["disco_fallos"] += 1
+            return None
+        self.metricas["disco_aciertos"] += 1
+        self._imagenes[os.path.abspath(ruta_bin)] = documento.meta.get("ruta_imagenes") or ""
+        self._registrar_acceso(ruta_bin, documento.meta.get("ruta_imagenes"))
+
+        with self._lock:
+            self._memoria[file_hash] = documento
+            self._bytes_memoria += documento.peso
+            documento.al_crecer = lambda delta: self._al_crecer(file_hash, delta)
+            self._ajustar_memoria(proteger=file_hash)
+        return documento
+
+    def obtener_mapa_paginas(self, ruta_pdf):
+        """Mapa de páginas perezoso del documento (None si no está procesado)."""
+        documento = self.obtener_documento(ruta_pdf)
+        return MapaPaginasPerezoso(documento) if documento else None
+
+    def obtener_analisis_cacheado(self, ruta_pdf):
+        """Intenta recuperar el análisis completo. Retorna None si no existe."""
+        documento = self.obtener_documento(ruta_pdf)
+        if documento is None:
+            if os.path.exists(ruta_pdf):
+                print(f">> [Caché] MISS: El documento no está procesado ({os.path.basename(ruta_pdf)})")
+            return None
+        try:
+            datos = documento.como_dict()
+            print(f">> [Caché] HIT: Documento recuperado de memoria ({os.path.basename(ruta_pdf)})")
+            return datos
+        except Exception as e:
+            print(f"[Caché Error] {e}")
+            return None
 
     def guardar_en_cache(self, ruta_pdf, datos_procesados):
-        """Guarda el diccionario de análisis en disco."""
+        """Guarda el diccionario de análisis en disco (formato binario)."""
         file_hash = self._generar_hash_archivo(ruta_pdf)
-        ruta_json = os.path.join(self.cache_dir, f"{file_hash}.json")
-        
+
+        ruta_bin = self._ruta_binaria(file_hash)
+        self._olvidar(file_hash)  # La versión en memoria (si había) queda obsoleta
+
         try:
-            with open(ruta_json, 'w', encoding='utf-8') as f:
-                json.dump(datos_procesados, f, ensure_ascii=False, indent=2)
+            escribir_documento_binario(ruta_bin, datos_procesados)
             print(f">> [Caché] SAVE: Análisis guardado exitosamente.")
         except Exception as e:
             print(f"[Caché Error Save] {e}")
+            return
+        ruta_imagenes = datos_procesados.get("ruta_imagenes")
+        self._imagenes[os.path.abspath(ruta_bin)] = ruta_imagenes or ""
+        self._registrar_acceso(ruta_bin, ruta_imagenes)
+        self.aplicar_cuota(proteger=(ruta_bin, ruta_imagenes))
 
 # Instancia global
-gestor_cache = CacheManager()
\ No newline at end of file
+gestor_cache = CacheManager()
@@ -0,0 +1,83 @@
+"""
+Plazos por Consulta (deadline.py) - Presupuesto de Tiempo de Punta a Punta
+--------------------------------------------------------------------------
+Cada consulta recibe un plazo absoluto (TIMEOUT_CONSULTA) que viaja con ella por visión,
+búsqueda, rerank y generación sin tocar firmas: se guarda en un ContextVar, que asyncio
+copia a las tareas hijas y 'asyncio.to_thread' a sus hilos.
+1. 'con_plazo(seg)': abre el presupuesto de la consulta.
+2. 'ejecutar_con_plazo(corrutina, etapa, reserva)': espera la etapa como máximo lo que
+   quede (menos la reserva para etapas posteriores); si no alcanza -> 'PlazoAgotado'.
+3. 'sin_plazo()': para trabajo en segundo plano que no debe heredar el plazo (borradores).
+Nota: un hilo no se puede interrumpir; al vencer se deja de esperarlo y su resultado se descarta.
+"""
+import time
+import asyncio
+import contextvars
+from contextlib import contextmanager
+from typing import Optional
+
+from app.logic.telemetry import telemetria
+
+
+class PlazoAgotado(Exception):
+    """La etapa 'etapa' no terminó dentro del presupuesto de la consulta."""
+
+    def __init__(self, etapa: str):
+        super().__init__(f"Plazo agotado en '{etapa}'")
+        self.etapa = etapa
+
+
+class Plazo:
+
+    def __init__(self, segundos: float):
+        self.segundos = segundos
+        self.limite = time.monotonic() + segundos
+
+    def restante(self) -> float:
+        return self.limite - time.monotonic()
+
+    def agotado(self) -> bool:
+        return self.restante() <= 0
+
+
+_plazo_actual: contextvars.ContextVar[Optional[Plazo]] = contextvars.ContextVar("plazo_consulta", default=None)
+
+def plazo_actual() -> Optional[Plazo]:
+    return _plazo_actual.get()
+
+@contextmanager
+def con_plazo(segundos: float):
+    token = _plazo_actual.set(Plazo(segundos))
+    try:
+        yield _plazo_actual.get()
+    finally:
+        _plazo_actual.reset(token)
+
+@contextmanager
+def sin_plazo():
+    token = _plazo_actual.set(None)
+    try:
+        yield
+    finally:
+        _plazo_actual.reset(token)
+
+async def ejecutar_con_plazo(corrutina, etapa: str, reserva: float = 0.0):
+    """Await de 'corrutina' acotado por el plazo actual (sin plazo, espera normal)."""
+    plazo = plazo_actual()
+    if plazo is None:
+        return await corrutina
+    disponible = plazo.restante() - reserva
+    if disponible <= 0:
+        if asyncio.iscoroutine(corrutina): corrutina.close()
+        else: corrutina.cancel()
+        _registrar(etapa, plazo)
+        raise PlazoAgotado(etapa)
+    try:
+        return await asyncio.wait_for(corrutina, timeout=disponible)
+    except asyncio.TimeoutError:
+        _registrar(etapa, plazo)
+        raise PlazoAgotado(etapa)
+
+def _registrar(etapa, plazo):
+    print(f">> [Plazo] Etapa '{etapa}' cancelada (presupuesto {plazo.segundos:.0f}s).")
+    telemetria.emitir("plazo_agotado", etapa=etapa, presupuesto_seg=plazo.segundos)
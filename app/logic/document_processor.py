@@ -3,13 +3,14 @@ Procesador Documental V32 (document_processor.py) - Pre-Análisis Ligero
 -----------------------------------------------------------------------
 Mejoras:
 1. Función 'extraer_info_ligera': Obtiene TOC, Primeras Páginas y Metadata 
-   sin procesar el documento completo.
+   desde la ficha estructural precalculada en la ingesta (sin abrir el PDF).
 2. Función 'construir_contexto_paginas': Carga quirúrgica de páginas.
 3. Corrige errores de indentación y limpieza de imports.
 """
 import os
 import shutil
 import re
+import bisect
 import fitz  # PyMuPDF
 try:
     import pymupdf4llm
@@ -17,6 +18,51 @@ except ImportError:
     print("Error: Falta pymupdf4llm. Instálalo con pip install pymupdf4llm")
 
 from app.core.config import Configuracion
+from app.logic.structure_store import almacen_estructura
+from app.logic.fulltext_index import indice_texto
+from app.logic.single_flight import normalizar_pregunta
+
+# Palabras vacías que no sirven para elegir páginas
+PALABRAS_VACIAS = {
+    "que", "como", "para", "por", "con", "los", "las", "del", "una", "uno", "unos", "unas",
+    "esta", "este", "esto", "donde", "cual", "cuales", "cuando", "hay", "hace", "hacer",
+    "puedo", "debo", "tengo", "sobre", "entre", "pero", "sus", "mas", "muy", "sin", "ser",
+    "son", "manual", "documento", "explica", "explicame", "dime", "quiero", "necesito"
+}
+
+_RE_TITULO_NAVEGACION = re.compile(r'^(#{1,3})\s+(.+)$', re.MULTILINE)
+_RE_LIMPIEZA_CONTEXTO = re.compile(r'[#*`\n]')
+SEPARADOR_PAGINA = '\n---\n'
+
+def _primeras_apariciones(texto, nombres, sufijo):
+    """
+    {nombre: índice de su primera aparición en 'texto'} para nombres que terminan en 'sufijo'.
+    Toda aparición termina en una aparición del sufijo: se recorre el texto una vez
+    y en cada sufijo se prueban los largos de nombre existentes (búsqueda en set).
+    """
+    pendientes = set(nombres)
+    largos = sorted({len(n) for n in pendientes})
+    primeras = {}
+    pos = texto.find(sufijo)
+    while pos != -1 and pendientes:
+        fin = pos + len(sufijo)
+        for largo in largos:
+            if largo > fin: break
+            candidato = texto[fin - largo:fin]
+            if candidato in pendientes:
+                primeras[candidato] = fin - largo
+                pendientes.discard(candidato)
+        pos = texto.find(sufijo, pos + 1)
+    return primeras
+
+def _fines_separador(texto, separador):
+    """Posiciones finales de las apariciones sin solapamiento (mismo criterio que str.count)."""
+    fines = []
+    pos = texto.find(separador)
+    while pos != -1:
+        fines.append(pos + len(separador))
+        pos = texto.find(separador, pos + len(separador))
+    return fines
 
 class ProcesadorDocumental:
     
@@ -25,76 +71,23 @@ class ProcesadorDocumental:
         if not os.path.exists(self.img_dir):
             os.makedirs(self.img_dir)
 
-    def extraer_info_ligera(self, ruta_pdf):
+    def extraer_info_ligera(self, ruta_pdf, doc_id=None):
         """
-        Extrae información ESTRUCTURAL rápida para decidir relevancia.
-        NO procesa todo el documento. Es barato y rápido.
-        Retorna: dict con índice, títulos clave, resumen y metadatos.
+        Devuelve la información ESTRUCTURAL para decidir relevancia.
+        Se lee de la ficha precalculada en la ingesta (structure_store): NO abre el PDF.
+        Retorna: dict con índice, títulos clave, resumen y metadatos (None si no fue ingestado).
         """
-        if not os.path.exists(ruta_pdf): return None
-
-        try:
-            doc = fitz.open(ruta_pdf)
-            
-            # 1. ÍNDICE (Table of Contents)
-            toc = doc.get_toc()
-            indice_texto = ""
-            if toc:
-                # Tomamos solo los primeros 20 items para no saturar
-                for nivel, titulo, pagina in toc[:20]:
-                    indent = "  " * (nivel - 1)
-                    indice_texto += f"{indent}• {titulo} (pág {pagina})\n"
-            else:
-                indice_texto = "⚠️ Este documento no tiene índice estructurado."
-
-            # 2. PRIMERAS 3 PÁGINAS (Introducción/Resumen)
-            primeras_pags = ""
-            num_pags_leer = min(3, len(doc))
-            for i in range(num_pags_leer):
-                primeras_pags += doc[i].get_text()[:800] + "\n...\n"
-
-            # 3. ESCANEO RÁPIDO DE TÍTULOS (Heurística visual)
-            titulos_detectados = []
-            num_pags_scan = min(5, len(doc))
-            for i in range(num_pags_scan):
-                texto = doc[i].get_text()
-                for linea in texto.split('\n'):
-                    l = linea.strip()
-                    # Detectar líneas mayúsculas que parecen títulos
-                    if l.isupper() and 4 < len(l) < 70 and any(c.isalpha() for c in l):
-                        if l not in titulos_detectados:
-                            titulos_detectados.append(l)
-            
-            # 4. METADATA
-            meta = doc.metadata or {}
-
-            info = {
-                "num_paginas": len(doc),
-                "indice": indice_texto,
-                "resumen_inicio": primeras_pags,
-                "titulos_clave": titulos_detectados[:8], # Top 8 títulos
-                "metadata": {
-                    "titulo": meta.get("title", "Sin título"),
-                    "autor": meta.get("author", "Desconocido")
-                }
-            }
-            doc.close()
-            return info
-
-        except Exception as e:
-            print(f"[Error info ligera] {e}")
-            return {
-                "num_paginas": 0,
-                "indice": "Error de lectura",
-                "resumen_inicio": "",
-                "titulos_clave": [],
-                "metadata": {}
-            }
+        info = almacen_estructura.obtener(doc_id=doc_id, ruta=ruta_pdf)
+        if info is None:
+            print(f"[Info ligera] Sin ficha estructural para {os.path.basename(ruta_pdf)}. ¿Falta ejecutar la ingesta?")
+        return info
 
     def procesar_pdf(self, ruta_pdf):
         """
         Procesamiento PROFUNDO (Solo cuando ya decidimos leerlo).
         Genera Markdown, imágenes y mapas de navegación.
+        El PDF se abre UNA vez: pymupdf4llm trabaja sobre el documento abierto (por páginas)
+        y en el mismo recorrido salen texto plano, mapa de páginas, títulos y banderas de metadata.
         """
         if not os.path.exists(ruta_pdf): return None
         
@@ -104,19 +97,40 @@ class ProcesadorDocumental:
 
         print(f">> [Procesador] Analizando {nombre}...")
 
-        # 1. Markdown + Imágenes
-        md_text = pymupdf4llm.to_markdown(
-            ruta_pdf, 
-            write_images=True, 
-            image_path=output_folder, 
-            image_format="jpg"
-        )
-        
-        # 2. Catálogo y Mapas
+        doc = fitz.open(ruta_pdf)
+        try:
+            # 1. Markdown + Imágenes (un bloque por página, sobre el documento ya abierto)
+            bloques = pymupdf4llm.to_markdown(
+                doc, 
+                write_images=True, 
+                image_path=output_folder, 
+                image_format="jpg",
+                page_chunks=True
+            )
+
+            # 2. Un solo recorrido: Markdown, texto plano, mapa de páginas y títulos
+            partes_md, textos, mapa_paginas, titulos = [], [], {}, []
+            tiene_codigo = tiene_tablas = False
+            for bloque in bloques:
+                md_pagina = bloque["text"]
+                meta = bloque["metadata"]
+                numero = meta.get("page_number") or meta["page"]  # Según versión de pymupdf4llm
+                texto = self._texto_pagina(doc, numero)
+                partes_md.append(md_pagina)
+                textos.append(texto)
+                mapa_paginas[numero] = texto
+                titulos.extend(self._titulos_navegacion(md_pagina))
+                tiene_codigo = tiene_codigo or "```" in md_pagina
+                tiene_tablas = tiene_tablas or "|" in md_pagina
+        finally:
+            doc.close()
+
+        # Igual que la salida sin 'page_chunks': las páginas concatenadas
+        md_text = "".join(partes_md)
+        texto_plano = "\n".join(textos)
+        estructura = "\n".join(titulos)
+        metadata = self._generar_metadata(ruta_pdf, tiene_codigo, tiene_tablas)
         catalogo = self._crear_catalogo_imagenes(md_text, output_folder)
-        texto_plano, mapa_paginas = self._extraer_texto_y_mapa(ruta_pdf)
-        estructura = self._extraer_mapa_navegacion(md_text)
-        metadata = self._generar_metadata(md_text, ruta_pdf)
 
         return {
             "contenido_markdown": md_text,
@@ -128,6 +142,27 @@ class ProcesadorDocumental:
             "catalogo_imagenes": catalogo
         }
 
+    def seleccionar_paginas_relevantes(self, pregunta, mapa_paginas, nombre_archivo=None, max_paginas=4):
+        """
+        Elige las páginas que mejor responden la consulta (para 'construir_contexto_paginas').
+        1. Índice de texto completo (BM25) si el manual está indexado: no toca las páginas.
+        2. Respaldo: conteo de términos página por página sobre el mapa (perezoso o dict).
+        """
+        terminos = [t for t in normalizar_pregunta(pregunta).split() if len(t) > 2 and t not in PALABRAS_VACIAS]
+        if not terminos or not mapa_paginas: return []
+
+        if nombre_archivo and indice_texto.tiene_documento(nombre_archivo):
+            paginas = indice_texto.paginas_relevantes(terminos, nombre_archivo, max_paginas)
+            if paginas: return paginas
+
+        puntajes = []
+        for pagina in mapa_paginas:
+            texto = normalizar_pregunta(mapa_paginas[pagina])
+            puntaje = sum(texto.count(t) for t in terminos)
+            if puntaje: puntajes.append((puntaje, int(pagina)))
+        puntajes.sort(reverse=True)
+        return [p for _, p in puntajes[:max_paginas]]
+
     def construir_contexto_paginas(self, mapa_paginas, paginas_interes, ventana=1):
         """
         Construye el contexto de texto SOLO de las páginas relevantes.
@@ -162,20 +197,27 @@ class ProcesadorDocumental:
     # --- HELPERS INTERNOS ---
 
     def _crear_catalogo_imagenes(self, markdown, carpeta_imgs):
+        """
+        Catálogo de imágenes extraídas con contexto y página aproximada.
+        Un solo barrido indexa las referencias '.jpg' y los separadores de página;
+        la página de cada imagen sale por búsqueda binaria (lineal en el tamaño del Markdown).
+        """
         catalogo = []
         if not os.path.exists(carpeta_imgs): return catalogo
         
         archivos = sorted([f for f in os.listdir(carpeta_imgs) if f.endswith('.jpg')])
+        primeras = _primeras_apariciones(markdown, archivos, ".jpg")
+        fines_separador = _fines_separador(markdown, SEPARADOR_PAGINA)
         for img in archivos:
-            if img in markdown:
+            idx = primeras.get(img)
+            if idx is not None:
                 # Buscar contexto (150 chars antes)
-                idx = markdown.find(img)
                 raw_ctx = markdown[max(0, idx-150):idx]
-                ctx = re.sub(r'[#*`\n]', ' ', raw_ctx).strip()
+                ctx = _RE_LIMPIEZA_CONTEXTO.sub(' ', raw_ctx).strip()
                 if len(ctx) < 10: ctx = "Imagen técnica."
                 
-                # Página aproximada
-                pag = markdown[:idx].count('\n---\n') + 1
+                # Página aproximada: separadores completos antes de la imagen
+                pag = bisect.bisect_right(fines_separador, idx) + 1
                 
                 catalogo.append({
                     "archivo": img,
@@ -185,36 +227,32 @@ class ProcesadorDocumental:
                 })
         return catalogo
 
-    def _extraer_texto_y_mapa(self, ruta_pdf):
-        full_text = []
-        page_map = {}
+    def _texto_pagina(self, doc, numero):
+        """Texto plano de la página 'numero' (1-based) del documento ya abierto."""
         try:
-            doc = fitz.open(ruta_pdf)
-            for i, page in enumerate(doc):
-                text = page.get_text("text")
-                full_text.append(text)
-                page_map[i+1] = text
-            doc.close()
-            return "\n".join(full_text), page_map
+            return doc[numero - 1].get_text("text")
         except Exception as e:
-            print(f"Error texto plano: {e}")
-            return "", {}
+            print(f"Error texto plano (pág {numero}): {e}")
+            return ""
 
-    def _generar_metadata(self, texto, ruta):
+    def _generar_metadata(self, ruta, tiene_codigo, tiene_tablas):
         return {
             "nombre_archivo": os.path.basename(ruta),
             "peso_kb": os.path.getsize(ruta) // 1024,
-            "tiene_codigo": "```" in texto,
-            "tiene_tablas": "|" in texto
+            "tiene_codigo": tiene_codigo,
+            "tiene_tablas": tiene_tablas
         }
 
-    def _extraer_mapa_navegacion(self, markdown):
+    def _titulos_navegacion(self, markdown):
+        """Entradas del mapa de navegación (títulos # a ###) de un fragmento de Markdown."""
         mapa = []
-        titulos = re.findall(r'^(#{1,3})\s+(.+)$', markdown, re.MULTILINE)
-        for nivel_hashtags, texto in titulos:
+        for nivel_hashtags, texto in _RE_TITULO_NAVEGACION.findall(markdown):
             nivel = len(nivel_hashtags)
             icono = "📄" if nivel > 1 else "📘"
             mapa.append(f"{'  '*(nivel-1)}{icono} {texto.strip()}")
-        return "\n".join(mapa)
+        return mapa
+
+    def _extraer_mapa_navegacion(self, markdown):
+        return "\n".join(self._titulos_navegacion(markdown))
 
 procesador = ProcesadorDocumental()
\ No newline at end of file
@@ -0,0 +1,104 @@
+"""
+Caché de Evidencias por Sesión (evidence_cache.py) - Seguimiento en Lectura Profunda
+------------------------------------------------------------------------------------
+En LECTURA_PROFUNDA las preguntas de seguimiento suelen caer en las mismas secciones.
+1. Guardamos por sesión los chunks recuperados del manual activo junto con su vector E5.
+2. Cada pregunta nueva se puntúa primero contra ese conjunto (coseno en memoria).
+3. Solo si la cobertura es pobre se consulta Chroma de nuevo (recuperación incremental).
+4. Acotada por sesión (LRU de chunks) y por número de sesiones; se descarta en 'limpiar_sesion'.
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from app.core.config import Configuracion
+from app.logic.rag_engine_v8 import embeber_consulta, recuperar_contenido_por_vector, rerankear_contenido
+from app.logic.session_manager import gestor_sesiones
+
+
+class CacheEvidencias:
+
+    def __init__(self, max_chunks=60, max_sesiones=500, umbral_cobertura=0.85, min_cubiertos=3, k_crudos=20):
+        self.max_chunks = max_chunks
+        self.max_sesiones = max_sesiones
+        self.umbral_cobertura = umbral_cobertura
+        self.min_cubiertos = min_cubiertos
+        self.k_crudos = k_crudos
+        # { "chat_id": {"doc_id": str, "chunks": OrderedDict(id -> fragmento)} }
+        self._sesiones: "OrderedDict[str, dict]" = OrderedDict()
+        self._lock = threading.Lock()  # 'buscar' corre en hilos (asyncio.to_thread)
+        self.metricas = {"hits": 0, "incrementales": 0, "fallos": 0}
+
+    # --- Gestión del Conjunto ---
+
+    def _entrada(self, session_id, doc_id):
+        entrada = self._sesiones.get(session_id)
+        if entrada is None or entrada["doc_id"] != doc_id:
+            entrada = {"doc_id": doc_id, "chunks": OrderedDict()}
+            self._sesiones[session_id] = entrada
+        self._sesiones.move_to_end(session_id)
+        while len(self._sesiones) > self.max_sesiones:
+            self._sesiones.popitem(last=False)
+        return entrada
+
+    def _incorporar(self, entrada, fragmentos):
+        chunks = entrada["chunks"]
+        for frag in fragmentos:
+            chunks[frag["id"]] = frag
+            chunks.move_to_end(frag["id"])
+        while len(chunks) > self.max_chunks:
+            chunks.popitem(last=False)
+
+    def _puntuar(self, vector_consulta, chunks):
+        """Similitud coseno de la consulta contra todos los chunks cacheados (una multiplicación)."""
+        ids = list(chunks.keys())
+        matriz = np.asarray([chunks[i]["vector"] for i in ids], dtype=np.float32)
+        q = np.asarray(vector_consulta, dtype=np.float32)
+        sims = matriz @ q / (np.linalg.norm(matriz, axis=1) * np.linalg.norm(q) + 1e-9)
+        return ids, sims
+
+    # --- API Pública ---
+
+    def buscar(self, session_id: str, query: str, doc_id: str, k: int = 8):
+        """Mismo contrato que 'buscar_contenido_profundo', resolviendo desde la caché cuando alcanza."""
+        session_id = str(session_id)
+        vector = embeber_consulta(query)
+
+        candidatos = None
+        with self._lock:
+            entrada = self._entrada(session_id, doc_id)
+            if entrada["chunks"]:
+                ids, sims = self._puntuar(vector, entrada["chunks"])
+                cubiertos = int((sims >= self.umbral_cobertura).sum())
+                if cubiertos >= self.min_cubiertos:
+                    self.metricas["hits"] += 1
+                    orden = np.argsort(-sims)[:self.k_crudos]
+                    candidatos = [entrada["chunks"][ids[i]] for i in orden]
+                    for frag in candidatos: entrada["chunks"].move_to_end(frag["id"])
+                else:
+                    self.metricas["incrementales"] += 1
+            else:
+                self.metricas["fallos"] += 1
+
+        if candidatos is not None:
+            print(f">> [Evidencias {session_id}] HIT: {cubiertos} chunks cubren la consulta.")
+            return rerankear_contenido(query, candidatos, k)
+
+        # Cobertura pobre: recuperación incremental desde Chroma
+        nuevos = recuperar_contenido_por_vector(vector, doc_id, self.k_crudos)
+        with self._lock:
+            self._incorporar(self._entrada(session_id, doc_id), nuevos)
+        return rerankear_contenido(query, nuevos, k)
+
+    def descartar(self, session_id: str):
+        with self._lock:
+            self._sesiones.pop(str(session_id), None)
+
+# Instancia global
+cache_evidencias = CacheEvidencias(
+    max_chunks=Configuracion.CACHE_EVIDENCIAS_MAX_CHUNKS,
+    umbral_cobertura=Configuracion.CACHE_EVIDENCIAS_UMBRAL,
+    min_cubiertos=Configuracion.CACHE_EVIDENCIAS_MIN_CUBIERTOS
+)
+gestor_sesiones.registrar_al_limpiar(cache_evidencias.descartar)
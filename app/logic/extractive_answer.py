@@ -0,0 +1,79 @@
+"""
+Respuesta Extractiva (extractive_answer.py) - Atajo sin LLM
+-----------------------------------------------------------
+Si el Re-Ranker está casi seguro de un fragmento (logit muy alto y con margen claro
+sobre el segundo), devolvemos ese fragmento limpio en Markdown con cita de página y
+sección, en lugar de pagar una vuelta completa a Gemini para parafrasearlo.
+El usuario puede pedir la 'explicación completa' y ahí sí se invoca al LLM.
+"""
+import re
+
+from app.core.config import Configuracion
+from app.core.contracts import SCORE_THRESHOLD
+
+# Frases que disparan la explicación completa (LLM) tras una respuesta extractiva
+FRASES_EXPLICACION = ("explicación completa", "explicacion completa", "explica más", "explica mas", "más detalle", "mas detalle")
+
+SUGERENCIA_EXPLICACION = "💬 ¿Necesitas más contexto? Escribe *explicación completa* y la desarrollo en detalle."
+
+_RE_CABECERA_CHUNK = re.compile(r'^(MANUAL|SECCIÓN):.*$', re.MULTILINE)
+_RE_TITULO_MD = re.compile(r'^#{1,6}[ \t]*(.+?)[ \t]*#*$', re.MULTILINE)
+_RE_NEGRITA_DOBLE = re.compile(r'\*\*(.+?)\*\*')
+_RE_LINEAS_VACIAS = re.compile(r'\n{3,}')
+_RE_ESPACIOS = re.compile(r'[ \t]{2,}')
+
+# Consultas que llegaron al lector vs. resueltas sin LLM
+metricas = {"consultas_lector": 0, "extractivas": 0}
+
+
+def umbral_extractivo() -> float:
+    return Configuracion.UMBRAL_EXTRACTIVO if Configuracion.UMBRAL_EXTRACTIVO is not None else SCORE_THRESHOLD["EXTRACTIVE_ANSWER"]
+
+def es_candidata_extractiva(evidencias) -> bool:
+    """True si el mejor fragmento supera el umbral y se separa lo suficiente del segundo."""
+    if not Configuracion.RESPUESTA_EXTRACTIVA or not evidencias: return False
+    top = float(evidencias[0]["rerank_score"])
+    if top < umbral_extractivo(): return False
+    if len(evidencias) > 1:
+        return top - float(evidencias[1]["rerank_score"]) >= Configuracion.MARGEN_EXTRACTIVO
+    return True
+
+def limpiar_fragmento(texto: str) -> str:
+    """Convierte el chunk indexado en Markdown legible para Telegram."""
+    texto = _RE_CABECERA_CHUNK.sub("", texto)
+    texto = _RE_TITULO_MD.sub(r'*\1*', texto)        # Telegram no soporta '#'
+    texto = _RE_NEGRITA_DOBLE.sub(r'*\1*', texto)
+    texto = _RE_ESPACIOS.sub(" ", texto)
+    texto = _RE_LINEAS_VACIAS.sub("\n\n", texto)
+    return texto.strip()
+
+def construir_respuesta_extractiva(evidencia: dict, nombre_archivo: str) -> str:
+    seccion = evidencia.get("seccion", "").strip(" >")
+    cita = f"📄 _Fuente: {nombre_archivo} — Pág. {evidencia.get('pagina', 'N/A')}"
+    if seccion: cita += f" · {seccion}"
+    cita += "_"
+    return f"📌 *Respuesta directa del manual:*\n\n{limpiar_fragmento(evidencia['texto'])}\n\n{cita}\n\n{SUGERENCIA_EXPLICACION}"
+
+def construir_respuesta_parcial(evidencias, nombre_archivo: str, max_fragmentos: int = 3) -> str:
+    """Respaldo cuando Gemini no responde a tiempo: los mejores fragmentos, cada uno con su página."""
+    bloques = []
+    for ev in evidencias[:max_fragmentos]:
+        seccion = ev.get("seccion", "").strip(" >")
+        cita = f"📄 _Pág. {ev.get('pagina', 'N/A')}" + (f" · {seccion}" if seccion else "") + "_"
+        bloques.append(f"{limpiar_fragmento(ev['texto'])}\n{cita}")
+    cuerpo = "\n\n".join(bloques)
+    return (f"⏱️ *No alcancé a redactar la respuesta a tiempo.* Estos son los fragmentos más relevantes "
+            f"de *{nombre_archivo}*:\n\n{cuerpo}\n\n{SUGERENCIA_EXPLICACION}")
+
+def pide_explicacion_completa(pregunta: str) -> bool:
+    p = pregunta.lower()
+    return any(frase in p for frase in FRASES_EXPLICACION)
+
+def registrar_consulta(extractiva: bool):
+    metricas["consultas_lector"] += 1
+    if extractiva: metricas["extractivas"] += 1
+
+def obtener_metricas() -> dict:
+    """Proporción de llamadas al LLM evitadas por el atajo extractivo."""
+    total = metricas["consultas_lector"]
+    return {**metricas, "proporcion_evitada": (metricas["extractivas"] / total) if total else 0.0}
@@ -0,0 +1,64 @@
+"""
+Almacén de FAQ Precalculadas (faq_store.py)
+-------------------------------------------
+Respuestas generadas offline (dataa/precomputar_faq.py) que el bot sirve al instante.
+Clave: pregunta normalizada + perfil. SQLite local, una conexión por operación
+(el bot y el script nocturno pueden usarlo a la vez).
+"""
+import os
+import json
+import sqlite3
+from datetime import datetime
+from typing import Optional
+
+from app.core.config import Configuracion
+from app.logic.single_flight import normalizar_pregunta
+
+
+class AlmacenFAQ:
+
+    def __init__(self, ruta_db):
+        self.ruta_db = ruta_db
+        os.makedirs(os.path.dirname(ruta_db), exist_ok=True)
+        with self._conectar() as con:
+            con.execute("""
+                CREATE TABLE IF NOT EXISTS faq (
+                    clave TEXT PRIMARY KEY,
+                    pregunta TEXT NOT NULL,
+                    perfil TEXT NOT NULL,
+                    respuesta TEXT NOT NULL,
+                    manual_meta TEXT,
+                    generado_en TEXT NOT NULL
+                )
+            """)
+
+    def _conectar(self):
+        return sqlite3.connect(self.ruta_db, timeout=10)
+
+    @staticmethod
+    def clave(pregunta: str, perfil: str) -> str:
+        return f"{perfil}|{normalizar_pregunta(pregunta)}"
+
+    def obtener(self, pregunta: str, perfil: str) -> Optional[dict]:
+        try:
+            with self._conectar() as con:
+                fila = con.execute(
+                    "SELECT respuesta, manual_meta FROM faq WHERE clave = ?", (self.clave(pregunta, perfil),)
+                ).fetchone()
+        except sqlite3.Error as e:
+            print(f"[FAQ Error] {e}")
+            return None
+        if not fila: return None
+        return {"respuesta": fila[0], "manual_meta": json.loads(fila[1]) if fila[1] else None}
+
+    def guardar(self, pregunta: str, perfil: str, respuesta: str, manual_meta: Optional[dict] = None):
+        with self._conectar() as con:
+            con.execute(
+                "INSERT OR REPLACE INTO faq VALUES (?, ?, ?, ?, ?, ?)",
+                (self.clave(pregunta, perfil), pregunta, perfil, respuesta,
+                 json.dumps(manual_meta, ensure_ascii=False, default=str) if manual_meta else None,
+                 datetime.now().isoformat(timespec="seconds"))
+            )
+
+# Instancia global
+almacen_faq = AlmacenFAQ(os.path.join(Configuracion.DIRECTORIO_BASE, "data", "faq_precalculadas.db"))
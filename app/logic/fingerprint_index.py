@@ -0,0 +1,143 @@
+"""
+Índice de Huellas (fingerprint_index.py) - SHA256 de PDFs sin Re-Hashear
+------------------------------------------------------------------------
+La caché de documentos y la ingesta identifican cada PDF por el SHA256 de su contenido.
+Calcularlo en cada consulta obliga a leer el manual completo (varios MB) antes de tocar la caché.
+1. Índice (ruta, tamaño, mtime_ns, inodo) -> digest en SQLite, con copia en memoria:
+   si el archivo no cambió, la huella sale del índice sin leer un byte del PDF.
+2. Re-hash (archivo nuevo o modificado): mmap + una sola llamada a sha256 (o lecturas de 8 MB
+   si el sistema de archivos no permite mmap).
+3. Lotes: 'huellas_lote' calcula las faltantes en paralelo con hilos (hashlib libera el GIL).
+"""
+import os
+import mmap
+import sqlite3
+import hashlib
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Optional, Tuple
+
+from app.core.config import Configuracion
+
+TAM_BUFFER = 8 * 1024 * 1024
+
+
+def sha256_archivo(ruta: str) -> str:
+    """SHA256 del contenido: mmap completo; lectura por bloques grandes como respaldo."""
+    sha = hashlib.sha256()
+    with open(ruta, "rb") as f:
+        try:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapa:
+                sha.update(mapa)
+        except (ValueError, OSError):
+            # Archivo vacío o sistema de archivos sin soporte de mmap
+            f.seek(0)
+            for bloque in iter(lambda: f.read(TAM_BUFFER), b""):
+                sha.update(bloque)
+    return sha.hexdigest()
+
+
+class IndiceHuellas:
+
+    def __init__(self, ruta_db):
+        self.ruta_db = ruta_db
+        os.makedirs(os.path.dirname(ruta_db), exist_ok=True)
+        self._memoria: Dict[str, Tuple[int, int, int, str]] = {}
+        self._lock = threading.Lock()
+        self.metricas = {"aciertos": 0, "calculadas": 0, "bytes_hasheados": 0}
+        with self._conectar() as con:
+            con.execute("""
+                CREATE TABLE IF NOT EXISTS huellas (
+                    ruta TEXT PRIMARY KEY,
+                    tamano INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    inodo INTEGER NOT NULL,
+                    sha256 TEXT NOT NULL,
+                    calculada_en TEXT NOT NULL
+                )
+            """)
+
+    def _conectar(self):
+        return sqlite3.connect(self.ruta_db, timeout=10)
+
+    @staticmethod
+    def _firma(ruta: str) -> Tuple[int, int, int]:
+        st = os.stat(ruta)
+        return (st.st_size, st.st_mtime_ns, st.st_ino)
+
+    def _buscar(self, ruta: str, firma) -> Optional[str]:
+        """Digest vigente para (ruta, firma): primero memoria, luego SQLite."""
+        with self._lock:
+            registro = self._memoria.get(ruta)
+        if registro is None:
+            try:
+                with self._conectar() as con:
+                    fila = con.execute("SELECT tamano, mtime_ns, inodo, sha256 FROM huellas WHERE ruta = ?", (ruta,)).fetchone()
+            except sqlite3.Error as e:
+                print(f"[Huellas Error] {e}")
+                fila = None
+            if fila is None: return None
+            registro = tuple(fila)
+            with self._lock:
+                self._memoria[ruta] = registro
+        return registro[3] if registro[:3] == firma else None
+
+    def _guardar(self, filas):
+        """filas: [(ruta, (tamaño, mtime_ns, inodo), digest)] en una sola transacción."""
+        ahora = datetime.now().isoformat(timespec="seconds")
+        with self._lock:
+            for ruta, firma, digest in filas:
+                self._memoria[ruta] = (*firma, digest)
+        try:
+            with self._conectar() as con:
+                con.executemany("INSERT OR REPLACE INTO huellas VALUES (?, ?, ?, ?, ?, ?)",
+                                [(ruta, *firma, digest, ahora) for ruta, firma, digest in filas])
+        except sqlite3.Error as e:
+            print(f"[Huellas Error] {e}")  # El digest sigue valiendo en memoria
+
+    def _calcular(self, ruta: str, firma) -> str:
+        digest = sha256_archivo(ruta)
+        with self._lock:
+            self.metricas["calculadas"] += 1
+            self.metricas["bytes_hasheados"] += firma[0]
+        return digest
+
+    def huella(self, ruta: str) -> str:
+        """SHA256 del PDF; solo lo recalcula si cambió tamaño, mtime o inodo."""
+        ruta = os.path.abspath(ruta)
+        firma = self._firma(ruta)
+        digest = self._buscar(ruta, firma)
+        if digest is not None:
+            with self._lock:
+                self.metricas["aciertos"] += 1
+            return digest
+        digest = self._calcular(ruta, firma)
+        self._guardar([(ruta, firma, digest)])
+        return digest
+
+    def huellas_lote(self, rutas: Iterable[str], max_hilos: Optional[int] = None) -> Dict[str, str]:
+        """{ruta: sha256} para muchos archivos; las huellas faltantes se calculan en paralelo."""
+        resultado, faltantes = {}, []
+        for original in rutas:
+            ruta = os.path.abspath(original)
+            firma = self._firma(ruta)
+            digest = self._buscar(ruta, firma)
+            if digest is None:
+                faltantes.append((original, ruta, firma))
+            else:
+                resultado[original] = digest
+        with self._lock:
+            self.metricas["aciertos"] += len(resultado)
+
+        if faltantes:
+            hilos = max_hilos or min(8, os.cpu_count() or 1, len(faltantes))
+            with ThreadPoolExecutor(max_workers=hilos) as pool:
+                digests = list(pool.map(lambda item: self._calcular(item[1], item[2]), faltantes))
+            self._guardar([(ruta, firma, d) for (_, ruta, firma), d in zip(faltantes, digests)])
+            for (original, _, _), d in zip(faltantes, digests):
+                resultado[original] = d
+        return resultado
+
+# Instancia global
+indice_huellas = IndiceHuellas(os.path.join(Configuracion.DIRECTORIO_BASE, "data", "huellas_docs.db"))
@@ -0,0 +1,116 @@
+"""
+Índice de Texto Completo (fulltext_index.py) - Ctrl+F sobre toda la Biblioteca
+------------------------------------------------------------------------------
+Reemplaza el escaneo regex página por página de 'buscar_regex_en_mapa'.
+1. SQLite FTS5 con una fila por página (texto + OCR), construido por la ingesta.
+2. Búsqueda por frase exacta o por prefijo, sin tildes ni mayúsculas (unicode61 remove_diacritics).
+3. Devuelve páginas con snippet resaltado, en milisegundos, en uno o en todos los manuales.
+"""
+import os
+import sqlite3
+from typing import Dict, List, Optional
+
+from app.core.config import Configuracion
+
+
+class IndiceTextoCompleto:
+
+    def __init__(self, ruta_db):
+        self.ruta_db = ruta_db
+        os.makedirs(os.path.dirname(ruta_db), exist_ok=True)
+        with self._conectar() as con:
+            con.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS paginas USING fts5(
+                    texto,
+                    doc_id UNINDEXED,
+                    nombre_archivo UNINDEXED,
+                    pagina UNINDEXED,
+                    tokenize = "unicode61 remove_diacritics 2"
+                )
+            """)
+            # Registro de documentos indexados (evita recorrer el FTS para saber si un manual está)
+            con.execute("""
+                CREATE TABLE IF NOT EXISTS documentos (
+                    doc_id TEXT PRIMARY KEY,
+                    nombre_archivo TEXT NOT NULL,
+                    num_paginas INTEGER NOT NULL
+                )
+            """)
+            con.execute("CREATE INDEX IF NOT EXISTS idx_documentos_nombre ON documentos(nombre_archivo)")
+
+    def _conectar(self):
+        return sqlite3.connect(self.ruta_db, timeout=10)
+
+    # --- Construcción (Ingesta) ---
+
+    def reiniciar(self):
+        """Vacía el índice (la ingesta reconstruye todo desde cero)."""
+        with self._conectar() as con:
+            con.execute("DELETE FROM paginas")
+            con.execute("DELETE FROM documentos")
+
+    def indexar_documento(self, doc_id: str, nombre_archivo: str, paginas: Dict[int, str]):
+        """Reemplaza las páginas indexadas de un documento. 'paginas': {num_pagina: texto}."""
+        with self._conectar() as con:
+            con.execute("DELETE FROM paginas WHERE doc_id = ?", (doc_id,))
+            con.executemany(
+                "INSERT INTO paginas (texto, doc_id, nombre_archivo, pagina) VALUES (?, ?, ?, ?)",
+                [(texto, doc_id, nombre_archivo, num) for num, texto in paginas.items() if texto and texto.strip()]
+            )
+            con.execute("INSERT OR REPLACE INTO documentos VALUES (?, ?, ?)", (doc_id, nombre_archivo, len(paginas)))
+
+    # --- Consulta ---
+
+    @staticmethod
+    def _expresion(termino: str, prefijo: bool) -> str:
+        """Frase exacta FTS5 (comillas escapadas); con prefijo la última palabra admite continuación."""
+        frase = '"' + termino.strip().replace('"', '""') + '"'
+        return frase + "*" if prefijo else frase
+
+    def buscar(self, termino: str, doc_id: Optional[str] = None, nombre_archivo: Optional[str] = None,
+               prefijo: bool = False, limite: int = 20) -> List[dict]:
+        """Páginas que contienen la frase (o prefijo), ordenadas por relevancia BM25."""
+        if not termino or not termino.strip(): return []
+
+        sql = ("SELECT doc_id, nombre_archivo, pagina, snippet(paginas, 0, '*', '*', '…', 12) "
+               "FROM paginas WHERE paginas MATCH ?")
+        params = [self._expresion(termino, prefijo)]
+        if doc_id:
+            sql += " AND doc_id = ?"
+            params.append(doc_id)
+        if nombre_archivo:
+            sql += " AND nombre_archivo = ?"
+            params.append(nombre_archivo)
+        sql += " ORDER BY bm25(paginas) LIMIT ?"
+        params.append(limite)
+
+        try:
+            with self._conectar() as con:
+                filas = con.execute(sql, params).fetchall()
+        except sqlite3.Error as e:
+            print(f"[Índice Texto Error] {e}")
+            return []
+        return [{"doc_id": d, "nombre_archivo": n, "pagina": int(p), "snippet": s} for d, n, p, s in filas]
+
+    def paginas_relevantes(self, terminos: List[str], nombre_archivo: str, limite: int = 4) -> List[int]:
+        """Páginas de un manual que contienen cualquiera de los términos, por relevancia BM25."""
+        terminos = [t for t in terminos if t and t.strip()]
+        if not terminos: return []
+        expresion = " OR ".join(self._expresion(t, prefijo=False) for t in terminos)
+        try:
+            with self._conectar() as con:
+                filas = con.execute(
+                    "SELECT pagina FROM paginas WHERE paginas MATCH ? AND nombre_archivo = ? "
+                    "ORDER BY bm25(paginas) LIMIT ?", (expresion, nombre_archivo, limite)
+                ).fetchall()
+        except sqlite3.Error as e:
+            print(f"[Índice Texto Error] {e}")
+            return []
+        return [int(p) for (p,) in filas]
+
+    def tiene_documento(self, nombre_archivo: str) -> bool:
+        with self._conectar() as con:
+            return con.execute("SELECT 1 FROM documentos WHERE nombre_archivo = ?", (nombre_archivo,)).fetchone() is not None
+
+# Instancia global
+indice_texto = IndiceTextoCompleto(os.path.join(Configuracion.DIRECTORIO_BASE, "data", "indice_texto.db"))
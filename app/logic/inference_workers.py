@@ -0,0 +1,244 @@
+"""
+Workers de Inferencia (inference_workers.py) - Modelos fuera del Proceso del Bot
+--------------------------------------------------------------------------------
+E5-large y el Cross-Encoder compiten por el GIL con el I/O de Telegram y duplican RAM
+en cada proceso del bot. Con INFERENCIA_REMOTA=true los modelos viven aquí:
+1. Servidor: N procesos worker, cada uno con su copia de los modelos y su socket local
+   (multiprocessing.connection, puerto base + i, autenticado con INFERENCIA_CLAVE).
+   Sin INFERENCIA_CLAVE no arrancan ni el servidor ni el cliente: el canal transporta pickles.
+2. Micro-lotes: las peticiones concurrentes que llegan dentro de una ventana corta se
+   agrupan en UNA pasada del modelo (embed y rerank por separado).
+3. Cliente: 'EmbeddingsRemotos' (interfaz LangChain, la usa Chroma) y 'RerankerRemoto'
+   (mismo 'predict' que CrossEncoder). Una conexión por hilo; si un worker cae, se prueba el siguiente.
+
+Uso:
+    python -m app.logic.inference_workers --workers 2
+"""
+import time
+import queue
+import argparse
+import threading
+import multiprocessing
+from multiprocessing.connection import Client, Listener
+from typing import List, Tuple
+
+from langchain_core.embeddings import Embeddings
+
+from app.core.config import Configuracion
+
+MODELO_EMBEDDINGS = "intfloat/multilingual-e5-large"
+MODELO_RERANKER = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+# --- SERVIDOR (Procesos Worker) ---
+
+class _Lotificador:
+    """Agrupa peticiones concurrentes de un worker en una sola pasada por modelo."""
+
+    def __init__(self, embeddings, reranker, lote_max, ventana_seg):
+        self.embeddings = embeddings
+        self.reranker = reranker
+        self.lote_max = lote_max
+        self.ventana_seg = ventana_seg
+        self.cola = queue.Queue()
+
+    def bucle(self):
+        while True:
+            pendientes = [self.cola.get()]
+            limite = time.perf_counter() + self.ventana_seg
+            while len(pendientes) < self.lote_max:
+                restante = limite - time.perf_counter()
+                if restante <= 0: break
+                try:
+                    pendientes.append(self.cola.get(timeout=restante))
+                except queue.Empty:
+                    break
+            for op in ("embed", "rerank"):
+                grupo = [p for p in pendientes if p[1] == op]
+                if grupo: self._resolver(op, grupo)
+
+    def _resolver(self, op, grupo):
+        """grupo: [(conexion, op, id, payload)]. Una llamada al modelo; cada uno recibe su tramo."""
+        planos = [item for _, _, _, payload in grupo for item in payload]
+        try:
+            if op == "embed":
+                resultados = self.embeddings.embed_documents(planos)
+            else:
+                resultados = [float(s) for s in self.reranker.predict(planos, batch_size=self.lote_max)]
+        except Exception as e:
+            for conexion, _, id_, _ in grupo:
+                _responder(conexion, (id_, False, str(e)))
+            return
+        i = 0
+        for conexion, _, id_, payload in grupo:
+            _responder(conexion, (id_, True, resultados[i:i + len(payload)]))
+            i += len(payload)
+
+def _responder(conexion, mensaje):
+    try:
+        conexion.send(mensaje)
+    except (OSError, EOFError):
+        pass  # El cliente se desconectó
+
+def _atender(conexion, lotificador):
+    """Hilo por conexión: recibe peticiones (id, op, payload) y las encola para el lotificador."""
+    try:
+        while True:
+            id_, op, payload = conexion.recv()
+            if op == "ping":
+                _responder(conexion, (id_, True, "pong"))
+            elif op in ("embed", "rerank"):
+                lotificador.cola.put((conexion, op, id_, payload))
+            else:
+                _responder(conexion, (id_, False, f"Operación desconocida: {op}"))
+    except (EOFError, OSError):
+        pass
+    finally:
+        conexion.close()
+
+def ejecutar_worker(indice, host, puerto, clave, lote_max, ventana_ms):
+    """Punto de entrada de cada proceso worker: carga los modelos y atiende su socket."""
+    from langchain_huggingface import HuggingFaceEmbeddings
+    from sentence_transformers import CrossEncoder
+
+    print(f">> [Inferencia {indice}] Cargando modelos...")
+    embeddings = HuggingFaceEmbeddings(model_name=MODELO_EMBEDDINGS)
+    reranker = CrossEncoder(MODELO_RERANKER)
+    lotificador = _Lotificador(embeddings, reranker, lote_max, ventana_ms / 1000)
+    threading.Thread(target=lotificador.bucle, name=f"lotificador-{indice}", daemon=True).start()
+
+    with Listener((host, puerto), backlog=128, authkey=clave) as listener:
+        print(f">> [Inferencia {indice}] Escuchando en {host}:{puerto}")
+        while True:
+            try:
+                conexion = listener.accept()
+            except Exception as e:  # Handshake fallido (clave incorrecta, etc.)
+                print(f"[Inferencia {indice} Error] {e}")
+                continue
+            threading.Thread(target=_atender, args=(conexion, lotificador), daemon=True).start()
+
+def _clave_inferencia() -> bytes:
+    """INFERENCIA_CLAVE como bytes; sin clave no se levanta el canal (pickles = ejecución remota de código)."""
+    if not Configuracion.INFERENCIA_CLAVE:
+        raise ValueError("ERROR FATAL: Falta 'INFERENCIA_CLAVE' (requerida por los workers de inferencia)")
+    return Configuracion.INFERENCIA_CLAVE.encode()
+
+def iniciar_servidor(workers=None):
+    workers = workers or Configuracion.INFERENCIA_WORKERS
+    clave = _clave_inferencia()
+    procesos = [
+        multiprocessing.Process(
+            target=ejecutar_worker, name=f"inferencia-{i}",
+            args=(i, Configuracion.INFERENCIA_HOST, Configuracion.INFERENCIA_PUERTO + i,
+                  clave, Configuracion.INFERENCIA_LOTE_MAX,
+                  Configuracion.INFERENCIA_VENTANA_MS)
+        )
+        for i in range(workers)
+    ]
+    for p in procesos: p.start()
+    try:
+        for p in procesos: p.join()
+    except KeyboardInterrupt:
+        print("\n>> [Inferencia] Deteniendo workers...")
+        for p in procesos: p.terminate()
+
+# --- CLIENTE ---
+
+class ClienteInferencia:
+    """Una conexión por hilo (las búsquedas RAG corren en asyncio.to_thread); reparte hilos entre workers."""
+
+    def __init__(self, host, puerto_base, workers, clave, timeout=30.0):
+        self.direcciones = [(host, puerto_base + i) for i in range(workers)]
+        self.clave = clave
+        self.timeout = timeout
+        self._local = threading.local()
+        self._siguiente = 0
+        self._lock = threading.Lock()
+
+    def _conexion(self):
+        conexion = getattr(self._local, "conexion", None)
+        if conexion is None:
+            with self._lock:
+                indice = self._siguiente % len(self.direcciones)
+                self._siguiente += 1
+            self._local.indice = indice
+            conexion = Client(self.direcciones[indice], authkey=self.clave)
+            self._local.conexion = conexion
+            self._local.secuencia = 0
+        return conexion
+
+    def _descartar_conexion(self):
+        conexion = getattr(self._local, "conexion", None)
+        if conexion is not None:
+            try:
+                conexion.close()
+            except OSError:
+                pass
+        self._local.conexion = None
+
+    def llamar(self, op, payload):
+        ultimo_error = None
+        for _ in range(len(self.direcciones)):
+            try:
+                conexion = self._conexion()
+                self._local.secuencia += 1
+                id_ = self._local.secuencia
+                conexion.send((id_, op, payload))
+                if not conexion.poll(self.timeout):
+                    raise TimeoutError(f"Sin respuesta del worker en {self.timeout}s")
+                id_resp, ok, resultado = conexion.recv()
+                if id_resp != id_:
+                    raise RuntimeError("Respuesta desincronizada")
+                if not ok:
+                    raise RuntimeError(f"Worker de inferencia: {resultado}")
+                return resultado
+            except RuntimeError:
+                raise
+            except (OSError, EOFError, TimeoutError) as e:
+                # Worker caído o colgado: siguiente conexión, posiblemente a otro worker
+                ultimo_error = e
+                self._descartar_conexion()
+        raise ConnectionError(f"Workers de inferencia no disponibles: {ultimo_error}")
+
+    def ping(self) -> bool:
+        return self.llamar("ping", None) == "pong"
+
+
+class EmbeddingsRemotos(Embeddings):
+    """Misma interfaz que HuggingFaceEmbeddings (Chroma la usa para embeber consultas)."""
+
+    def __init__(self, cliente: ClienteInferencia):
+        self.cliente = cliente
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.cliente.llamar("embed", list(texts)) if texts else []
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.cliente.llamar("embed", [text])[0]
+
+
+class RerankerRemoto:
+    """Mismo 'predict' que sentence_transformers.CrossEncoder (lista de scores alineada con los pares)."""
+
+    def __init__(self, cliente: ClienteInferencia):
+        self.cliente = cliente
+
+    def predict(self, pares: List[Tuple[str, str]], batch_size: int = 32, **_):
+        return self.cliente.llamar("rerank", [tuple(p) for p in pares]) if pares else []
+
+
+def crear_modelos_remotos():
+    """(embeddings, reranker) respaldados por los workers configurados."""
+    cliente = ClienteInferencia(
+        Configuracion.INFERENCIA_HOST, Configuracion.INFERENCIA_PUERTO,
+        Configuracion.INFERENCIA_WORKERS, _clave_inferencia()
+    )
+    return EmbeddingsRemotos(cliente), RerankerRemoto(cliente)
+
+def main():
+    parser = argparse.ArgumentParser(description="Workers de inferencia (E5 + Cross-Encoder) para ASII")
+    parser.add_argument("--workers", type=int, default=Configuracion.INFERENCIA_WORKERS)
+    args = parser.parse_args()
+    iniciar_servidor(args.workers)
+
+if __name__ == "__main__":
+    main()
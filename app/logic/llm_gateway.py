@@ -0,0 +1,185 @@
+"""
+Gateway LLM (llm_gateway.py) - Planificador Central de Llamadas
+---------------------------------------------------------------
+Todas las llamadas a Gemini pasan por aquí.
+1. Límite de concurrencia (Semáforo): evita ráfagas contra el proveedor.
+2. Token Bucket: respeta la tasa de peticiones por segundo.
+3. Reintentos con backoff exponencial + jitter ante errores transitorios (429, 503, timeouts).
+4. Hedging opcional: si una llamada supera el percentil de latencia configurado,
+   se lanza una segunda en paralelo y se queda la primera que responda.
+5. Contabilidad: cada respuesta se registra en el Contador de Consumo (usuario/perfil opcionales).
+"""
+import time
+import random
+import asyncio
+from collections import deque
+
+from app.core.config import Configuracion
+from app.logic.usage_accountant import contador_consumo
+from app.logic.deadline import plazo_actual
+
+# Fragmentos que identifican errores recuperables del proveedor
+_MARCAS_TRANSITORIAS = (
+    "429", "500", "502", "503", "504",
+    "resourceexhausted", "resource_exhausted", "rate limit", "quota",
+    "unavailable", "deadline", "timeout", "timed out", "connection",
+    "internalservererror", "serviceunavailable", "toomanyrequests",
+)
+
+def es_error_transitorio(error: BaseException) -> bool:
+    """Heurística por nombre/mensaje: los SDKs de Google cambian de clases entre versiones."""
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    firma = f"{type(error).__name__} {error}".lower()
+    return any(marca in firma for marca in _MARCAS_TRANSITORIAS)
+
+
+class TokenBucket:
+    """Limitador de tasa clásico: 'tasa' tokens por segundo, hasta 'capacidad' acumulados."""
+
+    def __init__(self, tasa: float, capacidad: int):
+        self.tasa = tasa
+        self.capacidad = max(1, capacidad)
+        self._tokens = float(self.capacidad)
+        self._ultimo = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _recargar(self):
+        ahora = time.monotonic()
+        self._tokens = min(self.capacidad, self._tokens + (ahora - self._ultimo) * self.tasa)
+        self._ultimo = ahora
+
+    async def adquirir(self):
+        if self.tasa <= 0: return  # Sin límite
+        async with self._lock:
+            self._recargar()
+            while self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.tasa)
+                self._recargar()
+            self._tokens -= 1
+
+
+class GatewayLLM:
+    """
+    Envoltorio con la misma interfaz 'ainvoke' que los modelos de LangChain,
+    de modo que los módulos existentes no cambian su forma de llamar.
+    """
+
+    def __init__(self, llm, max_concurrencia=4, tasa_por_segundo=2.0, rafaga=4,
+                 max_reintentos=3, backoff_base=0.5, backoff_max=8.0,
+                 percentil_hedge=0.0, min_muestras_hedge=20):
+        self.llm = llm
+        self.max_concurrencia = max_concurrencia
+        self.max_reintentos = max_reintentos
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.percentil_hedge = percentil_hedge
+        self.min_muestras_hedge = min_muestras_hedge
+
+        self._bucket = TokenBucket(tasa_por_segundo, rafaga)
+        self._semaforo = None  # Se crea perezosamente dentro del event loop activo
+        self._latencias = deque(maxlen=200)
+        self.metricas = {"llamadas": 0, "reintentos": 0, "errores": 0, "hedges": 0, "hedges_ganados": 0}
+
+    # --- Internos ---
+
+    def _obtener_semaforo(self):
+        if self._semaforo is None:
+            self._semaforo = asyncio.Semaphore(self.max_concurrencia)
+        return self._semaforo
+
+    def _umbral_hedge(self):
+        """Latencia (s) del percentil configurado, o None si no hay muestras suficientes."""
+        if self.percentil_hedge <= 0 or len(self._latencias) < self.min_muestras_hedge:
+            return None
+        ordenadas = sorted(self._latencias)
+        idx = min(len(ordenadas) - 1, int(len(ordenadas) * self.percentil_hedge / 100))
+        return ordenadas[idx]
+
+    async def _intento(self, mensajes, **kwargs):
+        await self._bucket.adquirir()
+        async with self._obtener_semaforo():
+            inicio = time.monotonic()
+            resp = await self.llm.ainvoke(mensajes, **kwargs)
+            self._latencias.append(time.monotonic() - inicio)
+            return resp
+
+    async def _intento_con_hedge(self, mensajes, **kwargs):
+        umbral = self._umbral_hedge()
+        if umbral is None:
+            return await self._intento(mensajes, **kwargs)
+
+        principal = asyncio.ensure_future(self._intento(mensajes, **kwargs))
+        hecho, _ = await asyncio.wait({principal}, timeout=umbral)
+        if hecho:
+            return principal.result()
+
+        # La principal se demora: lanzamos la duplicada y nos quedamos con la primera exitosa
+        self.metricas["hedges"] += 1
+        secundaria = asyncio.ensure_future(self._intento(mensajes, **kwargs))
+        pendientes = {principal, secundaria}
+        ultimo_error = None
+        try:
+            while pendientes:
+                hecho, pendientes = await asyncio.wait(pendientes, return_when=asyncio.FIRST_COMPLETED)
+                for tarea in hecho:
+                    if tarea.exception() is None:
+                        if tarea is secundaria: self.metricas["hedges_ganados"] += 1
+                        return tarea.result()
+                    ultimo_error = tarea.exception()
+            raise ultimo_error
+        finally:
+            for tarea in pendientes:
+                tarea.cancel()
+
+    # --- API Pública ---
+
+    async def ainvoke(self, mensajes, usuario=None, perfil=None, **kwargs):
+        self.metricas["llamadas"] += 1
+        intento = 0
+        while True:
+            try:
+                resp = await self._intento_con_hedge(mensajes, **kwargs)
+                contador_consumo.registrar(resp, usuario=usuario, perfil=perfil)
+                return resp
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if intento >= self.max_reintentos or not es_error_transitorio(e):
+                    self.metricas["errores"] += 1
+                    raise
+                # Full jitter: espera aleatoria en [0, min(max, base * 2^n)]
+                espera = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** intento)))
+                plazo = plazo_actual()
+                if plazo is not None and espera >= plazo.restante():
+                    # El reintento no alcanzaría a terminar dentro del plazo de la consulta
+                    self.metricas["errores"] += 1
+                    raise
+                intento += 1
+                self.metricas["reintentos"] += 1
+                print(f">> [Gateway LLM] Error transitorio ({type(e).__name__}). Reintento {intento}/{self.max_reintentos} en {espera:.2f}s")
+                await asyncio.sleep(espera)
+
+
+def crear_gateway(llm=None) -> GatewayLLM:
+    """Construye el gateway con la configuración del entorno. Acepta un LLM falso para pruebas."""
+    if llm is None:
+        from langchain_google_genai import ChatGoogleGenerativeAI
+        llm = ChatGoogleGenerativeAI(
+            model=Configuracion.LLM_MODELO,
+            temperature=0.0,
+            google_api_key=Configuracion.GOOGLE_API_KEY
+        )
+    return GatewayLLM(
+        llm,
+        max_concurrencia=Configuracion.LLM_MAX_CONCURRENCIA,
+        tasa_por_segundo=Configuracion.LLM_TASA_POR_SEGUNDO,
+        rafaga=Configuracion.LLM_RAFAGA,
+        max_reintentos=Configuracion.LLM_MAX_REINTENTOS,
+        backoff_base=Configuracion.LLM_BACKOFF_BASE,
+        backoff_max=Configuracion.LLM_BACKOFF_MAX,
+        percentil_hedge=Configuracion.LLM_HEDGE_PERCENTIL,
+    )
+
+# Instancia global compartida por todos los cerebros
+gateway_llm = crear_gateway()
@@ -15,17 +15,23 @@ if parent_dir not in sys.path:
     sys.path.append(parent_dir)
 
 from langchain_chroma import Chroma
-from langchain_huggingface import HuggingFaceEmbeddings
-from sentence_transformers import CrossEncoder
 from app.core.config import Configuracion
 from app.core.contracts import SCORE_THRESHOLD 
 
 # --- CONFIGURACIÓN (Debe coincidir con ingest_v8.py) ---
 MODEL_NAME = "intfloat/multilingual-e5-large"
-_embeddings = HuggingFaceEmbeddings(model_name=MODEL_NAME)
 
-# Modelo de Re-Ranking (Validación de calidad)
-_reranker = CrossEncoder('cross-encoder/ms-marco-MiniLM-L-6-v2')
+if Configuracion.INFERENCIA_REMOTA:
+    # Los modelos viven en los workers de inferencia: este proceso no carga torch
+    from app.logic.inference_workers import crear_modelos_remotos
+    _embeddings, _reranker = crear_modelos_remotos()
+else:
+    from langchain_huggingface import HuggingFaceEmbeddings
+    from sentence_transformers import CrossEncoder
+    _embeddings = HuggingFaceEmbeddings(model_name=MODEL_NAME)
+
+    # Modelo de Re-Ranking (Validación de calidad)
+    _reranker = CrossEncoder('cross-encoder/ms-marco-MiniLM-L-6-v2')
 
 def get_db_library():
     return Chroma(persist_directory=os.path.join(Configuracion.DIRECTORIO_BASE, "data", "chroma_library"), embedding_function=_embeddings)
@@ -54,16 +60,21 @@ def buscar_manual_candidato(query: str, k: int = 5):
     pares = [(query, doc.page_content) for doc, _ in resultados_crudos]
     scores_rerank = _reranker.predict(pares)
 
+    crudos = [(doc.page_content, doc.metadata, original_score) for doc, original_score in resultados_crudos]
+    return _armar_candidatos(crudos, scores_rerank, k)
+
+def _armar_candidatos(crudos, scores_rerank, k):
+    """crudos: [(texto, metadata, score_vectorial)] alineado con scores_rerank."""
     candidatos_rankeados = []
-    for (doc, original_score), rerank_score in zip(resultados_crudos, scores_rerank):
+    for (texto, metadata, original_score), rerank_score in zip(crudos, scores_rerank):
         candidatos_rankeados.append({
-            "doc_id": doc.metadata.get("doc_id"),
-            "nombre_archivo": doc.metadata.get("nombre_archivo"),
-            "anio": doc.metadata.get("anio"),
-            "version": doc.metadata.get("version"),
+            "doc_id": metadata.get("doc_id"),
+            "nombre_archivo": metadata.get("nombre_archivo"),
+            "anio": metadata.get("anio"),
+            "version": metadata.get("version"),
             "score": original_score,
             "rerank_score": rerank_score,
-            "resumen": doc.page_content[:500]
+            "resumen": texto[:500]
         })
 
     candidatos_rankeados.sort(key=lambda x: x["rerank_score"], reverse=True)
@@ -87,25 +98,133 @@ def buscar_contenido_profundo(query: str, doc_id: str, k: int = 8):
     
     if not resultados_crudos: return []
 
-    # Re-Ranking
-    pares = [(query, doc.page_content) for doc, _ in resultados_crudos]
+    fragmentos = [{"texto": doc.page_content, "metadata": doc.metadata} for doc, _ in resultados_crudos]
+    return rerankear_contenido(query, fragmentos, k)
+
+def rerankear_contenido(query: str, fragmentos: list, k: int = 8):
+    """
+    Re-Ranking de fragmentos {"texto", "metadata"} y armado de evidencias.
+    Compartido por la búsqueda directa y la caché de evidencias de sesión.
+    """
+    if not fragmentos: return []
+
+    pares = [(query, f["texto"]) for f in fragmentos]
     scores_rerank = _reranker.predict(pares)
-    
+    return _armar_evidencias(fragmentos, scores_rerank, k)
+
+def _armar_evidencias(fragmentos, scores_rerank, k):
+    """Filtra ruido (< -4.0), etiqueta OCR y ordena por logit del Re-Ranker."""
     evidencias = []
-    for (doc, original_score), rerank_score in zip(resultados_crudos, scores_rerank):
+    for frag, rerank_score in zip(fragmentos, scores_rerank):
         if rerank_score < -4.0: continue 
 
+        texto, metadata = frag["texto"], frag["metadata"]
         # Detectamos si viene de OCR para indicarlo en el chat (Opcional)
-        es_ocr = "[CONTENIDO VISUAL" in doc.page_content
+        es_ocr = "[CONTENIDO VISUAL" in texto
         origen_tag = " (Diagrama/Img)" if es_ocr else ""
 
         evidencias.append({
-            "texto": doc.page_content,
-            "pagina": doc.metadata.get("pagina_inicio", "N/A"), 
-            "seccion": f"{doc.metadata.get('h1', '')} > {doc.metadata.get('h2', '')}{origen_tag}",
-            "tipo": doc.metadata.get("tipo_chunk", "texto"),
+            "texto": texto,
+            "pagina": metadata.get("pagina_inicio", "N/A"), 
+            "seccion": f"{metadata.get('h1', '')} > {metadata.get('h2', '')}{origen_tag}",
+            "tipo": metadata.get("tipo_chunk", "texto"),
             "rerank_score": rerank_score
         })
     
     evidencias.sort(key=lambda x: x["rerank_score"], reverse=True)
     return evidencias[:k]
+
+def embeber_consulta(query: str):
+    """Vector E5 de la consulta (con el prefijo 'query: ' que exige el modelo)."""
+    return _embeddings.embed_query(f"query: {query}")
+
+def recuperar_contenido_por_vector(vector, doc_id: str, k: int = 20):
+    """
+    Igual que la búsqueda de contenido, pero devuelve también los vectores de cada chunk
+    (los necesita la caché de evidencias para puntuar preguntas de seguimiento).
+    """
+    db = get_db_content()
+    try:
+        res = db._collection.query(
+            query_embeddings=[vector], n_results=k, where={"doc_id": doc_id},
+            include=["documents", "metadatas", "embeddings"]
+        )
+    except Exception as e:
+        print(f"[RAG Error] Contenido por vector: {e}")
+        return []
+
+    if not res or not res.get("ids") or not res["ids"][0]: return []
+    return [
+        {"id": id_, "texto": texto, "metadata": meta or {}, "vector": vec}
+        for id_, texto, meta, vec in zip(res["ids"][0], res["documents"][0], res["metadatas"][0], res["embeddings"][0])
+    ]
+
+# --- MODO LOTE (Precómputo offline de FAQ) ---
+
+def _rerank_en_lote(grupos_pares, batch_size=64):
+    """Un único 'predict' para todos los pares de todas las consultas; re-parte por consulta."""
+    planos = [par for pares in grupos_pares for par in pares]
+    if not planos: return [[] for _ in grupos_pares]
+    scores = _reranker.predict(planos, batch_size=batch_size)
+    res, i = [], 0
+    for pares in grupos_pares:
+        res.append(list(scores[i:i + len(pares)]))
+        i += len(pares)
+    return res
+
+def embeber_consultas_lote(queries):
+    """Embeddings E5 de varias consultas en una sola pasada del modelo."""
+    return _embeddings.embed_documents([f"query: {q}" for q in queries])
+
+def buscar_manual_candidato_lote(queries, k: int = 5, vectores=None):
+    """
+    Versión por lotes del Bibliotecario: embedding, búsqueda y rerank agrupados.
+    Retorna una lista de candidatos por consulta (mismo formato que 'buscar_manual_candidato').
+    """
+    if not queries: return []
+    vectores = vectores if vectores is not None else embeber_consultas_lote(queries)
+    db = get_db_library()
+    try:
+        res = db._collection.query(
+            query_embeddings=vectores, n_results=10, where={"es_mas_reciente": True},
+            include=["documents", "metadatas", "distances"]
+        )
+    except Exception as e:
+        print(f"[RAG Error] Biblioteca (lote): {e}")
+        return [[] for _ in queries]
+
+    crudos_por_query = [
+        list(zip(docs, metas, dists))
+        for docs, metas, dists in zip(res["documents"], res["metadatas"], res["distances"])
+    ]
+    scores = _rerank_en_lote([[(q, texto) for texto, _, _ in crudos] for q, crudos in zip(queries, crudos_por_query)])
+    return [_armar_candidatos(crudos, sc, k) for crudos, sc in zip(crudos_por_query, scores)]
+
+def buscar_contenido_profundo_lote(queries, doc_ids, k: int = 8, vectores=None):
+    """
+    Versión por lotes del Lector: agrupa las consultas por doc_id (un 'query' de Chroma por documento)
+    y rerankea todos los pares en una sola pasada del Cross-Encoder.
+    """
+    if not queries: return []
+    vectores = vectores if vectores is not None else embeber_consultas_lote(queries)
+    db = get_db_content()
+
+    fragmentos_por_query = [[] for _ in queries]
+    por_doc = {}
+    for i, doc_id in enumerate(doc_ids):
+        if doc_id: por_doc.setdefault(doc_id, []).append(i)
+
+    for doc_id, indices in por_doc.items():
+        try:
+            res = db._collection.query(
+                query_embeddings=[vectores[i] for i in indices], n_results=20, where={"doc_id": doc_id},
+                include=["documents", "metadatas"]
+            )
+        except Exception as e:
+            print(f"[RAG Error] Contenido (lote) {doc_id}: {e}")
+            continue
+        for i, docs, metas in zip(indices, res["documents"], res["metadatas"]):
+            fragmentos_por_query[i] = [{"texto": t, "metadata": m or {}} for t, m in zip(docs, metas)]
+
+    scores = _rerank_en_lote([[(q, f["texto"]) for f in frags] for q, frags in zip(queries, fragmentos_por_query)])
+    return [_armar_evidencias(frags, sc, k) for frags, sc in zip(fragmentos_por_query, scores)]
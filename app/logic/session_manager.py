@@ -1,10 +1,70 @@
 """
-Gestor de Sesiones V24 (session_manager.py) - Enterprise State Machine
+Gestor de Sesiones V25 (session_manager.py) - Enterprise State Machine
 ----------------------------------------------------------------------
 Controla el flujo de estados del asistente y el contexto del usuario.
 Actualizado para soportar lógica de reintentos y manipulación granular de metadata.
+V25:
+1. Registros compactos con __slots__ (acceso tipo dict para no romper a los llamadores).
+2. Acotado: desalojo por inactividad (TTL) y por tamaño máximo (LRU).
+   El perfil (/perfil) es preferencia del usuario: sobrevive al TTL (se recuerda aparte si no es ADMIN);
+   solo se pierde si la sesión sale por LRU, es decir, bajo presión de memoria.
+3. Candidatos compactos: se descartan campos pesados (resúmenes) al guardarlos en metadata.
+4. Snapshots periódicos a SQLite: un reinicio restaura las conversaciones activas.
 """
-from typing import Dict, Optional, Any
+import io
+import os
+import sys
+import json
+import time
+import atexit
+import sqlite3
+import threading
+import contextlib
+from collections import OrderedDict
+from typing import Dict, Optional, Any, Callable, List
+
+from app.core.config import Configuracion
+
+# Campos que no se guardan en la sesión (solo sirven para rankear en el momento)
+CAMPOS_PESADOS = {"resumen"}
+
+
+def compactar(valor):
+    """Quita los campos pesados de un candidato (y de los candidatos anidados en metadata)."""
+    if not isinstance(valor, dict): return valor
+    return {k: compactar(v) for k, v in valor.items() if k not in CAMPOS_PESADOS}
+
+
+class RegistroSesion:
+    """Sesión de un chat. Slots en vez de dict por instancia; admite sesion["campo"] y sesion.get()."""
+    __slots__ = ("estado", "perfil", "doc_activo", "metadata", "intentos_fallidos", "ultimo_acceso")
+
+    def __init__(self, estado, perfil="ADMIN", doc_activo=None, metadata=None, intentos_fallidos=0, ultimo_acceso=None):
+        self.estado = estado
+        self.perfil = perfil
+        self.doc_activo = doc_activo
+        self.metadata = metadata if metadata is not None else {}
+        self.intentos_fallidos = intentos_fallidos
+        self.ultimo_acceso = ultimo_acceso or time.time()
+
+    def __getitem__(self, campo):
+        try:
+            return getattr(self, campo)
+        except (AttributeError, TypeError):
+            raise KeyError(campo)
+
+    def __setitem__(self, campo, valor):
+        try:
+            setattr(self, campo, valor)
+        except AttributeError:
+            raise KeyError(campo)
+
+    def __contains__(self, campo):
+        return campo in self.__slots__
+
+    def get(self, campo, default=None):
+        return getattr(self, campo, default) if campo in self.__slots__ else default
+
 
 class SessionManager:
     # Constantes de Estado
@@ -12,26 +72,46 @@ class SessionManager:
     ESTADO_ESPERANDO_CONFIRMACION = "CONFIRMANDO" # Transición: Bot propone, Usuario decide
     ESTADO_LECTURA_PROFUNDA = "LEYENDO"           # Estado final: Contexto cargado y respondiendo
 
-    def __init__(self):
-        # Estructura de sesión en memoria:
-        # { 
-        #   "chat_id": { 
-        #       "estado": str, 
-        #       "perfil": str ("ADMIN"|"SISTEMAS"),
-        #       "doc_activo": str|None, 
-        #       "metadata": dict,             # Contexto del documento o candidato
-        #       "intentos_fallidos": int,     # Circuit Breaker para loops
-        #       "historial_corto": list       # (Opcional) Para lógica rápida
-        #   } 
-        # }
-        self._sesiones: Dict[str, dict] = {}
-
-    def obtener_sesion(self, chat_id: str) -> dict:
+    def __init__(self, ruta_snapshot=None, max_sesiones=10000, ttl_segundos=7200, intervalo_snapshot=30.0):
+        # Estructura de sesión en memoria (LRU: la más reciente al final):
+        # { "chat_id": RegistroSesion(estado, perfil, doc_activo, metadata, intentos_fallidos, ultimo_acceso) }
+        self._sesiones: "OrderedDict[str, RegistroSesion]" = OrderedDict()
+        # Callbacks(chat_id) que liberan recursos asociados a la sesión (tareas, cachés)
+        self._al_limpiar: List[Callable[[str], None]] = []
+
+        self.max_sesiones = max_sesiones
+        self.ttl_segundos = ttl_segundos
+        self.ruta_snapshot = ruta_snapshot
+        self.intervalo_snapshot = intervalo_snapshot
+        self._sucias = set()       # Cambiadas desde el último snapshot
+        self._eliminadas = set()   # Desalojadas desde el último snapshot
+        self._perfiles_expirados: "OrderedDict[str, str]" = OrderedDict()  # chat_id -> perfil no-ADMIN de sesiones vencidas
+        self._lock = threading.RLock()
+        self._hilo = None
+        self.metricas = {"desalojadas_ttl": 0, "desalojadas_lru": 0, "restauradas": 0, "snapshots": 0}
+
+        if ruta_snapshot:
+            self._restaurar()
+
+    def registrar_al_limpiar(self, callback: Callable[[str], None]):
+        """Registra una función que se ejecuta en cada 'limpiar_sesion' (y al desalojar una sesión)."""
+        self._al_limpiar.append(callback)
+
+    def obtener_sesion(self, chat_id: str) -> RegistroSesion:
         """Recupera la sesión actual o crea una nueva default si no existe."""
         chat_id = str(chat_id)
-        if chat_id not in self._sesiones:
-            self.limpiar_sesion(chat_id)
-        return self._sesiones[chat_id]
+        with self._lock:
+            sesion = self._sesiones.get(chat_id)
+            if sesion is not None and time.time() - sesion.ultimo_acceso > self.ttl_segundos:
+                # Expirada: se trata como conversación nueva
+                self._desalojar(chat_id, "desalojadas_ttl")
+                sesion = None
+            if sesion is None:
+                self.limpiar_sesion(chat_id)
+                sesion = self._sesiones[chat_id]
+            self._tocar(chat_id, sesion)
+            self._podar()
+            return sesion
 
     def cambiar_estado(self, chat_id: str, nuevo_estado: str, doc: Optional[str] = None, meta: Optional[dict] = None):
         """
@@ -39,17 +119,19 @@ class SessionManager:
         Resetea el contador de intentos fallidos al cambiar de estado exitosamente.
         """
         chat_id = str(chat_id)
-        sesion = self.obtener_sesion(chat_id)
-        
-        sesion["estado"] = nuevo_estado
-        
-        # Si cambiamos de estado, asumimos progreso, reseteamos contador de loops
-        sesion["intentos_fallidos"] = 0
-
-        if doc:
-            sesion["doc_activo"] = doc
-        if meta:
-            sesion["metadata"] = meta
+        with self._lock:
+            sesion = self.obtener_sesion(chat_id)
+
+            sesion.estado = nuevo_estado
+
+            # Si cambiamos de estado, asumimos progreso, reseteamos contador de loops
+            sesion.intentos_fallidos = 0
+
+            if doc:
+                sesion.doc_activo = doc
+            if meta:
+                sesion.metadata = compactar(meta)
+            self._sucias.add(chat_id)
 
         print(f">> [Sesión {chat_id}] Cambio de estado -> {nuevo_estado} (Doc: {doc})")
 
@@ -59,13 +141,13 @@ class SessionManager:
         Útil para guardar candidatos pendientes o preferencias volátiles.
         """
         chat_id = str(chat_id)
-        if chat_id in self._sesiones:
-            if "metadata" not in self._sesiones[chat_id]:
-                self._sesiones[chat_id]["metadata"] = {}
-            
+        with self._lock:
+            sesion = self._sesiones.get(chat_id)
+            if sesion is None: return
             # Update dict existente
-            self._sesiones[chat_id]["metadata"].update(data)
-            print(f">> [Sesión {chat_id}] Metadata actualizada: {list(data.keys())}")
+            sesion.metadata.update(compactar(data))
+            self._tocar(chat_id, sesion)
+        print(f">> [Sesión {chat_id}] Metadata actualizada: {list(data.keys())}")
 
     def registrar_intento_fallido(self, chat_id: str) -> int:
         """
@@ -73,33 +155,193 @@ class SessionManager:
         Retorna el número actual de intentos.
         """
         chat_id = str(chat_id)
-        sesion = self.obtener_sesion(chat_id)
-        sesion["intentos_fallidos"] = sesion.get("intentos_fallidos", 0) + 1
-        return sesion["intentos_fallidos"]
+        with self._lock:
+            sesion = self.obtener_sesion(chat_id)
+            sesion.intentos_fallidos += 1
+            self._sucias.add(chat_id)
+            return sesion.intentos_fallidos
 
     def actualizar_sesion(self, chat_id: str, **kwargs):
         """Generic updater para campos de primer nivel (ej: perfil)."""
         chat_id = str(chat_id)
-        if chat_id in self._sesiones:
+        with self._lock:
+            sesion = self._sesiones.get(chat_id)
+            if sesion is None: return
             for k, v in kwargs.items():
-                self._sesiones[chat_id][k] = v
+                sesion[k] = v
+            self._tocar(chat_id, sesion)
 
     def limpiar_sesion(self, chat_id: str):
         """Reseteo total a modo explorador (Hard Reset)."""
         chat_id = str(chat_id)
-        # Preservamos el perfil si existía, si no default a ADMIN
-        perfil_previo = "ADMIN"
-        if chat_id in self._sesiones:
-            perfil_previo = self._sesiones[chat_id].get("perfil", "ADMIN")
-
-        self._sesiones[chat_id] = {
-            "estado": self.ESTADO_EXPLORANDO,
-            "perfil": perfil_previo,
-            "doc_activo": None,
-            "metadata": {},
-            "intentos_fallidos": 0
-        }
+        with self._lock:
+            # Preservamos el perfil si existía (o si la sesión venció por TTL), si no default a ADMIN
+            previa = self._sesiones.get(chat_id)
+            perfil_expirado = self._perfiles_expirados.pop(chat_id, "ADMIN")
+            perfil_previo = previa.perfil if previa is not None else perfil_expirado
+
+            self._sesiones[chat_id] = RegistroSesion(self.ESTADO_EXPLORANDO, perfil_previo)
+            self._sesiones.move_to_end(chat_id)
+            self._sucias.add(chat_id)
+            self._eliminadas.discard(chat_id)
+        self._liberar_recursos(chat_id)
         print(f">> [Sesión {chat_id}] Reiniciada a Exploración (Perfil: {perfil_previo}).")
 
+    # --- Desalojo ---
+
+    def _tocar(self, chat_id, sesion):
+        sesion.ultimo_acceso = time.time()
+        self._sesiones.move_to_end(chat_id)
+        self._sucias.add(chat_id)
+        self._asegurar_hilo()
+
+    def _podar(self):
+        """Desaloja desde la más antigua: primero las vencidas por TTL, luego el exceso de tamaño."""
+        limite = time.time() - self.ttl_segundos
+        while self._sesiones:
+            chat_id, sesion = next(iter(self._sesiones.items()))
+            if sesion.ultimo_acceso < limite:
+                self._desalojar(chat_id, "desalojadas_ttl")
+            elif len(self._sesiones) > self.max_sesiones:
+                self._desalojar(chat_id, "desalojadas_lru")
+            else:
+                break
+
+    def _desalojar(self, chat_id, motivo):
+        sesion = self._sesiones.pop(chat_id)
+        if motivo == "desalojadas_ttl" and sesion.perfil != "ADMIN":
+            # Vencer no es olvidar la preferencia; el registro aparte también está acotado
+            self._perfiles_expirados[chat_id] = sesion.perfil
+            self._perfiles_expirados.move_to_end(chat_id)
+            while len(self._perfiles_expirados) > self.max_sesiones:
+                self._perfiles_expirados.popitem(last=False)
+        self._sucias.discard(chat_id)
+        self._eliminadas.add(chat_id)
+        self.metricas[motivo] += 1
+        self._liberar_recursos(chat_id)
+
+    def _liberar_recursos(self, chat_id):
+        for callback in self._al_limpiar:
+            try:
+                callback(chat_id)
+            except Exception as e:
+                print(f"[Sesión Error] Limpieza asociada falló: {e}")
+
+    # --- Persistencia (Snapshots SQLite) ---
+
+    def _conectar(self):
+        os.makedirs(os.path.dirname(self.ruta_snapshot), exist_ok=True)
+        con = sqlite3.connect(self.ruta_snapshot, timeout=10)
+        con.execute("""
+            CREATE TABLE IF NOT EXISTS sesiones (
+                chat_id TEXT PRIMARY KEY,
+                estado TEXT NOT NULL,
+                perfil TEXT NOT NULL,
+                doc_activo TEXT,
+                metadata TEXT NOT NULL,
+                intentos_fallidos INTEGER NOT NULL,
+                ultimo_acceso REAL NOT NULL
+            )
+        """)
+        return con
+
+    def _restaurar(self):
+        """Carga las sesiones que siguen vigentes (las más recientes, hasta el máximo)."""
+        limite = time.time() - self.ttl_segundos
+        try:
+            with self._conectar() as con:
+                con.execute("DELETE FROM sesiones WHERE ultimo_acceso < ?", (limite,))
+                filas = con.execute(
+                    "SELECT * FROM sesiones ORDER BY ultimo_acceso DESC LIMIT ?", (self.max_sesiones,)
+                ).fetchall()
+        except sqlite3.Error as e:
+            print(f"[Sesión Error] No se pudo restaurar el snapshot: {e}")
+            return
+        for chat_id, estado, perfil, doc_activo, metadata, intentos, ultimo_acceso in reversed(filas):
+            self._sesiones[chat_id] = RegistroSesion(estado, perfil, doc_activo, json.loads(metadata), intentos, ultimo_acceso)
+        self.metricas["restauradas"] = len(filas)
+        if filas: print(f">> [Sesiones] {len(filas)} conversaciones activas restauradas del snapshot.")
+
+    def guardar_snapshot(self):
+        """Persiste solo lo que cambió desde el último snapshot (y borra lo desalojado)."""
+        if not self.ruta_snapshot: return
+        with self._lock:
+            filas = [
+                (chat_id, s.estado, s.perfil, s.doc_activo,
+                 json.dumps(s.metadata, ensure_ascii=False, default=str), s.intentos_fallidos, s.ultimo_acceso)
+                for chat_id in self._sucias if (s := self._sesiones.get(chat_id)) is not None
+            ]
+            eliminadas = [(chat_id,) for chat_id in self._eliminadas]
+            self._sucias.clear()
+            self._eliminadas.clear()
+        if not filas and not eliminadas: return
+        try:
+            with self._conectar() as con:
+                con.executemany("INSERT OR REPLACE INTO sesiones VALUES (?, ?, ?, ?, ?, ?, ?)", filas)
+                con.executemany("DELETE FROM sesiones WHERE chat_id = ?", eliminadas)
+            self.metricas["snapshots"] += 1
+        except sqlite3.Error as e:
+            print(f"[Sesión Error] Snapshot fallido: {e}")
+            with self._lock:
+                # Se reintenta en el próximo ciclo
+                self._sucias.update(f[0] for f in filas if f[0] in self._sesiones)
+                self._eliminadas.update(e[0] for e in eliminadas)
+
+    def _asegurar_hilo(self):
+        if self._hilo is not None or not self.ruta_snapshot: return
+        self._hilo = threading.Thread(target=self._bucle_snapshot, name="sesiones-snapshot", daemon=True)
+        self._hilo.start()
+        atexit.register(self.guardar_snapshot)
+
+    def _bucle_snapshot(self):
+        # Solo persiste: el desalojo (y sus callbacks, que tocan tareas asyncio) ocurre en 'obtener_sesion'
+        while True:
+            time.sleep(self.intervalo_snapshot)
+            self.guardar_snapshot()
+
+    # --- Diagnóstico ---
+
+    def reporte_memoria(self) -> dict:
+        """Memoria aproximada de las sesiones en RAM (registro + metadata) y su proyección a 10k sesiones."""
+        with self._lock:
+            total = sys.getsizeof(self._sesiones)
+            for chat_id, s in self._sesiones.items():
+                total += sys.getsizeof(chat_id) + sys.getsizeof(s) + _tamano_profundo(s.metadata)
+            n = len(self._sesiones)
+        return {
+            "sesiones": n,
+            "bytes_total": total,
+            "bytes_por_sesion": round(total / n, 1) if n else 0,
+            "mb_por_10k_sesiones": round(total / n * 10000 / (1024 * 1024), 2) if n else 0
+        }
+
+
+def _tamano_profundo(obj) -> int:
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(sys.getsizeof(k) + _tamano_profundo(v) for k, v in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return sys.getsizeof(obj) + sum(_tamano_profundo(v) for v in obj)
+    return sys.getsizeof(obj)
+
+def medir_memoria(n=10000) -> dict:
+    """Llena un gestor sin persistencia con 'n' sesiones típicas (candidato pendiente incluido) y reporta."""
+    gestor = SessionManager(max_sesiones=n)
+    candidato = {"doc_id": "a" * 64, "nombre_archivo": "Manual_Modulo_Ventas_2024.pdf", "anio": 2024,
+                 "version": "5.1", "score": 0.81, "rerank_score": 4.2, "resumen": "x" * 500}
+    with contextlib.redirect_stdout(io.StringIO()):  # Silencia los logs por sesión
+        for i in range(n):
+            chat_id = str(1000000000 + i)
+            gestor.obtener_sesion(chat_id)
+            gestor.actualizar_metadata(chat_id, {"candidato_pendiente": candidato, "pregunta_pendiente": "¿Cómo anulo una factura?"})
+    return gestor.reporte_memoria()
+
 # Instancia global singleton
-gestor_sesiones = SessionManager()
+gestor_sesiones = SessionManager(
+    ruta_snapshot=os.path.join(Configuracion.DIRECTORIO_BASE, "data", "sesiones.db"),
+    max_sesiones=Configuracion.SESIONES_MAX,
+    ttl_segundos=Configuracion.SESIONES_TTL_MINUTOS * 60,
+    intervalo_snapshot=Configuracion.SESIONES_SNAPSHOT_SEG
+)
+
+if __name__ == "__main__":
+    print(medir_memoria())
@@ -0,0 +1,59 @@
+"""
+Single-Flight (single_flight.py) - Fusión de Consultas Idénticas en Vuelo
+-------------------------------------------------------------------------
+Ante una caída conocida, decenas de usuarios preguntan lo mismo en segundos.
+Si ya hay una ejecución en curso para la misma clave, las siguientes se cuelgan de ella:
+- Bibliotecario: (pregunta normalizada, perfil) -> embedding + búsqueda + rerank de candidatos.
+- Lector: (pregunta normalizada, perfil, doc_id, huella de historial + evidencias) -> Gemini.
+  Las evidencias se buscan por sesión; solo se comparte un prompt idéntico.
+Solo deduplica lo que está EN VUELO: al terminar, la clave se libera (no es una caché).
+"""
+import re
+import asyncio
+import unicodedata
+from typing import Awaitable, Callable, Dict, Hashable
+
+from app.logic.telemetry import telemetria
+
+_RE_NO_ALFANUM = re.compile(r'[^\w\s]')
+_RE_ESPACIOS = re.compile(r'\s+')
+
+def normalizar_pregunta(texto: str) -> str:
+    """Minúsculas, sin tildes, sin signos y con espacios colapsados."""
+    texto = unicodedata.normalize("NFKD", texto.lower())
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    texto = _RE_NO_ALFANUM.sub(" ", texto)
+    return _RE_ESPACIOS.sub(" ", texto).strip()
+
+
+class CoalescedorConsultas:
+
+    def __init__(self):
+        self._en_vuelo: Dict[Hashable, asyncio.Future] = {}
+        self.metricas = {"ejecuciones": 0, "fusionadas": 0}
+
+    async def ejecutar(self, clave: Hashable, fabrica: Callable[[], Awaitable]):
+        """
+        Ejecuta 'fabrica()' una sola vez por clave en vuelo; todos los solicitantes reciben
+        el mismo resultado (o la misma excepción). 'shield' evita que la cancelación de un
+        solicitante cancele la ejecución compartida.
+        """
+        futuro = self._en_vuelo.get(clave)
+        if futuro is not None:
+            self.metricas["fusionadas"] += 1
+            telemetria.emitir("consulta_fusionada", clave=str(clave)[:200], total_fusionadas=self.metricas["fusionadas"])
+            print(f">> [Single-Flight] Consulta fusionada con una ejecución en curso ({self.metricas['fusionadas']} total).")
+            return await asyncio.shield(futuro)
+
+        futuro = asyncio.ensure_future(fabrica())
+        self._en_vuelo[clave] = futuro
+        self.metricas["ejecuciones"] += 1
+        futuro.add_done_callback(lambda f: self._liberar(clave, f))
+        return await asyncio.shield(futuro)
+
+    def _liberar(self, clave, futuro):
+        if self._en_vuelo.get(clave) is futuro:
+            del self._en_vuelo[clave]
+
+# Instancia global
+coalescedor = CoalescedorConsultas()
@@ -0,0 +1,59 @@
+"""
+Precómputo Especulativo (speculative.py) - Borradores durante la Confirmación
+------------------------------------------------------------------------------
+Mientras el bot pregunta "¿Te refieres al manual…?", el usuario tarda segundos en contestar.
+Aprovechamos esa espera para buscar el contenido y redactar la respuesta del candidato:
+1. Al confirmar ("sí") el borrador se sirve al instante (o se espera lo que falte).
+2. Al rechazar, o con /limpiar, la tarea se cancela.
+Un borrador por sesión: lanzar uno nuevo cancela el anterior.
+"""
+import asyncio
+from typing import Dict, Optional, Tuple
+
+from app.logic.session_manager import gestor_sesiones
+
+
+class GestorEspeculativo:
+
+    def __init__(self):
+        # { "chat_id": (doc_id, asyncio.Task) }
+        self._borradores: Dict[str, Tuple[str, asyncio.Task]] = {}
+        self.metricas = {"lanzados": 0, "servidos": 0, "servidos_listos": 0, "cancelados": 0}
+
+    @staticmethod
+    def _descartar_error(tarea: asyncio.Task):
+        # Evita el warning "Task exception was never retrieved" en borradores abandonados
+        if not tarea.cancelled(): tarea.exception()
+
+    def lanzar(self, session_id: str, doc_id: str, corrutina) -> asyncio.Task:
+        session_id = str(session_id)
+        self.cancelar(session_id)
+        tarea = asyncio.ensure_future(corrutina)
+        tarea.add_done_callback(self._descartar_error)
+        self._borradores[session_id] = (doc_id, tarea)
+        self.metricas["lanzados"] += 1
+        print(f">> [Especulativo {session_id}] Borrador en segundo plano para doc {doc_id}")
+        return tarea
+
+    def tomar(self, session_id: str, doc_id: str) -> Optional[asyncio.Task]:
+        """Entrega el borrador si corresponde al documento confirmado (y lo retira del registro)."""
+        item = self._borradores.pop(str(session_id), None)
+        if not item: return None
+        doc_borrador, tarea = item
+        if doc_borrador != doc_id or tarea.cancelled():
+            tarea.cancel()
+            return None
+        self.metricas["servidos"] += 1
+        if tarea.done(): self.metricas["servidos_listos"] += 1
+        return tarea
+
+    def cancelar(self, session_id: str):
+        item = self._borradores.pop(str(session_id), None)
+        if item and not item[1].done():
+            item[1].cancel()
+            self.metricas["cancelados"] += 1
+            print(f">> [Especulativo {session_id}] Borrador cancelado.")
+
+# Instancia global: se cancela solo cuando la sesión se reinicia (rechazo o /limpiar)
+gestor_especulativo = GestorEspeculativo()
+gestor_sesiones.registrar_al_limpiar(gestor_especulativo.cancelar)
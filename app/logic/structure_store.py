@@ -0,0 +1,132 @@
+"""
+Almacén de Estructura Documental (structure_store.py) - Fichas Estructurales Precalculadas
+-----------------------------------------------------------------------------------------
+El Pre-Análisis necesita índice, títulos y resumen de cada candidato.
+1. La ingesta los calcula UNA vez por documento (misma pasada que la ficha de Biblioteca).
+2. Se guardan en SQLite, indexados por doc_id (y por ruta/nombre para búsquedas inversas).
+3. En tiempo de consulta solo se lee este registro: ningún PDF se abre para decidir relevancia.
+"""
+import os
+import json
+import sqlite3
+from datetime import datetime
+from typing import Optional
+
+from app.core.config import Configuracion
+
+MAX_ITEMS_INDICE = 20
+PAGINAS_RESUMEN = 3
+PAGINAS_TITULOS = 5
+MAX_TITULOS = 8
+
+
+def resumir_estructura(doc) -> dict:
+    """
+    Ficha estructural de un documento PyMuPDF ya abierto.
+    Lee cada una de las primeras páginas una sola vez (resumen y títulos salen del mismo texto).
+    """
+    # 1. ÍNDICE (Table of Contents)
+    toc = doc.get_toc()
+    if toc:
+        # Tomamos solo los primeros items para no saturar
+        indice = "".join(f"{'  ' * (nivel - 1)}• {titulo} (pág {pagina})\n" for nivel, titulo, pagina in toc[:MAX_ITEMS_INDICE])
+    else:
+        indice = "⚠️ Este documento no tiene índice estructurado."
+
+    textos = [doc[i].get_text() for i in range(min(PAGINAS_TITULOS, len(doc)))]
+
+    # 2. PRIMERAS PÁGINAS (Introducción/Resumen)
+    resumen = "".join(t[:800] + "\n...\n" for t in textos[:PAGINAS_RESUMEN])
+
+    # 3. ESCANEO RÁPIDO DE TÍTULOS (Heurística visual: líneas en mayúsculas)
+    titulos = []
+    for texto in textos:
+        for linea in texto.split('\n'):
+            l = linea.strip()
+            if l.isupper() and 4 < len(l) < 70 and any(c.isalpha() for c in l) and l not in titulos:
+                titulos.append(l)
+
+    # 4. METADATA
+    meta = doc.metadata or {}
+    return {
+        "num_paginas": len(doc),
+        "indice": indice,
+        "resumen_inicio": resumen,
+        "titulos_clave": titulos[:MAX_TITULOS],
+        "metadata": {
+            "titulo": meta.get("title") or "Sin título",
+            "autor": meta.get("author") or "Desconocido"
+        }
+    }
+
+
+class AlmacenEstructura:
+
+    def __init__(self, ruta_db):
+        self.ruta_db = ruta_db
+        os.makedirs(os.path.dirname(ruta_db), exist_ok=True)
+        with self._conectar() as con:
+            con.execute("""
+                CREATE TABLE IF NOT EXISTS estructura (
+                    doc_id TEXT PRIMARY KEY,
+                    nombre_archivo TEXT NOT NULL,
+                    ruta TEXT NOT NULL,
+                    num_paginas INTEGER NOT NULL,
+                    indice TEXT NOT NULL,
+                    resumen_inicio TEXT NOT NULL,
+                    titulos_clave TEXT NOT NULL,
+                    metadata TEXT NOT NULL,
+                    generado_en TEXT NOT NULL
+                )
+            """)
+            con.execute("CREATE INDEX IF NOT EXISTS idx_estructura_ruta ON estructura(ruta)")
+            con.execute("CREATE INDEX IF NOT EXISTS idx_estructura_nombre ON estructura(nombre_archivo)")
+
+    def _conectar(self):
+        return sqlite3.connect(self.ruta_db, timeout=10)
+
+    def reiniciar(self):
+        """Vacía el almacén (la ingesta reconstruye todo desde cero)."""
+        with self._conectar() as con:
+            con.execute("DELETE FROM estructura")
+
+    def guardar(self, doc_id: str, nombre_archivo: str, ruta: str, info: dict):
+        with self._conectar() as con:
+            con.execute(
+                "INSERT OR REPLACE INTO estructura VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (doc_id, nombre_archivo, os.path.abspath(ruta), info["num_paginas"], info["indice"],
+                 info["resumen_inicio"], json.dumps(info["titulos_clave"], ensure_ascii=False),
+                 json.dumps(info["metadata"], ensure_ascii=False), datetime.now().isoformat(timespec="seconds"))
+            )
+
+    def obtener(self, doc_id: Optional[str] = None, ruta: Optional[str] = None) -> Optional[dict]:
+        """Ficha por doc_id; si no se conoce, por ruta (o nombre de archivo) del PDF."""
+        if doc_id:
+            filtro, valor = "doc_id = ?", doc_id
+        elif ruta:
+            filtro, valor = "ruta = ?", os.path.abspath(ruta)
+        else:
+            return None
+
+        columnas = "num_paginas, indice, resumen_inicio, titulos_clave, metadata"
+        try:
+            with self._conectar() as con:
+                fila = con.execute(f"SELECT {columnas} FROM estructura WHERE {filtro}", (valor,)).fetchone()
+                if fila is None and ruta:
+                    # La carpeta de documentos pudo moverse desde la ingesta
+                    fila = con.execute(f"SELECT {columnas} FROM estructura WHERE nombre_archivo = ?",
+                                       (os.path.basename(ruta),)).fetchone()
+        except sqlite3.Error as e:
+            print(f"[Estructura Error] {e}")
+            return None
+        if not fila: return None
+        return {
+            "num_paginas": fila[0],
+            "indice": fila[1],
+            "resumen_inicio": fila[2],
+            "titulos_clave": json.loads(fila[3]),
+            "metadata": json.loads(fila[4])
+        }
+
+# Instancia global
+almacen_estructura = AlmacenEstructura(os.path.join(Configuracion.DIRECTORIO_BASE, "data", "estructura_docs.db"))
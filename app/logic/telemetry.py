@@ -0,0 +1,106 @@
+"""
+Sink de Telemetría (telemetry.py) - Eventos Estructurados sin Bloqueo
+---------------------------------------------------------------------
+Cualquier módulo emite eventos con 'telemetria.emitir(...)' sin tocar disco.
+1. Buffer en anillo en memoria (deque con tope): si el escritor se atrasa, se descartan
+   los eventos más antiguos y se cuentan como perdidos.
+2. Hilo escritor en segundo plano: vuelca por lotes en formato JSON Lines.
+3. Rotación por tamaño: telemetria.jsonl -> telemetria.jsonl.1 -> ... -> .N
+"""
+import os
+import json
+import time
+import atexit
+import threading
+from collections import deque
+
+from app.core.config import Configuracion
+
+
+class SinkTelemetria:
+
+    def __init__(self, ruta_archivo, capacidad=10000, tam_lote=200, intervalo=2.0,
+                 max_bytes=10 * 1024 * 1024, max_archivos=5):
+        self.ruta_archivo = ruta_archivo
+        self.capacidad = capacidad
+        self.tam_lote = tam_lote
+        self.intervalo = intervalo
+        self.max_bytes = max_bytes
+        self.max_archivos = max_archivos
+
+        self._buffer = deque(maxlen=capacidad)
+        self._despertar = threading.Event()
+        self._lock_arranque = threading.Lock()
+        self._lock_escritura = threading.Lock()
+        self._hilo = None
+        self.metricas = {"emitidos": 0, "escritos": 0, "perdidos": 0, "rotaciones": 0}
+
+    # --- API Pública ---
+
+    def emitir(self, evento: str, **campos):
+        """Registra un evento. O(1), sin I/O: apto para el camino caliente."""
+        if len(self._buffer) >= self.capacidad:
+            self.metricas["perdidos"] += 1
+        registro = {"ts": round(time.time(), 3), "evento": evento}
+        registro.update(campos)
+        self._buffer.append(registro)
+        self.metricas["emitidos"] += 1
+
+        self._asegurar_hilo()
+        if len(self._buffer) >= self.tam_lote:
+            self._despertar.set()
+
+    def volcar(self):
+        """Escribe todo lo pendiente (lo llama el hilo; también útil al apagar)."""
+        with self._lock_escritura:
+            lote = []
+            while self._buffer:
+                try:
+                    lote.append(self._buffer.popleft())
+                except IndexError:
+                    break
+            if not lote: return
+
+            try:
+                os.makedirs(os.path.dirname(self.ruta_archivo), exist_ok=True)
+                self._rotar_si_necesario()
+                lineas = "".join(json.dumps(r, ensure_ascii=False, default=str) + "\n" for r in lote)
+                with open(self.ruta_archivo, "a", encoding="utf-8") as f:
+                    f.write(lineas)
+                self.metricas["escritos"] += len(lote)
+            except Exception as e:
+                self.metricas["perdidos"] += len(lote)
+                print(f"[Telemetría Error] {e}")
+
+    # --- Internos ---
+
+    def _asegurar_hilo(self):
+        if self._hilo is not None: return
+        with self._lock_arranque:
+            if self._hilo is None:
+                self._hilo = threading.Thread(target=self._bucle, name="telemetria-writer", daemon=True)
+                self._hilo.start()
+                atexit.register(self.volcar)
+
+    def _bucle(self):
+        while True:
+            self._despertar.wait(self.intervalo)
+            self._despertar.clear()
+            self.volcar()
+
+    def _rotar_si_necesario(self):
+        if not os.path.exists(self.ruta_archivo) or os.path.getsize(self.ruta_archivo) < self.max_bytes:
+            return
+        for i in range(self.max_archivos - 1, 0, -1):
+            origen = f"{self.ruta_archivo}.{i}"
+            if os.path.exists(origen):
+                os.replace(origen, f"{self.ruta_archivo}.{i + 1}")
+        os.replace(self.ruta_archivo, f"{self.ruta_archivo}.1")
+        self.metricas["rotaciones"] += 1
+
+# Instancia global
+telemetria = SinkTelemetria(
+    os.path.join(Configuracion.DIRECTORIO_BASE, "logs", "telemetria.jsonl"),
+    max_bytes=int(Configuracion.TELEMETRIA_MAX_MB * 1024 * 1024),
+    max_archivos=Configuracion.TELEMETRIA_MAX_ARCHIVOS
+)
@@ -0,0 +1,184 @@
+"""
+Contador de Consumo (usage_accountant.py) - Presupuesto en Memoria
+-------------------------------------------------------------------
+Reemplaza el 'append' al CSV por respuesta y el 'os.path.exists(API_LOCKED)' por consulta.
+1. Cuenta tokens (usage_metadata) y costo en memoria: total, por día, por usuario y por perfil.
+2. Kill Switch en memoria: se evalúa sin tocar disco en cada request.
+3. Tarea de fondo: vuelca los movimientos al CSV por lotes, guarda el resumen por usuario/perfil
+   y sincroniza el candado con monitor_dashboard.py (API_LOCKED) cada pocos segundos.
+"""
+import os
+import csv
+import json
+import asyncio
+import threading
+from datetime import datetime
+
+from app.core.config import Configuracion
+
+# Tarifas Gemini 2.0 Flash (USD por millón de tokens)
+PRECIO_INPUT_1M = 0.10
+PRECIO_OUTPUT_1M = 0.40
+
+FILE_USAGE_LOG = os.path.join(Configuracion.DIRECTORIO_BASE, "data", "usage_log.csv")
+FILE_USAGE_RESUMEN = os.path.join(Configuracion.DIRECTORIO_BASE, "data", "usage_resumen.json")
+FILE_LOCK = os.path.join(Configuracion.DIRECTORIO_BASE, "data", "API_LOCKED")
+
+# Columnas compatibles con monitor_dashboard.py (+ Usuario/Perfil al final)
+COLUMNAS_CSV = ["Timestamp", "Fecha", "Input", "Output", "CostoUSD", "Usuario", "Perfil"]
+
+
+class ContadorConsumo:
+
+    def __init__(self, limite_usd=50.0, intervalo_flush=5.0, tam_lote=50):
+        self.limite_usd = limite_usd
+        self.intervalo_flush = intervalo_flush
+        self.tam_lote = tam_lote
+
+        self.total = {"input": 0, "output": 0, "costo": 0.0}
+        self.por_dia = {}
+        self.por_usuario = {}
+        self.por_perfil = {}
+
+        self._pendientes = []
+        # 'registrar' corre en el event loop y 'volcar' en un hilo: ambos toman este lock
+        self._lock = threading.Lock()
+        self._pausada_local = False   # Por presupuesto excedido
+        self._pausada_externa = False # Por candado manual del monitor
+        self._tarea = None
+        os.makedirs(os.path.dirname(FILE_USAGE_LOG), exist_ok=True)
+        self._cargar_historico()
+
+    # --- Estado Inicial ---
+
+    def _cargar_historico(self):
+        """Lee el CSV una sola vez al arrancar para que el presupuesto sobreviva reinicios."""
+        self._pausada_externa = os.path.exists(FILE_LOCK)
+        if not os.path.exists(FILE_USAGE_LOG): return
+        try:
+            with open(FILE_USAGE_LOG, 'r', encoding='utf-8', newline='') as f:
+                for fila in csv.DictReader(f):
+                    self._acumular(int(fila["Input"]), int(fila["Output"]), float(fila["CostoUSD"]),
+                                   fila.get("Fecha", ""), fila.get("Usuario") or None, fila.get("Perfil") or None)
+        except Exception as e:
+            print(f"[Consumo Error] No se pudo leer el histórico: {e}")
+        self._pausada_local = self.total["costo"] >= self.limite_usd
+
+    # --- Contabilidad ---
+
+    @staticmethod
+    def _sumar(destino, clave, in_tokens, out_tokens, costo):
+        item = destino.setdefault(clave, {"input": 0, "output": 0, "costo": 0.0, "llamadas": 0})
+        item["input"] += in_tokens
+        item["output"] += out_tokens
+        item["costo"] += costo
+        item["llamadas"] += 1
+
+    def _acumular(self, in_tokens, out_tokens, costo, fecha, usuario, perfil):
+        self.total["input"] += in_tokens
+        self.total["output"] += out_tokens
+        self.total["costo"] += costo
+        self._sumar(self.por_dia, fecha, in_tokens, out_tokens, costo)
+        if usuario: self._sumar(self.por_usuario, str(usuario), in_tokens, out_tokens, costo)
+        if perfil: self._sumar(self.por_perfil, perfil, in_tokens, out_tokens, costo)
+
+    def registrar(self, respuesta_llm, usuario=None, perfil=None) -> float:
+        """Contabiliza una respuesta del LLM. Retorna el costo en USD (0 si no trae usage)."""
+        usage = getattr(respuesta_llm, "usage_metadata", None)
+        if not usage: return 0.0
+
+        in_tokens = usage.get('input_tokens', 0)
+        out_tokens = usage.get('output_tokens', 0)
+        costo = ((in_tokens / 1e6) * PRECIO_INPUT_1M) + ((out_tokens / 1e6) * PRECIO_OUTPUT_1M)
+
+        ahora = datetime.now()
+        fecha = ahora.strftime("%Y-%m-%d")
+        with self._lock:
+            self._acumular(in_tokens, out_tokens, costo, fecha, usuario, perfil)
+            self._pendientes.append([ahora.strftime("%Y-%m-%d %H:%M:%S"), fecha, in_tokens, out_tokens,
+                                     f"{costo:.6f}", usuario or "", perfil or ""])
+        print(f"💰 Costo: ${costo:.6f}")
+
+        if not self._pausada_local and self.total["costo"] >= self.limite_usd:
+            self._pausada_local = True
+            print(f"⛔ [Consumo] Presupuesto de ${self.limite_usd:.2f} agotado. API pausada.")
+
+        self._asegurar_tarea()
+        return costo
+
+    def api_pausada(self) -> bool:
+        """
+        Kill Switch sin I/O: presupuesto agotado o candado manual del monitor.
+        Asegura la tarea de sincronización aunque no haya llamadas al LLM (ej: arranque con candado);
+        al (re)lanzarla relee el candado una vez, después lo mantiene al día la tarea.
+        """
+        if self._asegurar_tarea():
+            self._pausada_externa = os.path.exists(FILE_LOCK)
+        return self._pausada_local or self._pausada_externa
+
+    # --- Persistencia en Segundo Plano ---
+
+    def _asegurar_tarea(self) -> bool:
+        """Lanza la tarea de volcado/candado si no está corriendo. True si la lanzó."""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Contexto síncrono (scripts): volcamos por lotes sin tarea de fondo
+            if len(self._pendientes) >= self.tam_lote: self.volcar()
+            return False
+        if self._tarea is None or self._tarea.done():
+            self._tarea = loop.create_task(self._bucle_volcado())
+            return True
+        return False
+
+    async def _bucle_volcado(self):
+        # Cada vuelta relee el candado del monitor aunque no haya movimientos que volcar
+        while True:
+            await asyncio.sleep(self.intervalo_flush)
+            await asyncio.to_thread(self.volcar)
+
+    def volcar(self):
+        """Escribe los movimientos pendientes y sincroniza el candado con el monitor."""
+        # Lote y resumen se toman juntos bajo el lock: el resumen corresponde al CSV escrito
+        with self._lock:
+            lote, self._pendientes = self._pendientes, []
+            resumen = json.dumps({"total": self.total, "por_usuario": self.por_usuario,
+                                  "por_perfil": self.por_perfil}, ensure_ascii=False) if lote else None
+
+        if lote:
+            try:
+                nuevo = not os.path.exists(FILE_USAGE_LOG)
+                with open(FILE_USAGE_LOG, mode='a', newline='', encoding='utf-8') as f:
+                    writer = csv.writer(f)
+                    if nuevo: writer.writerow(COLUMNAS_CSV)
+                    writer.writerows(lote)
+            except Exception as e:
+                # Solo si falló el CSV el lote vuelve a la cola (delante de lo registrado mientras tanto)
+                with self._lock:
+                    self._pendientes[:0] = lote
+                print(f"[Consumo Error] Volcado fallido: {e}")
+                resumen = None
+
+        try:
+            if resumen is not None:
+                with open(FILE_USAGE_RESUMEN, 'w', encoding='utf-8') as f:
+                    f.write(resumen)
+        except Exception as e:
+            print(f"[Consumo Error] Resumen no guardado: {e}")
+
+        try:
+            if self._pausada_local and not os.path.exists(FILE_LOCK):
+                with open(FILE_LOCK, 'w') as f:
+                    f.write("LOCKED_BY_BUDGET")
+            self._pausada_externa = os.path.exists(FILE_LOCK)
+        except Exception as e:
+            print(f"[Consumo Error] Candado no sincronizado: {e}")
+
+    async def cerrar(self):
+        """Vuelca lo pendiente al apagar el bot."""
+        if self._tarea and not self._tarea.done():
+            self._tarea.cancel()
+        await asyncio.to_thread(self.volcar)
+
+# Instancia global
+contador_consumo = ContadorConsumo(limite_usd=Configuracion.LIMITE_PRESUPUESTO_USD)
@@ -1,14 +1,13 @@
 """
 Punto de Entrada Principal (main.py)
 ------------------------------------
-Orquestador del sistema. Valida configuración e inicia la interfaz de Telegram.
+Orquestador del sistema. Valida configuración e inicia la interfaz de Telegram
+(polling, webhook o solo API HTTP según MODO_BOT).
 """
 
 import sys
 import asyncio
 from app.core.config import Configuracion
-# Importamos la función que acabamos de crear para arrancar el bot
-from app.interfaces.telegram_bot import iniciar_bot
 
 def main():
     """
@@ -25,7 +24,13 @@ def main():
         print(">> [Sistema] Verificación completada. Lanzando interfaz...")
         
         # 2. Iniciar el Bot de Telegram (Esto bloqueará la consola mientras funcione)
-        iniciar_bot()
+        # Import diferido: en modo webhook el servidor HTTP debe escuchar antes de cargar los modelos
+        if Configuracion.MODO_BOT in ("webhook", "api"):
+            from app.interfaces.http_server import iniciar_servidor_http
+            iniciar_servidor_http()
+        else:
+            from app.interfaces.telegram_bot import iniciar_bot
+            iniciar_bot()
         
     except KeyboardInterrupt:
         print("\n>> [Salida] Bot detenido por el usuario.")
@@ -0,0 +1,74 @@
+"""
+Servidor LLM Falso (fake_llm.py)
+--------------------------------
+Sustituto local de Gemini para pruebas y cargas sintéticas.
+No hace red: simula latencia, errores transitorios (429/503) y consumo de tokens,
+y registra la concurrencia máxima observada para validar los límites del Gateway.
+
+Uso:
+    from app.utils.fake_llm import ServidorLLMFalso
+    from app.logic.llm_gateway import crear_gateway
+    gateway = crear_gateway(ServidorLLMFalso(latencia=(0.05, 0.3), tasa_error=0.1))
+"""
+import random
+import asyncio
+
+
+class RespuestaFalsa:
+    """Imita el AIMessage de LangChain (content + usage_metadata)."""
+
+    def __init__(self, content: str, input_tokens: int, output_tokens: int):
+        self.content = content
+        self.usage_metadata = {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+        }
+
+
+class ErrorTransitorioFalso(Exception):
+    """Equivalente local de un 429 ResourceExhausted / 503 Unavailable."""
+
+
+class ServidorLLMFalso:
+
+    def __init__(self, latencia=(0.05, 0.2), tasa_error=0.0, respuesta=None, semilla=None):
+        self.latencia = latencia
+        self.tasa_error = tasa_error
+        self.respuesta = respuesta  # str fijo o callable(mensajes) -> str
+        self._rng = random.Random(semilla)
+        self.en_vuelo = 0
+        self.max_en_vuelo = 0
+        self.llamadas = 0
+
+    @staticmethod
+    def _texto_de(mensajes):
+        partes = []
+        for m in mensajes:
+            contenido = getattr(m, "content", m)
+            if isinstance(contenido, list):
+                partes.extend(b.get("text", "") for b in contenido if isinstance(b, dict))
+            else:
+                partes.append(str(contenido))
+        return "\n".join(partes)
+
+    async def ainvoke(self, mensajes, **kwargs):
+        self.llamadas += 1
+        self.en_vuelo += 1
+        self.max_en_vuelo = max(self.max_en_vuelo, self.en_vuelo)
+        try:
+            await asyncio.sleep(self._rng.uniform(*self.latencia))
+            if self._rng.random() < self.tasa_error:
+                raise ErrorTransitorioFalso("429 Resource has been exhausted (fake)")
+
+            entrada = self._texto_de(mensajes)
+            if callable(self.respuesta):
+                salida = self.respuesta(mensajes)
+            elif self.respuesta is not None:
+                salida = self.respuesta
+            else:
+                salida = f"Respuesta simulada para: {entrada[-80:]}"
+            # ~4 caracteres por token, suficiente para contabilidad
+            return RespuestaFalsa(salida, max(1, len(entrada) // 4), max(1, len(salida) // 4))
+        finally:
+            self.en_vuelo -= 1
@@ -0,0 +1,126 @@
+"""
+Benchmark de la Caché de Documentos (Local)
+-------------------------------------------
+Compara el formato anterior (JSON con indent=2) con el binario '.asii' del CacheManager:
+1. Tamaño en disco.
+2. Carga completa (json.load vs. descomprimir todo).
+3. Acceso a UNA página y a UNA sección (json.load completo vs. mmap + un bloque).
+Usa un documento sintético (o los JSON reales de data/cache_docs con --reales).
+
+Uso:
+    python dataa/benchmark_cache.py --paginas 400
+    python dataa/benchmark_cache.py --reales
+    python dataa/benchmark_cache.py --migrar      # convierte las cachés JSON existentes
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+
+# --- FIX DE RUTAS ---
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.abspath(os.path.join(current_dir, ".."))
+if parent_dir not in sys.path:
+    sys.path.append(parent_dir)
+# --------------------
+
+from app.logic.cache_manager import DocumentoCacheado, escribir_documento_binario, gestor_cache
+
+PALABRAS = ("factura", "asiento", "comprobante", "cliente", "proveedor", "módulo", "ventas", "compras",
+            "período", "anular", "configurar", "parámetro", "reporte", "saldo", "cuenta", "impuesto")
+
+def documento_sintetico(paginas, palabras_por_pagina=450):
+    rnd = random.Random(7)
+    mapa, markdown = {}, []
+    for p in range(1, paginas + 1):
+        texto = " ".join(rnd.choice(PALABRAS) for _ in range(palabras_por_pagina))
+        mapa[str(p)] = texto
+        titulo = f"## Sección {p}" if p % 3 == 1 else f"### Paso {p}"
+        markdown.append(f"{titulo}\n\n{texto}\n\n-----\n")
+    md = "\n".join(markdown)
+    return {
+        "contenido_markdown": md,
+        "texto_plano": "\n".join(mapa.values()),
+        "mapa_paginas": mapa,
+        "mapa_navegacion": "\n".join(l for l in md.split("\n") if l.startswith("#")),
+        "metadata": {"nombre_archivo": "sintetico.pdf", "peso_kb": 0, "tiene_codigo": False, "tiene_tablas": False},
+        "ruta_imagenes": "",
+        "catalogo_imagenes": [],
+    }
+
+def cronometrar(funcion, repeticiones):
+    inicio = time.perf_counter()
+    for _ in range(repeticiones): funcion()
+    return (time.perf_counter() - inicio) / repeticiones * 1000
+
+def comparar(nombre, datos, carpeta, repeticiones):
+    ruta_json = os.path.join(carpeta, "doc.json")
+    ruta_bin = os.path.join(carpeta, "doc.asii")
+    with open(ruta_json, "w", encoding="utf-8") as f:
+        json.dump(datos, f, ensure_ascii=False, indent=2)
+    escribir_documento_binario(ruta_bin, datos)
+
+    paginas = sorted(datos["mapa_paginas"], key=int)
+    pagina = paginas[len(paginas) // 2]
+    doc = DocumentoCacheado(ruta_bin)
+    secciones = doc.secciones()
+    doc.cerrar()
+    seccion = secciones[len(secciones) // 2] if secciones else None
+
+    def json_completo():
+        with open(ruta_json, encoding="utf-8") as f: return json.load(f)
+    def bin_completo():
+        d = DocumentoCacheado(ruta_bin)
+        try: return d.como_dict()
+        finally: d.cerrar()
+    def json_pagina():
+        return json_completo()["mapa_paginas"][pagina]
+    def bin_pagina():
+        d = DocumentoCacheado(ruta_bin)
+        try: return d.pagina(int(pagina))
+        finally: d.cerrar()
+    def json_seccion():
+        md = json_completo()["contenido_markdown"]
+        i = md.find(seccion)
+        return md[i:md.find("\n#", i)]
+    def bin_seccion():
+        d = DocumentoCacheado(ruta_bin)
+        try: return d.seccion(seccion)
+        finally: d.cerrar()
+
+    assert bin_pagina() == json_pagina()
+    kb_json, kb_bin = os.path.getsize(ruta_json) / 1024, os.path.getsize(ruta_bin) / 1024
+    print(f"\n📄 {nombre}: {len(paginas)} páginas")
+    print(f"   Tamaño        JSON {kb_json:9.1f} KB | ASII {kb_bin:9.1f} KB ({kb_bin / kb_json:.0%})")
+    print(f"   Carga total   JSON {cronometrar(json_completo, repeticiones):9.2f} ms | ASII {cronometrar(bin_completo, repeticiones):9.2f} ms")
+    print(f"   Una página    JSON {cronometrar(json_pagina, repeticiones):9.2f} ms | ASII {cronometrar(bin_pagina, repeticiones):9.2f} ms")
+    if seccion:
+        print(f"   Una sección   JSON {cronometrar(json_seccion, repeticiones):9.2f} ms | ASII {cronometrar(bin_seccion, repeticiones):9.2f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del formato de caché de documentos (ASII)")
+    parser.add_argument("--paginas", type=int, default=400)
+    parser.add_argument("--repeticiones", type=int, default=10)
+    parser.add_argument("--reales", action="store_true", help="Usa los JSON existentes en data/cache_docs")
+    parser.add_argument("--migrar", action="store_true", help="Migra las cachés JSON existentes y termina")
+    args = parser.parse_args()
+
+    if args.migrar:
+        print(f">> Migradas: {gestor_cache.migrar_todo()}")
+        return
+
+    with tempfile.TemporaryDirectory() as carpeta:
+        if args.reales:
+            jsons = [n for n in os.listdir(gestor_cache.cache_dir) if n.endswith(".json")]
+            if not jsons: print("No hay cachés JSON en data/cache_docs.")
+            for nombre in jsons:
+                with open(os.path.join(gestor_cache.cache_dir, nombre), encoding="utf-8") as f:
+                    comparar(nombre, json.load(f), carpeta, args.repeticiones)
+        else:
+            comparar("Sintético", documento_sintetico(args.paginas), carpeta, args.repeticiones)
+
+if __name__ == "__main__":
+    main()
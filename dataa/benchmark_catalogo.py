@@ -0,0 +1,92 @@
+"""
+Benchmark del Catálogo de Imágenes (Local)
+------------------------------------------
+Compara '_crear_catalogo_imagenes' contra la versión anterior (find + count del prefijo
+por cada imagen, cuadrática en el tamaño del Markdown) sobre un manual sintético con
+cientos de imágenes, y verifica que ambos catálogos sean idénticos.
+
+Uso:
+    python dataa/benchmark_catalogo.py --paginas 800 --imagenes 600
+"""
+import os
+import re
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+# --- FIX DE RUTAS ---
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.abspath(os.path.join(current_dir, ".."))
+if parent_dir not in sys.path:
+    sys.path.append(parent_dir)
+# --------------------
+
+from app.logic.document_processor import procesador
+
+PALABRAS = ("factura", "asiento", "comprobante", "cliente", "proveedor", "módulo", "ventas", "compras",
+            "período", "anular", "configurar", "parámetro", "reporte", "saldo", "cuenta", "impuesto")
+
+def manual_sintetico(carpeta, paginas, imagenes, palabras_por_pagina=350):
+    """Markdown estilo pymupdf4llm con separadores de página e imágenes repartidas al azar."""
+    rnd = random.Random(7)
+    con_imagen = {}
+    for n, pagina in enumerate(sorted(rnd.sample(range(1, paginas + 1), min(imagenes, paginas)))):
+        con_imagen[pagina] = f"manual.pdf-{pagina:04d}-{n % 3:02d}.jpg"
+    partes = []
+    for p in range(1, paginas + 1):
+        texto = " ".join(rnd.choice(PALABRAS) for _ in range(palabras_por_pagina))
+        bloque = f"## **Paso {p}**\n\n{texto}\n"
+        if p in con_imagen:
+            bloque += f"\n![]({carpeta}/{con_imagen[p]})\n"
+        partes.append(bloque)
+    for nombre in con_imagen.values():
+        open(os.path.join(carpeta, nombre), "wb").close()
+    # Una imagen en disco que no aparece en el Markdown
+    open(os.path.join(carpeta, "huerfana.jpg"), "wb").close()
+    return "\n---\n".join(partes)
+
+def catalogo_anterior(markdown, carpeta_imgs):
+    """Réplica de la versión previa (find + count del prefijo por imagen)."""
+    catalogo = []
+    archivos = sorted([f for f in os.listdir(carpeta_imgs) if f.endswith('.jpg')])
+    for img in archivos:
+        if img in markdown:
+            idx = markdown.find(img)
+            raw_ctx = markdown[max(0, idx-150):idx]
+            ctx = re.sub(r'[#*`\n]', ' ', raw_ctx).strip()
+            if len(ctx) < 10: ctx = "Imagen técnica."
+            pag = markdown[:idx].count('\n---\n') + 1
+            catalogo.append({
+                "archivo": img,
+                "ruta_completa": os.path.join(carpeta_imgs, img),
+                "contexto": ctx,
+                "pagina": pag
+            })
+    return catalogo
+
+def cronometrar(funcion, repeticiones):
+    inicio = time.perf_counter()
+    for _ in range(repeticiones): resultado = funcion()
+    return (time.perf_counter() - inicio) / repeticiones * 1000, resultado
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del catálogo de imágenes")
+    parser.add_argument("--paginas", type=int, default=800)
+    parser.add_argument("--imagenes", type=int, default=600)
+    parser.add_argument("--repeticiones", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as carpeta:
+        markdown = manual_sintetico(carpeta, args.paginas, args.imagenes)
+        ms_anterior, anterior = cronometrar(lambda: catalogo_anterior(markdown, carpeta), args.repeticiones)
+        ms_actual, actual = cronometrar(lambda: procesador._crear_catalogo_imagenes(markdown, carpeta), args.repeticiones)
+
+        print(f"\n🖼️  Manual sintético: {args.paginas} páginas, {len(actual)} imágenes, {len(markdown) / 1024:.0f} KB de Markdown")
+        print(f"   Anterior  {ms_anterior:9.2f} ms")
+        print(f"   Actual    {ms_actual:9.2f} ms ({ms_anterior / ms_actual:.1f}x)")
+        print(f"   Catálogo  {'idéntico' if anterior == actual else 'DIFERENTE'}")
+
+if __name__ == "__main__":
+    main()
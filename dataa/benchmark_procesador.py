@@ -0,0 +1,123 @@
+"""
+Benchmark del Procesador Documental (Local)
+-------------------------------------------
+Compara páginas/segundo de 'procesar_pdf':
+1. Ruta anterior: pymupdf4llm abre el PDF, fitz lo vuelve a abrir para el texto plano y
+   metadata/catálogo/navegación se sacan re-escaneando el Markdown completo.
+2. Ruta actual: un solo 'fitz.open' y un recorrido por páginas ('page_chunks').
+Verifica además que ambas rutas produzcan la misma salida.
+Usa un manual sintético grande (o los PDFs indicados con --pdf).
+
+Uso:
+    python dataa/benchmark_procesador.py --paginas 300
+    python dataa/benchmark_procesador.py --pdf data/manuales/Manual_Ventas.pdf
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+# --- FIX DE RUTAS ---
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.abspath(os.path.join(current_dir, ".."))
+if parent_dir not in sys.path:
+    sys.path.append(parent_dir)
+# --------------------
+
+import fitz
+import pymupdf4llm
+
+from app.logic.document_processor import procesador
+
+PALABRAS = ("factura", "asiento", "comprobante", "cliente", "proveedor", "módulo", "ventas", "compras",
+            "período", "anular", "configurar", "parámetro", "reporte", "saldo", "cuenta", "impuesto")
+
+def manual_sintetico(ruta, paginas, imagenes_cada=3):
+    """PDF con títulos, párrafos y una imagen cada 'imagenes_cada' páginas."""
+    rnd = random.Random(7)
+    doc = fitz.open()
+    pixmap = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 120, 80), False)
+    for p in range(1, paginas + 1):
+        pagina = doc.new_page()
+        pagina.insert_text((72, 72), f"Sección {p}: Configurar el módulo", fontsize=20)
+        y = 110
+        for _ in range(28):
+            linea = " ".join(rnd.choice(PALABRAS) for _ in range(10))
+            pagina.insert_text((72, y), linea, fontsize=10)
+            y += 18
+        if imagenes_cada and p % imagenes_cada == 0:
+            pixmap.clear_with(rnd.randint(0, 255))
+            pagina.insert_image(fitz.Rect(72, 640, 312, 800), pixmap=pixmap)
+    doc.save(ruta)
+    doc.close()
+
+def procesar_pdf_anterior(ruta_pdf, output_folder):
+    """Réplica de la ruta previa a la pasada única (dos aperturas + re-escaneos)."""
+    md_text = pymupdf4llm.to_markdown(ruta_pdf, write_images=True, image_path=output_folder, image_format="jpg")
+    catalogo = procesador._crear_catalogo_imagenes(md_text, output_folder)
+    full_text, page_map = [], {}
+    doc = fitz.open(ruta_pdf)
+    for i, page in enumerate(doc):
+        text = page.get_text("text")
+        full_text.append(text)
+        page_map[i + 1] = text
+    doc.close()
+    return {
+        "contenido_markdown": md_text,
+        "texto_plano": "\n".join(full_text),
+        "mapa_paginas": page_map,
+        "mapa_navegacion": procesador._extraer_mapa_navegacion(md_text),
+        "metadata": {
+            "nombre_archivo": os.path.basename(ruta_pdf),
+            "peso_kb": os.path.getsize(ruta_pdf) // 1024,
+            "tiene_codigo": "```" in md_text,
+            "tiene_tablas": "|" in md_text,
+        },
+        "ruta_imagenes": output_folder,
+        "catalogo_imagenes": catalogo,
+    }
+
+def medir(ruta_pdf, carpeta, repeticiones):
+    nombre = os.path.basename(ruta_pdf).replace(".pdf", "")
+    with fitz.open(ruta_pdf) as doc:
+        paginas = doc.page_count
+    procesador.img_dir = carpeta
+    salida_imagenes = os.path.join(carpeta, nombre)
+    os.makedirs(salida_imagenes, exist_ok=True)
+
+    t_anterior = t_actual = 0.0
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        anterior = procesar_pdf_anterior(ruta_pdf, salida_imagenes)
+        t_anterior += time.perf_counter() - inicio
+        inicio = time.perf_counter()
+        actual = procesador.procesar_pdf(ruta_pdf)
+        t_actual += time.perf_counter() - inicio
+
+    distintas = [clave for clave in anterior if anterior[clave] != actual.get(clave)]
+    print(f"\n📄 {nombre}: {paginas} páginas, {len(actual['catalogo_imagenes'])} imágenes")
+    print(f"   Anterior  {paginas * repeticiones / t_anterior:8.1f} pág/s")
+    print(f"   Actual    {paginas * repeticiones / t_actual:8.1f} pág/s ({t_anterior / t_actual:.2f}x)")
+    print(f"   Salida    {'idéntica' if not distintas else 'DIFERENTE en ' + ', '.join(distintas)}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de procesar_pdf (páginas/segundo)")
+    parser.add_argument("--paginas", type=int, default=300, help="Páginas del manual sintético")
+    parser.add_argument("--pdf", nargs="*", default=[], help="PDFs reales a medir en lugar del sintético")
+    parser.add_argument("--repeticiones", type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as carpeta:
+        rutas = args.pdf
+        if not rutas:
+            ruta = os.path.join(carpeta, "manual_sintetico.pdf")
+            print(f">> Generando manual sintético de {args.paginas} páginas...")
+            manual_sintetico(ruta, args.paginas)
+            rutas = [ruta]
+        for ruta in rutas:
+            medir(ruta, carpeta, args.repeticiones)
+
+if __name__ == "__main__":
+    main()
@@ -10,7 +10,6 @@ import os
 import sys
 import shutil
 import re
-import hashlib
 import io
 from datetime import datetime
 
@@ -57,6 +56,9 @@ from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_chroma import Chroma
 from langchain_core.documents import Document
 from app.core.config import Configuracion
+from app.logic.fulltext_index import indice_texto
+from app.logic.structure_store import almacen_estructura, resumir_estructura
+from app.logic.fingerprint_index import indice_huellas
 
 # --- CONFIGURACIÓN DE MODELO ---
 MODEL_NAME = "intfloat/multilingual-e5-large" 
@@ -68,14 +70,6 @@ RAW_DOCS = Configuracion.RUTA_DOCS
 
 # --- UTILIDADES ---
 
-def generar_hash_archivo(ruta_pdf):
-    """Crea un ID único (SHA256) basado en el CONTENIDO binario."""
-    sha256_hash = hashlib.sha256()
-    with open(ruta_pdf, "rb") as f:
-        for byte_block in iter(lambda: f.read(4096), b""):
-            sha256_hash.update(byte_block)
-    return sha256_hash.hexdigest()
-
 def normalizar_nombre(nombre_archivo):
     """Elimina versiones y fechas para encontrar la 'familia' del documento."""
     nombre = nombre_archivo.lower()
@@ -90,11 +84,13 @@ def analizar_versiones(lista_archivos):
     """Analiza todos los archivos y determina cuál es el 'master' de cada familia."""
     familias = {} 
     print(">> 🔍 Analizando versiones...")
+    # Huellas de todo el lote: las ya indexadas no se releen; las nuevas se calculan en paralelo
+    huellas = indice_huellas.huellas_lote(lista_archivos)
     
     for ruta in lista_archivos:
         nombre = os.path.basename(ruta)
         familia = normalizar_nombre(nombre)
-        doc_id = generar_hash_archivo(ruta)
+        doc_id = huellas[ruta]
         
         match_anio = re.search(r'(20\d{2})', nombre)
         anio = int(match_anio.group(1)) if match_anio else 2000
@@ -184,7 +180,7 @@ def procesar_ocr_pagina(doc_fitz, numero_pagina):
     return texto_visual
 
 def extraer_ficha_tecnica(ruta_pdf, meta_analisis):
-    """Genera la ficha para el Bibliotecario (Chroma Library)."""
+    """Genera la ficha para el Bibliotecario (Chroma Library) y persiste la ficha estructural del Pre-Análisis."""
     try:
         doc = fitz.open(ruta_pdf)
         toc = doc.get_toc()
@@ -193,6 +189,9 @@ def extraer_ficha_tecnica(ruta_pdf, meta_analisis):
         if len(toc_text) < 50:
             toc_text = "Resumen Intro: " + doc[0].get_text()[:1200]
 
+        # Misma apertura: índice, resumen y títulos para 'extraer_info_ligera' en runtime
+        almacen_estructura.guardar(meta_analisis['doc_id'], meta_analisis['nombre_archivo'], ruta_pdf, resumir_estructura(doc))
+
         doc.close()
 
         estado_ver = "✅ VIGENTE" if meta_analisis['es_mas_reciente'] else "⚠️ OBSOLETO"
@@ -221,8 +220,8 @@ def extraer_ficha_tecnica(ruta_pdf, meta_analisis):
         print(f"⚠️ Error ficha {meta_analisis['nombre_archivo']}: {e}")
         return None
 
-def procesar_contenido_profundo(ruta_pdf, meta_analisis):
-    """Genera chunks estructurados + OCR de imágenes."""
+def procesar_contenido_profundo(ruta_pdf, meta_analisis, paginas_texto=None):
+    """Genera chunks estructurados + OCR de imágenes. Si se pasa 'paginas_texto' (dict), lo llena con {num_pagina: texto} para el índice de texto completo."""
     chunks_finales = []
     
     try:
@@ -253,6 +252,7 @@ def procesar_contenido_profundo(ruta_pdf, meta_analisis):
                 continue
             
             if not contenido_completo.strip(): continue
+            if paginas_texto is not None: paginas_texto[num_pagina] = contenido_completo
 
             # 4. Splitting
             header_splits = markdown_splitter.split_text(contenido_completo)
@@ -311,6 +311,8 @@ def ingest_v8():
     # 1. Limpieza
     if os.path.exists(DB_LIBRARY): shutil.rmtree(DB_LIBRARY)
     if os.path.exists(DB_CONTENT): shutil.rmtree(DB_CONTENT)
+    indice_texto.reiniciar()
+    almacen_estructura.reiniciar()
     
     # 2. Escaneo
     archivos_pdf = []
@@ -356,9 +358,13 @@ def ingest_v8():
         if ficha: docs_biblio.append(ficha)
         
         # B. Contenido Profundo + OCR
-        chunks = procesar_contenido_profundo(ruta, meta)
+        paginas = {}
+        chunks = procesar_contenido_profundo(ruta, meta, paginas)
         docs_cont.extend(chunks)
 
+        # C. Índice de Texto Completo (búsquedas literales tipo Ctrl+F)
+        indice_texto.indexar_documento(meta['doc_id'], meta['nombre_archivo'], paginas)
+
     # 5. Guardado por Lotes
     if docs_biblio:
         guardar_en_chroma_con_progreso(docs_biblio, embeddings, DB_LIBRARY, "Fichas")
@@ -0,0 +1,204 @@
+"""
+Precómputo de FAQ V8 (Offline / Nocturno)
+-----------------------------------------
+Responde en lote un CSV/JSONL de preguntas con el mismo Bibliotecario + Lector que brain_v8,
+pero con embedding y re-ranking totalmente agrupados.
+1. Streaming: cada resultado se escribe al JSONL de salida apenas está listo.
+2. Reanudable: si se interrumpe, al relanzar se saltean las preguntas ya resueltas.
+3. Opcional (--guardar): publica las respuestas en el almacén de FAQ que el bot sirve al instante.
+4. Reporta throughput por etapa (embedding, biblioteca, contenido, generación).
+
+Uso:
+    python dataa/precomputar_faq.py preguntas.csv --salida data/faq_resultados.jsonl --guardar
+    (CSV con columna 'pregunta' y opcional 'perfil'; JSONL con {"pregunta": ..., "perfil": ...})
+"""
+import os
+import sys
+import csv
+import json
+import time
+import asyncio
+import argparse
+
+# --- FIX DE RUTAS ---
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.abspath(os.path.join(current_dir, ".."))
+if parent_dir not in sys.path:
+    sys.path.append(parent_dir)
+# --------------------
+
+from app.core.contracts import SCORE_THRESHOLD
+from app.logic.rag_engine_v8 import embeber_consultas_lote, buscar_manual_candidato_lote, buscar_contenido_profundo_lote
+from app.logic.brain_v8 import generar_con_evidencias
+from app.logic.faq_store import almacen_faq, AlmacenFAQ
+from app.logic.usage_accountant import contador_consumo
+
+# --- ENTRADA / SALIDA ---
+
+def leer_preguntas(ruta, perfil_default):
+    """Itera {'pregunta', 'perfil'} desde CSV (columna 'pregunta' o la primera) o JSONL."""
+    if ruta.lower().endswith((".jsonl", ".json")):
+        with open(ruta, "r", encoding="utf-8") as f:
+            for linea in f:
+                if not linea.strip(): continue
+                item = json.loads(linea)
+                if item.get("pregunta"):
+                    yield {"pregunta": item["pregunta"].strip(), "perfil": item.get("perfil") or perfil_default}
+        return
+
+    with open(ruta, "r", encoding="utf-8-sig", newline="") as f:
+        lector = csv.reader(f)
+        cabecera = next(lector, None)
+        if not cabecera: return
+        columnas = [c.strip().lower() for c in cabecera]
+        idx_preg = columnas.index("pregunta") if "pregunta" in columnas else 0
+        idx_perfil = columnas.index("perfil") if "perfil" in columnas else None
+        if "pregunta" not in columnas and cabecera[0].strip():
+            # Sin cabecera: la primera fila ya es una pregunta
+            yield {"pregunta": cabecera[0].strip(), "perfil": perfil_default}
+        for fila in lector:
+            if len(fila) <= idx_preg or not fila[idx_preg].strip(): continue
+            perfil = fila[idx_perfil].strip() if idx_perfil is not None and len(fila) > idx_perfil and fila[idx_perfil].strip() else perfil_default
+            yield {"pregunta": fila[idx_preg].strip(), "perfil": perfil}
+
+def cargar_completadas(ruta_salida):
+    """Claves ya resueltas en una corrida anterior (los errores se reintentan)."""
+    hechas = set()
+    if not os.path.exists(ruta_salida): return hechas
+    with open(ruta_salida, "r", encoding="utf-8") as f:
+        for linea in f:
+            try:
+                item = json.loads(linea)
+            except json.JSONDecodeError:
+                continue  # Línea cortada por la interrupción
+            if item.get("estado") != "ERROR":
+                hechas.add(item["clave"])
+    return hechas
+
+# --- MÉTRICAS ---
+
+class Cronometro:
+    """Acumula tiempo e ítems por etapa para reportar preguntas/segundo."""
+
+    def __init__(self):
+        self.etapas = {}
+
+    def medir(self, etapa, items, inicio):
+        acum = self.etapas.setdefault(etapa, [0, 0.0])
+        acum[0] += items
+        acum[1] += time.perf_counter() - inicio
+
+    def reporte(self):
+        lineas = []
+        for etapa, (items, seg) in self.etapas.items():
+            tasa = items / seg if seg > 0 else 0.0
+            lineas.append(f"   {etapa:<12} {items:>6} ítems en {seg:8.2f}s -> {tasa:8.1f} ítems/s")
+        return "\n".join(lineas)
+
+# --- PIPELINE ---
+
+async def procesar_lote(lote, crono, concurrencia_llm):
+    preguntas = [item["pregunta"] for item in lote]
+
+    t = time.perf_counter()
+    vectores = await asyncio.to_thread(embeber_consultas_lote, preguntas)
+    crono.medir("embedding", len(lote), t)
+
+    t = time.perf_counter()
+    candidatos = await asyncio.to_thread(buscar_manual_candidato_lote, preguntas, 1, vectores)
+    crono.medir("biblioteca", len(lote), t)
+
+    resultados = []
+    elegidos = []
+    for i, (item, cands) in enumerate(zip(lote, candidatos)):
+        base = {"clave": AlmacenFAQ.clave(item["pregunta"], item["perfil"]), "pregunta": item["pregunta"], "perfil": item["perfil"]}
+        # Mismo criterio que el bot para entrar directo a un manual sin preguntar
+        if not cands or float(cands[0]["rerank_score"]) <= SCORE_THRESHOLD["HIGH_CONFIDENCE"]:
+            resultados.append({**base, "estado": "SIN_MANUAL",
+                               "score": float(cands[0]["rerank_score"]) if cands else None})
+            continue
+        elegidos.append((i, base, cands[0]))
+
+    t = time.perf_counter()
+    evidencias = await asyncio.to_thread(
+        buscar_contenido_profundo_lote,
+        [preguntas[i] for i, _, _ in elegidos], [c["doc_id"] for _, _, c in elegidos], 8, [vectores[i] for i, _, _ in elegidos]
+    )
+    crono.medir("contenido", len(elegidos), t)
+
+    semaforo = asyncio.Semaphore(concurrencia_llm)
+
+    async def generar(indice, base, cand, evs):
+        meta = {"doc_id": cand["doc_id"], "nombre_archivo": cand["nombre_archivo"],
+                "anio": cand.get("anio"), "version": cand.get("version")}
+        registro = {**base, "manual": cand["nombre_archivo"], "manual_meta": meta, "score": float(cand["rerank_score"])}
+        if not evs:
+            return {**registro, "estado": "SIN_EVIDENCIA"}
+        async with semaforo:
+            try:
+                texto = await generar_con_evidencias(lote[indice]["pregunta"], evs, meta, base["perfil"], session_id="faq_batch")
+            except Exception as e:
+                return {**registro, "estado": "ERROR", "error": str(e)[:300]}
+        return {**registro, "estado": "OK", "respuesta": texto}
+
+    t = time.perf_counter()
+    generados = await asyncio.gather(*[generar(i, base, cand, evs) for (i, base, cand), evs in zip(elegidos, evidencias)])
+    crono.medir("generacion", len(elegidos), t)
+
+    return resultados + list(generados)
+
+async def precomputar(ruta_entrada, ruta_salida, perfil_default="ADMIN", tam_lote=32, concurrencia_llm=4, guardar=False):
+    try:
+        await _precomputar(ruta_entrada, ruta_salida, perfil_default, tam_lote, concurrencia_llm, guardar)
+    finally:
+        # El volcado de consumo corre en segundo plano: lo pendiente se escribe antes de cerrar el loop
+        await contador_consumo.cerrar()
+
+async def _precomputar(ruta_entrada, ruta_salida, perfil_default, tam_lote, concurrencia_llm, guardar):
+    print("--- PRECÓMPUTO DE FAQ V8 ---")
+    hechas = cargar_completadas(ruta_salida)
+    if hechas: print(f">> Reanudando: {len(hechas)} preguntas ya resueltas en {ruta_salida}")
+
+    pendientes, vistas = [], set()
+    for item in leer_preguntas(ruta_entrada, perfil_default):
+        clave = AlmacenFAQ.clave(item["pregunta"], item["perfil"])
+        if clave in hechas or clave in vistas: continue
+        vistas.add(clave)
+        pendientes.append(item)
+
+    print(f">> {len(pendientes)} preguntas pendientes (lotes de {tam_lote}).")
+    crono = Cronometro()
+    inicio_total = time.perf_counter()
+    estados = {}
+
+    os.makedirs(os.path.dirname(os.path.abspath(ruta_salida)), exist_ok=True)
+    with open(ruta_salida, "a", encoding="utf-8") as salida:
+        for i in range(0, len(pendientes), tam_lote):
+            lote = pendientes[i:i + tam_lote]
+            for registro in await procesar_lote(lote, crono, concurrencia_llm):
+                salida.write(json.dumps(registro, ensure_ascii=False) + "\n")
+                estados[registro["estado"]] = estados.get(registro["estado"], 0) + 1
+                if guardar and registro["estado"] == "OK":
+                    almacen_faq.guardar(registro["pregunta"], registro["perfil"], registro["respuesta"], registro["manual_meta"])
+            salida.flush()
+            hecho = min(i + tam_lote, len(pendientes))
+            print(f"   [FAQ] {hecho}/{len(pendientes)} ({hecho / len(pendientes) * 100:.1f}%)")
+
+    total = time.perf_counter() - inicio_total
+    print(f"✅ PRECÓMPUTO COMPLETADO en {total:.1f}s. Estados: {estados}")
+    print(">> Throughput por etapa:")
+    print(crono.reporte())
+
+def main():
+    parser = argparse.ArgumentParser(description="Precómputo offline de respuestas FAQ (ASII V8)")
+    parser.add_argument("entrada", help="CSV o JSONL de preguntas")
+    parser.add_argument("--salida", default=os.path.join(parent_dir, "data", "faq_resultados.jsonl"))
+    parser.add_argument("--perfil", default="ADMIN", choices=["ADMIN", "SISTEMAS"])
+    parser.add_argument("--lote", type=int, default=32)
+    parser.add_argument("--concurrencia-llm", type=int, default=4)
+    parser.add_argument("--guardar", action="store_true", help="Publica las respuestas OK en el almacén de FAQ del bot")
+    args = parser.parse_args()
+    asyncio.run(precomputar(args.entrada, args.salida, args.perfil, args.lote, args.concurrencia_llm, args.guardar))
+
+if __name__ == "__main__":
+    main()
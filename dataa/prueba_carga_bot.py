@@ -0,0 +1,78 @@
+"""
+Prueba de Carga del Bot (Offline)
+---------------------------------
+Mide el throughput del despacho de updates de Telegram sin red ni Gemini:
+1. Genera N chats x M mensajes como updates sintéticos.
+2. Cada update simula el trabajo del cerebro con la latencia del Servidor LLM Falso
+   y una transición de estado leer -> esperar -> escribir (detecta carreras por chat).
+3. Compara el modo secuencial (1 update a la vez, el default de PTB) contra ProcesadorPorChat.
+
+Uso:
+    python dataa/prueba_carga_bot.py --chats 50 --mensajes 4 --concurrencia 16
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+from types import SimpleNamespace
+
+# --- FIX DE RUTAS ---
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.abspath(os.path.join(current_dir, ".."))
+if parent_dir not in sys.path:
+    sys.path.append(parent_dir)
+# --------------------
+
+from app.interfaces.update_processor import ProcesadorPorChat
+from app.utils.fake_llm import ServidorLLMFalso
+
+
+async def correr(chats, mensajes, concurrencia, latencia):
+    llm = ServidorLLMFalso(latencia=latencia, semilla=42)
+    procesador = ProcesadorPorChat(concurrencia)
+    estado = {}        # chat_id -> último número de mensaje procesado
+    violaciones = []   # mensajes procesados fuera de orden
+
+    async def manejar(update):
+        chat_id = update.effective_chat.id
+        previo = estado.get(chat_id, 0)
+        await llm.ainvoke([update.texto])
+        if update.numero != previo + 1:
+            violaciones.append((chat_id, previo, update.numero))
+        estado[chat_id] = update.numero
+
+    # Intercalado como llegan en la realidad: mensaje 1 de todos los chats, luego el 2, ...
+    updates = [SimpleNamespace(effective_chat=SimpleNamespace(id=c), numero=m, texto=f"chat {c} msg {m}")
+               for m in range(1, mensajes + 1) for c in range(chats)]
+
+    inicio = time.perf_counter()
+    # Igual que Application: una tarea por update que pasa por el procesador
+    await asyncio.gather(*[procesador.process_update(u, manejar(u)) for u in updates])
+    duracion = time.perf_counter() - inicio
+    return {
+        "updates": len(updates),
+        "segundos": duracion,
+        "updates_por_seg": len(updates) / duracion,
+        "max_en_vuelo": llm.max_en_vuelo,
+        "violaciones_orden": len(violaciones),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga del despacho de updates (ASII)")
+    parser.add_argument("--chats", type=int, default=50)
+    parser.add_argument("--mensajes", type=int, default=4, help="Mensajes por chat")
+    parser.add_argument("--concurrencia", type=int, default=16)
+    parser.add_argument("--latencia-min", type=float, default=0.05)
+    parser.add_argument("--latencia-max", type=float, default=0.2)
+    args = parser.parse_args()
+    latencia = (args.latencia_min, args.latencia_max)
+
+    print("--- PRUEBA DE CARGA: DESPACHO DE UPDATES ---")
+    for etiqueta, conc in (("Secuencial (default)", 1), (f"Por chat (N={args.concurrencia})", args.concurrencia)):
+        r = asyncio.run(correr(args.chats, args.mensajes, conc, latencia))
+        print(f">> {etiqueta:<24} {r['updates']} updates en {r['segundos']:.2f}s -> {r['updates_por_seg']:.1f} updates/s "
+              f"| en vuelo máx: {r['max_en_vuelo']} | fuera de orden: {r['violaciones_orden']}")
+
+if __name__ == "__main__":
+    main()
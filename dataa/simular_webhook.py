@@ -0,0 +1,167 @@
+"""
+Simulador de Telegram para el Modo Webhook (Local)
+--------------------------------------------------
+Prueba el servidor webhook sin Telegram real:
+1. API de Bot falsa (http://127.0.0.1:8081): responde getMe/setWebhook/sendMessage/...
+   y registra cada respuesta que el bot envía.
+2. Poster de updates: espera /ready y envía N mensajes sintéticos (uno por chat) al webhook.
+3. Reporta latencia de aceptación del POST y latencia hasta la respuesta del bot.
+
+Uso (dos consolas, en cualquier orden: el simulador espera a que /ready dé 200):
+    python dataa/simular_webhook.py --secreto prueba --usuario 123
+    MODO_BOT=webhook TELEGRAM_API_URL=http://127.0.0.1:8081 WEBHOOK_SECRET=prueba python -m app.main
+"""
+import os
+import sys
+import json
+import time
+import threading
+import argparse
+from urllib.parse import parse_qs, urlsplit
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+# --- FIX DE RUTAS ---
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.abspath(os.path.join(current_dir, ".."))
+if parent_dir not in sys.path:
+    sys.path.append(parent_dir)
+# --------------------
+
+# --- API DE BOT FALSA ---
+
+respuestas = {}           # chat_id -> [(timestamp, texto)]
+_lock_respuestas = threading.Lock()
+_contador_mensajes = [0]
+
+class ManejadorApiFalsa(BaseHTTPRequestHandler):
+
+    def _leer_parametros(self):
+        largo = int(self.headers.get("Content-Length") or 0)
+        cuerpo = self.rfile.read(largo).decode("utf-8") if largo else ""
+        tipo = self.headers.get("Content-Type", "")
+        if "json" in tipo:
+            return json.loads(cuerpo or "{}")
+        return {k: v[0] for k, v in parse_qs(cuerpo).items()}
+
+    def do_POST(self):
+        metodo = self.path.rsplit("/", 1)[-1]
+        params = self._leer_parametros()
+
+        if metodo == "getMe":
+            resultado = {"id": 1, "is_bot": True, "first_name": "ASII", "username": "asii_bot",
+                         "can_join_groups": False, "can_read_all_group_messages": False, "supports_inline_queries": False}
+        elif metodo == "sendMessage":
+            chat_id = int(params.get("chat_id"))
+            with _lock_respuestas:
+                _contador_mensajes[0] += 1
+                respuestas.setdefault(chat_id, []).append((time.time(), params.get("text", "")))
+                resultado = {"message_id": _contador_mensajes[0], "date": int(time.time()),
+                             "chat": {"id": chat_id, "type": "private"}, "text": params.get("text", "")}
+        else:
+            resultado = True  # sendChatAction, setWebhook, deleteWebhook, ...
+
+        datos = json.dumps({"ok": True, "result": resultado}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(datos)))
+        self.end_headers()
+        self.wfile.write(datos)
+
+    def log_message(self, *args):
+        pass  # Silencioso
+
+def iniciar_api_falsa(puerto):
+    servidor = ThreadingHTTPServer(("127.0.0.1", puerto), ManejadorApiFalsa)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    print(f">> [API Falsa] Escuchando en http://127.0.0.1:{puerto}")
+    return servidor
+
+# --- POSTER DE UPDATES ---
+
+def construir_update(numero, chat_id, usuario_id, texto):
+    return {
+        "update_id": numero,
+        "message": {
+            "message_id": numero,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": usuario_id, "is_bot": False, "first_name": "Prueba"},
+            "text": texto,
+        },
+    }
+
+def esperar_listo(url_ready, timeout):
+    limite = time.time() + timeout
+    while time.time() < limite:
+        try:
+            r = requests.get(url_ready, timeout=2)
+            if r.status_code == 200: return True
+            print(f"   [Ready] {r.json().get('fase')}...")
+        except requests.RequestException:
+            print("   [Ready] Servidor aún no responde...")
+        time.sleep(2)
+    return False
+
+def percentil(valores, p):
+    if not valores: return 0.0
+    orden = sorted(valores)
+    return orden[min(len(orden) - 1, int(len(orden) * p / 100))]
+
+def simular(args):
+    partes = urlsplit(args.webhook)
+    base = f"{partes.scheme}://{partes.netloc}"
+    if not esperar_listo(f"{base}/ready", args.timeout_ready):
+        print("❌ El servidor no quedó listo a tiempo.")
+        return
+
+    headers = {"X-Telegram-Bot-Api-Secret-Token": args.secreto} if args.secreto else {}
+    envios = {}
+
+    def enviar(i):
+        chat_id = args.chat_base + i
+        update = construir_update(i + 1, chat_id, args.usuario or chat_id, args.texto)
+        t0 = time.time()
+        r = requests.post(args.webhook, json=update, headers=headers, timeout=30)
+        envios[chat_id] = (t0, time.time() - t0, r.status_code)
+
+    print(f">> Enviando {args.updates} updates con {args.paralelo} posters...")
+    with ThreadPoolExecutor(max_workers=args.paralelo) as pool:
+        list(pool.map(enviar, range(args.updates)))
+
+    aceptados = [c for c, (_, _, status) in envios.items() if status == 200]
+    print(f">> Aceptados: {len(aceptados)}/{args.updates} | POST p50 {percentil([e[1] for e in envios.values()], 50) * 1000:.1f} ms "
+          f"p95 {percentil([e[1] for e in envios.values()], 95) * 1000:.1f} ms")
+
+    if args.sin_api: return  # Las respuestas las registra la API falsa de otro proceso
+    limite = time.time() + args.timeout_respuestas
+    while time.time() < limite and len(respuestas) < len(aceptados):
+        time.sleep(0.5)
+
+    latencias = [respuestas[c][0][0] - envios[c][0] for c in aceptados if c in respuestas]
+    print(f">> Respondidos: {len(latencias)}/{len(aceptados)} | respuesta p50 {percentil(latencias, 50):.2f}s "
+          f"p95 {percentil(latencias, 95):.2f}s")
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulador local de Telegram para el modo webhook (ASII)")
+    parser.add_argument("--webhook", default="http://127.0.0.1:8080/telegram/webhook")
+    parser.add_argument("--secreto", default="")
+    parser.add_argument("--usuario", type=int, default=0, help="user_id a usar (debe estar en ALLOWED_USER_IDS)")
+    parser.add_argument("--updates", type=int, default=20)
+    parser.add_argument("--paralelo", type=int, default=8)
+    parser.add_argument("--chat-base", type=int, default=900000)
+    parser.add_argument("--texto", default="¿Cómo anulo una factura de venta?")
+    parser.add_argument("--puerto-api", type=int, default=8081)
+    parser.add_argument("--sin-api", action="store_true", help="Solo envía updates (sin API falsa ni espera de respuestas)")
+    parser.add_argument("--timeout-ready", type=float, default=300)
+    parser.add_argument("--timeout-respuestas", type=float, default=120)
+    args = parser.parse_args()
+
+    if not args.sin_api:
+        iniciar_api_falsa(args.puerto_api)
+    simular(args)
+
+if __name__ == "__main__":
+    main()